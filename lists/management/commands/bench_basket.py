@@ -0,0 +1,43 @@
+from time import perf_counter
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from lists.optimizer import cheapest_basket
+
+
+class Command(BaseCommand):
+    help = "Mede o tempo do otimizador de cesta em matrizes de preço sintéticas."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=100)
+        parser.add_argument("--stores", type=int, default=10)
+        parser.add_argument("--max-stores", type=int, nargs="*", default=[1, 2, 3, 5])
+        parser.add_argument("--coverage", type=float, default=0.6,
+                            help="Fração de produtos que cada loja vende (padrão: 0.6)")
+        parser.add_argument("--repeat", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options["seed"])
+        shape = (options["products"], options["stores"])
+        base = rng.uniform(50, 5000, size=(shape[0], 1))
+        prices = base * rng.uniform(0.85, 1.25, size=shape)
+        prices[rng.random(shape) > options["coverage"]] = np.inf
+        quantities = rng.integers(1, 4, size=shape[0])
+
+        self.stdout.write(f"{shape[0]} produtos × {shape[1]} lojas, {options['repeat']} repetições")
+        for max_stores in [None, *options["max_stores"]]:
+            timings = []
+            for _ in range(options["repeat"]):
+                start = perf_counter()
+                stores, chosen = cheapest_basket(prices, quantities, max_stores)
+                timings.append((perf_counter() - start) * 1000)
+
+            total = sum(prices[i, j] * quantities[i] for i, j in enumerate(chosen) if j >= 0)
+            label = "sem limite" if max_stores is None else f"k={max_stores}"
+            self.stdout.write(
+                f"{label:>10}: mediana {np.median(timings):.2f} ms, "
+                f"p95 {np.percentile(timings, 95):.2f} ms, "
+                f"{len(stores)} lojas, total {total:.2f}, {(chosen < 0).sum()} sem oferta"
+            )
@@ -0,0 +1,46 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+        ('products', '0002_dailyprice_pricepoint'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='List',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='Nome')),
+                ('cheapest_total', models.FloatField(default=0, verbose_name='Total mais barato')),
+                ('item_count', models.PositiveIntegerField(default=0)),
+                ('missing_items', models.PositiveIntegerField(default=0)),
+                ('store_totals', models.JSONField(default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lists', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ListItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(default=1)),
+                ('offers', models.JSONField(default=dict)),
+                ('unit_price', models.FloatField(null=True, verbose_name='Menor preço')),
+                ('list', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='lists.list')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='list_items', to='products.product')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('list', 'product'), name='listitem_list_product_uniq')],
+            },
+        ),
+    ]
@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.db import models
+
+from products.models import Product
+
+
+class List(models.Model):
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="lists"
+    )
+    name = models.CharField(verbose_name="Nome", max_length=100, null=False, blank=False)
+    # Totais mantidos incrementalmente (ver lists/totals.py), nunca recalculados na leitura
+    cheapest_total = models.FloatField(verbose_name="Total mais barato", default=0)
+    item_count = models.PositiveIntegerField(default=0)
+    missing_items = models.PositiveIntegerField(default=0)
+    store_totals = models.JSONField(default=dict)  # {"<store_id>": {"total": float, "items": int}}
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+
+class ListItem(models.Model):
+    list = models.ForeignKey(List, on_delete=models.CASCADE, related_name="items")
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name="list_items")
+    quantity = models.PositiveIntegerField(default=1)
+    # Ofertas disponíveis do produto já somadas aos totais da lista: {"<store_id>": preço}
+    offers = models.JSONField(default=dict)
+    unit_price = models.FloatField(verbose_name="Menor preço", null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["list", "product"], name="listitem_list_product_uniq")
+        ]
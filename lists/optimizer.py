@@ -0,0 +1,137 @@
+"""
+Cesta mais barata de uma lista entre várias lojas.
+
+Os preços disponíveis são carregados numa matriz produto × loja (NumPy, com
+inf onde a loja não vende o produto). Sem limite de lojas a resposta é um
+argmin por linha; com no máximo K lojas, enumeramos combinações de K lojas
+depois de descartar as lojas dominadas (sempre mais caras que outra).
+O NumPy é importado dentro das funções, só quando uma lista é otimizada.
+"""
+
+from itertools import combinations, islice
+
+from products.models import Stock
+
+COMBINATION_CHUNK = 4096
+
+
+def load_price_matrix(product_ids):
+    """
+    Retorna (product_ids, store_ids, prices) com prices[i, j] = menor preço
+    disponível do produto i na loja j, ou inf.
+    """
+    import numpy as np  # só o /optimize/ usa: os workers web não carregam o NumPy ao subir
+
+    product_ids = np.asarray(list(product_ids), dtype=np.int64)
+    rows = np.array(
+        list(
+            Stock.objects.filter(product_id__in=product_ids.tolist(), is_available=True)
+            .values_list("product_id", "store_id", "price")
+        ),
+        dtype=np.float64,
+    ).reshape(-1, 3)
+
+    store_ids, columns = np.unique(rows[:, 1].astype(np.int64), return_inverse=True)
+    product_index = {product_id: i for i, product_id in enumerate(product_ids.tolist())}
+    lines = np.array([product_index[int(p)] for p in rows[:, 0]], dtype=np.int64)
+
+    prices = np.full((len(product_ids), len(store_ids)), np.inf)
+    np.minimum.at(prices, (lines, columns), rows[:, 2])
+    return product_ids, store_ids, prices
+
+
+def _dominated_stores(costs):
+    """Máscara das lojas que nunca são melhores que alguma outra (podem ser descartadas)."""
+    import numpy as np
+
+    # better_or_equal[i, j]: a loja i custa <= loja j em todos os produtos
+    better_or_equal = (costs[:, :, None] <= costs[:, None, :]).all(axis=0)
+    np.fill_diagonal(better_or_equal, False)
+    # Em caso de empate exato, mantém a de menor índice
+    ties = better_or_equal & better_or_equal.T
+    strictly = better_or_equal & ~ties
+    tie_loser = np.triu(ties)  # i < j e iguais: j é descartada
+    return (strictly | tie_loser).any(axis=0)
+
+
+def _best_combination(costs, candidates, size, target):
+    """Melhor combinação de `size` lojas entre `candidates` (menos faltantes, depois menor custo)."""
+    import numpy as np
+
+    best = None
+    combos = combinations(candidates, size)
+    while True:
+        chunk = np.array(list(islice(combos, COMBINATION_CHUNK)), dtype=np.int64)
+        if not len(chunk):
+            break
+
+        per_product = costs[:, chunk].min(axis=2)  # produtos × combinações
+        missing = np.isinf(per_product).sum(axis=0)
+        totals = np.where(np.isinf(per_product), 0, per_product).sum(axis=0)
+        i = np.lexsort((totals, missing))[0]
+        if best is None or (missing[i], totals[i]) < best[:2]:
+            best = (missing[i], totals[i], chunk[i])
+        if best[0] == 0 and best[1] <= target:
+            break  # igual ao ótimo sem restrição: não há como melhorar
+
+    return best[2]
+
+
+def cheapest_basket(prices, quantities, max_stores=None):
+    """
+    Resolve a cesta sobre a matriz de preços. Retorna (stores, chosen) onde
+    `stores` são os índices das colunas usadas e `chosen[i]` é a coluna em que
+    o produto i é comprado (-1 se não há oferta disponível).
+    """
+    import numpy as np
+
+    quantities = np.asarray(quantities, dtype=np.float64)
+    costs = prices * quantities[:, None]
+    if not costs.size:
+        return np.array([], dtype=np.int64), np.full(len(quantities), -1)
+
+    chosen = costs.argmin(axis=1)
+    buyable = np.isfinite(costs[np.arange(len(costs)), chosen])
+    used = np.unique(chosen[buyable])
+
+    if max_stores is not None and len(used) > max_stores:
+        target = costs[buyable].min(axis=1).sum()
+        costs_buyable = costs[buyable]
+        candidates = np.flatnonzero(~_dominated_stores(costs_buyable))
+        size = min(max_stores, len(candidates))
+        stores = _best_combination(costs_buyable, candidates, size, target)
+
+        sub = costs[:, stores]
+        chosen = stores[sub.argmin(axis=1)]
+        buyable = np.isfinite(costs[np.arange(len(costs)), chosen])
+        used = np.unique(chosen[buyable])
+
+    return used, np.where(buyable, chosen, -1)
+
+
+def optimize_list(list_obj, max_stores=None):
+    items = list(list_obj.items.values_list("product_id", "quantity").order_by("id"))
+    product_ids, store_ids, prices = load_price_matrix([product_id for product_id, _ in items])
+    quantities = [quantity for _, quantity in items]
+    used, chosen = cheapest_basket(prices, quantities, max_stores)
+
+    assignments, missing, total = [], [], 0.0
+    for i, (product_id, quantity) in enumerate(items):
+        if chosen[i] < 0:
+            missing.append(product_id)
+            continue
+        price = float(prices[i, chosen[i]])
+        total += price * quantity
+        assignments.append({
+            "product_id": product_id,
+            "store_id": int(store_ids[chosen[i]]),
+            "price": price,
+            "quantity": quantity,
+        })
+
+    return {
+        "total": round(total, 2),
+        "stores": [int(store_ids[j]) for j in used],
+        "items": assignments,
+        "missing": missing,
+    }
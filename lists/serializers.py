@@ -0,0 +1,38 @@
+from rest_framework import serializers
+from products.serializers import TimedListSerializer, TimedSerializerMixin
+from .models import List, ListItem
+
+
+class ListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    class Meta:
+        model = List
+        list_serializer_class = TimedListSerializer
+        fields = [
+            "id",
+            "name",
+            "cheapest_total",
+            "item_count",
+            "missing_items",
+            "store_totals",
+            "updated_at",
+        ]
+        read_only_fields = ["cheapest_total", "item_count", "missing_items", "store_totals", "updated_at"]
+
+
+class ListItemSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    product_name = serializers.CharField(source="product.name", read_only=True)
+
+    class Meta:
+        model = ListItem
+        fields = ["id", "product_id", "product_name", "quantity", "unit_price", "offers"]
+
+
+class ListDetailSerializer(ListSerializer):
+    items = serializers.SerializerMethodField()
+
+    class Meta(ListSerializer.Meta):
+        fields = ListSerializer.Meta.fields + ["items"]
+
+    def get_items(self, obj):
+        items = obj.items.select_related("product").order_by("id")
+        return ListItemSerializer(items, many=True).data
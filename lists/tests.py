@@ -0,0 +1,239 @@
+from itertools import combinations
+
+import numpy as np
+from rest_framework.test import APITestCase, APIClient
+from rest_framework import status
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from products.lookups import classification
+from products.models import Product, Store, Stock
+from .models import List, ListItem
+from .optimizer import cheapest_basket
+from .totals import set_quantity
+
+
+class ListTotalsTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.store_a = Store.objects.create(name="Loja A", logo="", url="")
+        cls.store_b = Store.objects.create(name="Loja B", logo="", url="")
+        cls.ssd = Product.objects.create(name="SSD")
+        cls.ram = Product.objects.create(name="Memória RAM")
+
+        cls.ssd_a = cls.create_stock(cls.ssd, cls.store_a, 300)
+        cls.ssd_b = cls.create_stock(cls.ssd, cls.store_b, 280)
+        cls.ram_a = cls.create_stock(cls.ram, cls.store_a, 200)
+
+    @staticmethod
+    def create_stock(product, store, price, is_available=True):
+        return Stock.objects.create(
+            product=product,
+            store=store,
+            price=price,
+            is_available=is_available,
+            url="",
+            photo="",
+            **classification("Categoria", "Subgrupo")
+        )
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.login(username="testuser", password="12345")
+        response = self.client.post("/api/lists/", {"name": "PC novo"}, format="json")
+        self.list_id = response.json()["list"]["id"]
+
+    def add(self, product, quantity=1):
+        return self.client.post(
+            f"/api/lists/{self.list_id}/items/",
+            {"product_id": product.id, "quantity": quantity},
+            format="json",
+        )
+
+    def assertTotals(self, cheapest_total, store_totals, missing_items=0):
+        list_obj = List.objects.get(pk=self.list_id)
+        self.assertAlmostEqual(list_obj.cheapest_total, cheapest_total)
+        self.assertEqual(list_obj.missing_items, missing_items)
+        self.assertEqual(
+            {store: entry["total"] for store, entry in list_obj.store_totals.items()},
+            {str(store.id): total for store, total in store_totals.items()},
+        )
+
+    def test_requires_authentication(self):
+        """Falha quando usuário não está autenticado"""
+        self.client.logout()
+        response = self.client.get("/api/lists/")
+        self.assertIn(response.status_code, [401, 403])
+
+    def test_add_items(self):
+        """Adicionar itens soma o menor preço disponível e os totais por loja"""
+        response = self.add(self.ssd, quantity=2)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.add(self.ram)
+        self.assertTotals(760, {self.store_a: 800, self.store_b: 560})
+
+    def test_price_change_updates_totals(self):
+        """Mudança de preço de um stock ajusta os totais sem recalcular a lista"""
+        self.add(self.ssd, quantity=2)
+        self.add(self.ram)
+
+        self.ssd_a.price = 250
+        self.ssd_a.save()
+        self.assertTotals(700, {self.store_a: 700, self.store_b: 560})
+
+        self.ram_a.is_available = False
+        self.ram_a.save()
+        self.assertTotals(500, {self.store_a: 500, self.store_b: 560}, missing_items=1)
+
+    def test_new_and_deleted_stocks(self):
+        """Stocks novos ou apagados também atualizam os totais"""
+        self.add(self.ram)
+        ram_b = self.create_stock(self.ram, self.store_b, 150)
+        self.assertTotals(150, {self.store_a: 200, self.store_b: 150})
+
+        ram_b.delete()
+        self.assertTotals(200, {self.store_a: 200})
+
+    def test_deleted_product(self):
+        """Apagar um produto remove seus itens das listas uma única vez"""
+        self.add(self.ssd)
+        self.add(self.ram, quantity=2)
+        self.ram.delete()
+        self.assertTotals(280, {self.store_a: 300, self.store_b: 280})
+        self.assertEqual(List.objects.get(pk=self.list_id).item_count, 1)
+
+        Product.objects.filter(pk=self.ssd.pk).delete()
+        self.assertTotals(0, {})
+        self.assertEqual(List.objects.get(pk=self.list_id).item_count, 0)
+
+    def test_change_quantity_and_remove_item(self):
+        """Alterar a quantidade ou remover um item ajusta os totais"""
+        item_id = self.add(self.ssd).json()["item"]["id"]
+        response = self.client.patch(
+            f"/api/lists/{self.list_id}/items/{item_id}/", {"quantity": 3}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTotals(840, {self.store_a: 900, self.store_b: 840})
+
+        response = self.client.delete(f"/api/lists/{self.list_id}/items/{item_id}/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(ListItem.objects.filter(pk=item_id).exists())
+        self.assertTotals(0, {})
+
+    def test_quantity_change_after_price_refresh(self):
+        """Trocar a quantidade parte das ofertas do banco, mesmo com um item lido antes da atualização de preço"""
+        item_id = self.add(self.ssd).json()["item"]["id"]
+        stale = ListItem.objects.get(pk=item_id)
+
+        self.ssd_b.is_available = False
+        self.ssd_b.save()  # atualização de preço gravada entre a leitura e a troca
+        item = set_quantity(stale, 2)
+        self.assertEqual(item.offers, {str(self.store_a.id): 300})
+        self.assertTotals(600, {self.store_a: 600})
+
+    def test_bulk_deletes(self):
+        """Apagar vários stocks ajusta cada lista uma vez só; apagar a lista não ajusta totais item a item"""
+        products = [Product.objects.create(name=f"Produto {i}") for i in range(10)]
+        for product in products:
+            self.create_stock(product, self.store_a, 10)
+            self.add(product)
+
+        with CaptureQueriesContext(connection) as queries:
+            Stock.objects.filter(product__in=products[:5]).delete()
+        list_queries = [query["sql"] for query in queries.captured_queries if '"lists_' in query["sql"]]
+        self.assertEqual(len(list_queries), 4)  # itens (select + update) e listas (select + update)
+        self.assertTotals(50, {self.store_a: 50}, missing_items=5)
+
+        list_obj = List.objects.get(pk=self.list_id)
+        with self.assertNumQueries(3):  # itens, delete dos itens, delete da lista
+            list_obj.delete()
+
+    def test_invalid_item(self):
+        """Produto inexistente ou quantidade inválida retornam 400"""
+        response = self.client.post(
+            f"/api/lists/{self.list_id}/items/", {"product_id": 999999}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.add(self.ssd, quantity=0)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_list(self):
+        """Listas de outros usuários não são acessíveis"""
+        other = User.objects.create_user(username="other", password="12345")
+        other_list = List.objects.create(user=other, name="Outra")
+        response = self.client.get(f"/api/lists/{other_list.id}/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_dashboard_single_query(self):
+        """O painel carrega todas as listas em uma única consulta"""
+        for i in range(20):
+            List.objects.create(user=self.user, name=f"Lista {i}")
+        self.add(self.ssd)
+
+        response = self.client.get("/api/lists/")  # aquece sessão/usuário
+        # sessão + usuário (autenticação) + listas
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/lists/")
+        self.assertEqual(len(response.json()["lists"]), 21)
+
+
+class BasketOptimizerTest(APITestCase):
+    def brute_force(self, prices, quantities, max_stores):
+        costs = prices * np.asarray(quantities)[:, None]
+        best = None
+        for size in range(1, max_stores + 1):
+            for stores in combinations(range(prices.shape[1]), size):
+                per_product = costs[:, stores].min(axis=1)
+                key = (np.isinf(per_product).sum(), np.where(np.isinf(per_product), 0, per_product).sum())
+                if best is None or key < best:
+                    best = key
+        return best
+
+    def test_matches_brute_force(self):
+        """O resultado com limite de lojas coincide com a enumeração completa"""
+        rng = np.random.default_rng(42)
+        for _ in range(20):
+            prices = rng.uniform(10, 100, size=(8, 6))
+            prices[rng.random(prices.shape) > 0.6] = np.inf
+            quantities = rng.integers(1, 3, size=8)
+            for max_stores in (1, 2, 3):
+                stores, chosen = cheapest_basket(prices, quantities, max_stores)
+                self.assertLessEqual(len(stores), max_stores)
+                costs = [prices[i, j] * quantities[i] for i, j in enumerate(chosen) if j >= 0]
+                missing, total = self.brute_force(prices, quantities, max_stores)
+                self.assertEqual((chosen < 0).sum(), missing)
+                self.assertAlmostEqual(sum(costs), total)
+
+    def test_unconstrained_picks_cheapest_per_product(self):
+        """Sem limite, cada produto vai para a loja mais barata"""
+        prices = np.array([[10, 8, np.inf], [5, 7, 6], [np.inf, np.inf, np.inf]])
+        stores, chosen = cheapest_basket(prices, [1, 1, 1])
+        self.assertEqual(chosen.tolist(), [1, 0, -1])
+        self.assertEqual(stores.tolist(), [0, 1])
+
+    def test_optimize_endpoint(self):
+        """O endpoint devolve lojas, itens e total da cesta"""
+        user = User.objects.create_user(username="testuser", password="12345")
+        store_a = Store.objects.create(name="Loja A", logo="", url="")
+        store_b = Store.objects.create(name="Loja B", logo="", url="")
+        list_obj = List.objects.create(user=user, name="Lista")
+        for name, price_a, price_b in [("P1", 10, 12), ("P2", 20, 15)]:
+            product = Product.objects.create(name=name)
+            ListTotalsTest.create_stock(product, store_a, price_a)
+            ListTotalsTest.create_stock(product, store_b, price_b)
+            ListItem.objects.create(list=list_obj, product=product, quantity=2)
+
+        client = APIClient()
+        client.login(username="testuser", password="12345")
+        data = client.get(f"/api/lists/{list_obj.id}/optimize/").json()
+        self.assertEqual(data["total"], 50)
+        self.assertEqual(sorted(data["stores"]), [store_a.id, store_b.id])
+
+        data = client.get(f"/api/lists/{list_obj.id}/optimize/?max_stores=1").json()
+        self.assertEqual(data["total"], 54)
+        self.assertEqual(data["stores"], [store_b.id])
+
+        response = client.get(f"/api/lists/{list_obj.id}/optimize/?max_stores=0")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
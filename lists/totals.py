@@ -0,0 +1,222 @@
+"""
+Manutenção incremental dos totais das listas.
+
+Cada ListItem guarda as ofertas (preço disponível por loja) que já estão somadas
+em List.cheapest_total/store_totals. Quando um preço muda, só os itens do
+produto afetado são lidos e cada lista recebe a diferença entre as ofertas
+novas e as antigas; a leitura das listas nunca precisa varrer os itens.
+"""
+
+from collections import defaultdict
+from threading import local
+
+from django.db import transaction
+from django.db.models import QuerySet
+from django.db.models.signals import post_delete, pre_delete
+from django.dispatch import receiver
+
+from products.models import Product, Stock
+from products.signals import prices_changed
+
+from .models import List, ListItem
+
+
+def product_offers(product_ids, lock=False):
+    """
+    {product_id: {"<store_id>": menor preço disponível naquela loja}}
+    Com `lock`, trava os stocks lidos até o fim da transação: uma atualização de
+    preço desses produtos espera, em vez de mudar as ofertas no meio da conta.
+    """
+    offers = {product_id: {} for product_id in product_ids}
+    stocks = Stock.objects.filter(product_id__in=product_ids, is_available=True)
+    if lock:
+        stocks = stocks.select_for_update()
+    for product_id, store_id, price in stocks.values_list("product_id", "store_id", "price"):
+        store = str(store_id)
+        current = offers[product_id].get(store)
+        offers[product_id][store] = price if current is None else min(current, price)
+    return offers
+
+
+def cheapest(offers):
+    return min(offers.values()) if offers else None
+
+
+def _add_contribution(delta, offers, quantity, sign):
+    delta["item_count"] += sign
+    if offers:
+        delta["cheapest_total"] += sign * quantity * cheapest(offers)
+    else:
+        delta["missing_items"] += sign
+    for store, price in offers.items():
+        store_delta = delta["store_totals"][store]
+        store_delta["total"] += sign * quantity * price
+        store_delta["items"] += sign
+
+
+def _empty_delta():
+    return {
+        "cheapest_total": 0.0,
+        "item_count": 0,
+        "missing_items": 0,
+        "store_totals": defaultdict(lambda: {"total": 0.0, "items": 0}),
+    }
+
+
+def _apply_deltas(deltas):
+    """Aplica {list_id: delta} travando as listas afetadas."""
+    if not deltas:
+        return
+
+    with transaction.atomic():
+        lists = list(List.objects.select_for_update().filter(id__in=deltas).order_by("id"))
+        for list_obj in lists:
+            delta = deltas[list_obj.id]
+            list_obj.cheapest_total = round(list_obj.cheapest_total + delta["cheapest_total"], 2)
+            list_obj.item_count += delta["item_count"]
+            list_obj.missing_items += delta["missing_items"]
+
+            store_totals = dict(list_obj.store_totals)
+            for store, store_delta in delta["store_totals"].items():
+                entry = store_totals.get(store, {"total": 0.0, "items": 0})
+                entry = {
+                    "total": round(entry["total"] + store_delta["total"], 2),
+                    "items": entry["items"] + store_delta["items"],
+                }
+                if entry["items"] > 0:
+                    store_totals[store] = entry
+                else:
+                    store_totals.pop(store, None)
+            list_obj.store_totals = store_totals
+
+        List.objects.bulk_update(
+            lists, ["cheapest_total", "item_count", "missing_items", "store_totals"]
+        )
+
+
+def add_item(list_obj, product, quantity):
+    """Cria (ou troca a quantidade de) um item e atualiza os totais da lista."""
+    with transaction.atomic():
+        # Stocks antes do item, na mesma ordem de quem muda o preço (stocks e depois itens)
+        offers = product_offers([product.id], lock=True)[product.id]
+        item = ListItem.objects.select_for_update().filter(list=list_obj, product=product).first()
+        delta = _empty_delta()
+        if item:
+            _add_contribution(delta, item.offers, item.quantity, -1)
+        else:
+            item = ListItem(list=list_obj, product=product)
+
+        item.quantity = quantity
+        item.offers = offers
+        item.unit_price = cheapest(offers)
+        item.save()
+        _add_contribution(delta, offers, quantity, +1)
+        _apply_deltas({list_obj.id: delta})
+    return item
+
+
+def set_quantity(item, quantity):
+    """Troca a quantidade do item. Devolve o item relido do banco (o recebido pode estar desatualizado)."""
+    with transaction.atomic():
+        # As ofertas que estão somadas na lista são as do banco, não as de quem chamou:
+        # uma atualização de preço pode ter sido gravada depois que o item foi lido.
+        item = ListItem.objects.select_for_update().get(pk=item.pk)
+        delta = _empty_delta()
+        _add_contribution(delta, item.offers, item.quantity, -1)
+        _add_contribution(delta, item.offers, quantity, +1)
+        item.quantity = quantity
+        item.save(update_fields=["quantity"])
+        _apply_deltas({item.list_id: delta})
+    return item
+
+
+def refresh_products(product_ids):
+    """Recalcula as ofertas dos produtos e repassa a diferença às listas que os contêm."""
+    # Sem savepoint: quase sempre roda dentro da transação de quem mudou o preço, e na
+    # maioria das vezes nenhuma lista tem o produto.
+    with transaction.atomic(savepoint=False):
+        # Trava os itens: duas atualizações do mesmo produto não podem partir das mesmas ofertas antigas
+        items = list(
+            ListItem.objects.select_for_update()
+            .filter(product_id__in=product_ids)
+            .order_by("id")
+            .only("id", "list_id", "product_id", "quantity", "offers", "unit_price")
+        )
+        if not items:
+            return
+
+        offers = product_offers({item.product_id for item in items})
+        deltas = defaultdict(_empty_delta)
+        changed = []
+        for item in items:
+            new_offers = offers[item.product_id]
+            if new_offers == item.offers:
+                continue
+            _add_contribution(deltas[item.list_id], item.offers, item.quantity, -1)
+            _add_contribution(deltas[item.list_id], new_offers, item.quantity, +1)
+            item.offers = new_offers
+            item.unit_price = cheapest(new_offers)
+            changed.append(item)
+
+        ListItem.objects.bulk_update(changed, ["offers", "unit_price"])
+        _apply_deltas(deltas)
+
+
+@receiver(prices_changed)
+def update_list_totals(sender, changes, **kwargs):
+    refresh_products({change.stock.product_id for change in changes})
+
+
+# Exclusões: o Collector do Django manda pre_delete de todas as linhas, apaga tudo e
+# só então manda os post_delete. O pre_delete junta o que cada linha precisa ajustar
+# (por `origin`, a exclusão que começou a cascata) e o primeiro post_delete ajusta
+# tudo de uma vez; os seguintes não encontram mais nada pendente.
+_pending = local()
+
+
+def _pending_for(origin, kind, default):
+    pending = getattr(_pending, "deletes", None)
+    if pending is None:
+        pending = _pending.deletes = {}
+    return pending.setdefault((kind, id(origin)), default())
+
+
+def _take_pending(origin, kind):
+    return getattr(_pending, "deletes", {}).pop((kind, id(origin)), None)
+
+
+def _deleted_with(origin, model):
+    """True se a exclusão começou em `model` (instância ou queryset)."""
+    return isinstance(origin, model) or (isinstance(origin, QuerySet) and origin.model is model)
+
+
+@receiver(pre_delete, sender=Stock)
+def collect_deleted_stock(sender, instance, origin=None, **kwargs):
+    # Apagar o produto apaga em cascata os stocks e os itens. Os itens já carregados
+    # guardam as ofertas antigas e são subtraídos em subtract_deleted_items; atualizar
+    # as ofertas aqui faria a lista perder o mesmo item duas vezes.
+    if _deleted_with(origin, Product):
+        return
+    _pending_for(origin, "stocks", set).add(instance.product_id)
+
+
+@receiver(post_delete, sender=Stock)
+def remove_deleted_stocks(sender, origin=None, **kwargs):
+    product_ids = _take_pending(origin, "stocks")
+    if product_ids:
+        refresh_products(product_ids)
+
+
+@receiver(pre_delete, sender=ListItem)
+def collect_deleted_item(sender, instance, origin=None, **kwargs):
+    if _deleted_with(origin, List):
+        return  # a lista vai junto: não há total para ajustar
+    deltas = _pending_for(origin, "items", lambda: defaultdict(_empty_delta))
+    _add_contribution(deltas[instance.list_id], instance.offers, instance.quantity, -1)
+
+
+@receiver(post_delete, sender=ListItem)
+def subtract_deleted_items(sender, origin=None, **kwargs):
+    deltas = _take_pending(origin, "items")
+    if deltas:
+        _apply_deltas(deltas)
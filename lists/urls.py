@@ -0,0 +1,10 @@
+from django.urls import path
+from .views import ListAPI, ListDetailAPI, ListItemsAPI, ListItemDetailAPI, ListOptimizeAPI
+
+urlpatterns = [
+    path('api/lists/', ListAPI.as_view(), name='api-list-list'),
+    path('api/lists/<int:pk>/', ListDetailAPI.as_view(), name='api-list-detail'),
+    path('api/lists/<int:pk>/items/', ListItemsAPI.as_view(), name='api-list-items'),
+    path('api/lists/<int:pk>/items/<int:item_pk>/', ListItemDetailAPI.as_view(), name='api-list-item-detail'),
+    path('api/lists/<int:pk>/optimize/', ListOptimizeAPI.as_view(), name='api-list-optimize'),
+]
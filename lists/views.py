@@ -0,0 +1,142 @@
+from rest_framework.views import APIView
+from rest_framework.response import Response
+from rest_framework import status, permissions
+from django.shortcuts import get_object_or_404
+
+from products.models import Product
+from .models import List, ListItem
+from .serializers import ListSerializer, ListDetailSerializer, ListItemSerializer
+from .optimizer import optimize_list
+from .totals import add_item, set_quantity
+
+
+def parse_quantity(value):
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        return None
+    return quantity if quantity > 0 else None
+
+
+class ListAPI(APIView):
+    '''
+    GET /api/lists/  (painel: todas as listas do usuário em uma única consulta)
+    POST /api/lists/ {"name": str}
+    '''
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        lists = List.objects.filter(user=request.user).order_by("-updated_at")
+        return Response({"success": True, "lists": ListSerializer(lists, many=True).data})
+
+    def post(self, request):
+        serializer = ListSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response({"success": False, "message": "Nome inválido"}, status=status.HTTP_400_BAD_REQUEST)
+
+        list_obj = serializer.save(user=request.user)
+        return Response({"success": True, "list": ListSerializer(list_obj).data}, status=status.HTTP_201_CREATED)
+
+
+class ListDetailAPI(APIView):
+    '''
+    GET /api/lists/${id}/
+    PATCH /api/lists/${id}/ {"name": str}
+    DELETE /api/lists/${id}/
+    '''
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        list_obj = get_object_or_404(List, pk=pk, user=request.user)
+        return Response({"success": True, "list": ListDetailSerializer(list_obj).data})
+
+    def patch(self, request, pk):
+        list_obj = get_object_or_404(List, pk=pk, user=request.user)
+        serializer = ListSerializer(list_obj, data=request.data, partial=True)
+        if not serializer.is_valid():
+            return Response({"success": False, "message": "Nome inválido"}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer.save()
+        return Response({"success": True, "list": serializer.data})
+
+    def delete(self, request, pk):
+        list_obj = get_object_or_404(List, pk=pk, user=request.user)
+        list_obj.delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ListItemsAPI(APIView):
+    '''
+    POST /api/lists/${id}/items/ {"product_id": int, "quantity": Optional[int]}
+    Adiciona o produto (ou troca a quantidade, se já estiver na lista)
+    '''
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request, pk):
+        list_obj = get_object_or_404(List, pk=pk, user=request.user)
+
+        quantity = parse_quantity(request.data.get("quantity", 1))
+        if quantity is None:
+            return Response({"success": False, "message": "Quantidade inválida"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            product = Product.objects.get(pk=request.data.get("product_id"))
+        except (Product.DoesNotExist, ValueError, TypeError):
+            return Response({"success": False, "message": "Produto não encontrado"}, status=status.HTTP_400_BAD_REQUEST)
+
+        item = add_item(list_obj, product, quantity)
+        list_obj.refresh_from_db()
+        return Response({
+            "success": True,
+            "item": ListItemSerializer(item).data,
+            "list": ListSerializer(list_obj).data,
+        }, status=status.HTTP_201_CREATED)
+
+
+class ListItemDetailAPI(APIView):
+    '''
+    PATCH /api/lists/${id}/items/${item_id}/ {"quantity": int}
+    DELETE /api/lists/${id}/items/${item_id}/
+    '''
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_item(self, request, pk, item_pk):
+        return get_object_or_404(ListItem, pk=item_pk, list_id=pk, list__user=request.user)
+
+    def patch(self, request, pk, item_pk):
+        item = self.get_item(request, pk, item_pk)
+
+        quantity = parse_quantity(request.data.get("quantity"))
+        if quantity is None:
+            return Response({"success": False, "message": "Quantidade inválida"}, status=status.HTTP_400_BAD_REQUEST)
+
+        item = set_quantity(item, quantity)
+        return Response({
+            "success": True,
+            "item": ListItemSerializer(item).data,
+            "list": ListSerializer(List.objects.get(pk=pk)).data,
+        })
+
+    def delete(self, request, pk, item_pk):
+        item = self.get_item(request, pk, item_pk)
+        item.delete()  # os totais são ajustados pelo post_delete (lists/totals.py)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class ListOptimizeAPI(APIView):
+    '''
+    GET /api/lists/${id}/optimize/?max_stores=${k}
+    Forma mais barata de comprar a lista, opcionalmente em no máximo k lojas
+    '''
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request, pk):
+        list_obj = get_object_or_404(List, pk=pk, user=request.user)
+
+        max_stores = request.GET.get("max_stores")
+        if max_stores is not None:
+            max_stores = parse_quantity(max_stores)
+            if max_stores is None:
+                return Response({"success": False, "message": "max_stores inválido"}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response({"success": True, **optimize_list(list_obj, max_stores)})
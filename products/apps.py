@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class ProductsConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "products"
+
+    def ready(self):
+        from . import facets, history, pricing, pubsub, signals, stats, stores  # noqa: F401 (registra os receivers)
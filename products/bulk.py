@@ -0,0 +1,207 @@
+"""
+Criação em lote de produtos e stocks numa única transação.
+
+Usado pelo /api/products/bulk_create/: as lojas são resolvidas pelo registro
+em memória (products/stores.py), os produtos são "upsert" pelo nome único e os stocks
+(com histórico) entram com bulk_create. Cada item recebe seu próprio
+resultado de sucesso/erro.
+"""
+
+import math
+
+from django.db import transaction
+from simple_history.utils import bulk_create_with_history
+
+from .lookups import resolve_names
+from .matching import identifiers
+from .models import Category, Product, Stock, SubGroup
+from .signals import PriceChange, prices_changed
+from .stores import store_registry
+
+REQUIRED_FIELDS = ["name", "price", "is_available", "category", "sub_group", "link", "photo", "store"]
+
+# Tamanho máximo de cada campo texto, o mesmo das colunas onde ele é gravado
+MAX_LENGTHS = {
+    "name": Product._meta.get_field("name").max_length,
+    "category": Category._meta.get_field("name").max_length,
+    "sub_group": SubGroup._meta.get_field("name").max_length,
+    "link": Stock._meta.get_field("url").max_length,
+    "photo": Stock._meta.get_field("photo").max_length,
+}
+
+# Campos texto (e a loja, buscada pelo nome): qualquer outro tipo é rejeitado, não convertido
+TEXT_FIELDS = [*MAX_LENGTHS, "store"]
+
+# Identificadores normalizados (matching.identifiers) gravados no Product
+IDENTIFIER_LENGTHS = {
+    "ean": Product._meta.get_field("ean").max_length,
+    "model": Product._meta.get_field("model_number").max_length,
+}
+
+BOOLEANS = {"true": True, "1": True, "false": False, "0": False}
+
+
+def parse_bool(value):
+    """True/False para booleanos e "true"/"false"/"1"/"0" (texto); None para qualquer outra coisa."""
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, str):
+        return BOOLEANS.get(value.strip().lower())
+    return None
+
+
+def parse_price(value):
+    """O preço como float finito e não negativo, ou None se for inválido."""
+    if isinstance(value, bool):
+        return None
+    try:
+        price = float(value)
+    except (TypeError, ValueError):
+        return None
+    return price if math.isfinite(price) and price >= 0 else None
+
+
+def validate_item(item, stores):
+    """Retorna a mensagem de erro do item, ou None se estiver válido."""
+    if not isinstance(item, dict) or any(item.get(field) in (None, "") for field in REQUIRED_FIELDS):
+        return "Campos incompletos"
+    for field in TEXT_FIELDS:
+        if not isinstance(item[field], str):
+            return f"Campo {field} deve ser texto"
+    for field, max_length in MAX_LENGTHS.items():
+        if len(item[field]) > max_length:
+            return f"Campo {field} excede {max_length} caracteres"
+    for field, value in zip(IDENTIFIER_LENGTHS, identifiers(item)):
+        if value and len(value) > IDENTIFIER_LENGTHS[field]:
+            return f"Campo {field} excede {IDENTIFIER_LENGTHS[field]} caracteres"
+    if item["store"] not in stores:
+        return "Loja não encontrada"
+    if parse_price(item["price"]) is None:
+        return "Preço inválido"
+    if parse_bool(item["is_available"]) is None:
+        return "Disponibilidade inválida"
+    return None
+
+
+def resolve_products(items, matcher):
+    """
+    Decide a qual produto cada item pertence. Retorna {índice: nome a criar ou
+    reaproveitar}, {índice: id de produto existente casado pelo matcher} e os
+    ids provisórios dados ao matcher para os produtos ainda não gravados.
+    """
+    names = {index: item["name"] for index, item in items}
+    matched, pending = {}, {}
+    if matcher is None:
+        return names, matched, pending
+
+    known = set(Product.objects.filter(name__in=set(names.values())).values_list("name", flat=True))
+    # pending: id provisório -> nome do item que vai criar o produto
+    for index, item in items:
+        if item["name"] in known:
+            continue
+        ean, model = identifiers(item)
+        match = matcher.match(item["name"], ean=ean, model=model)
+        if match and match[0] > 0:
+            matched[index] = match[0]
+            del names[index]
+        elif match:
+            names[index] = pending[match[0]]  # mesmo produto de outro item do lote
+        else:
+            temp_id = -(len(pending) + 1)
+            pending[temp_id] = item["name"]
+            known.add(item["name"])
+            matcher.add(temp_id, item["name"], ean=ean, model=model)
+
+    return names, matched, pending
+
+
+def bulk_create_products(items, batch_size=500, matcher=None):
+    """
+    Cria os produtos/stocks de `items` (mesmo formato do /api/products/create/).
+    Com um ProductMatcher, itens que casam com um produto existente (de outra
+    loja) viram novos stocks desse produto em vez de um produto novo.
+    Retorna uma lista com um resultado por item, na mesma ordem.
+    """
+    stores = store_registry.resolve(
+        item["store"] for item in items if isinstance(item, dict) and isinstance(item.get("store"), str)
+    )
+    results = [None] * len(items)
+    valid = []
+    for index, item in enumerate(items):
+        error = validate_item(item, stores)
+        if error:
+            results[index] = {"index": index, "success": False, "message": error}
+        else:
+            valid.append((index, item))
+
+    # Links já cadastrados (ou repetidos no próprio lote) não geram stock novo
+    existing_links = set(
+        Stock.objects.filter(url__in=[item["link"] for _, item in valid]).values_list("url", flat=True)
+    )
+    to_create = []
+    for index, item in valid:
+        if item["link"] in existing_links:
+            results[index] = {"index": index, "success": False, "message": "Link já cadastrado"}
+            continue
+        existing_links.add(item["link"])
+        to_create.append((index, item))
+
+    if not to_create:
+        return results
+
+    with transaction.atomic():
+        categories = resolve_names(Category, (item["category"] for _, item in to_create))
+        sub_groups = resolve_names(SubGroup, (item["sub_group"] for _, item in to_create))
+        names, matched, pending = resolve_products(to_create, matcher)
+        new_products = {}
+        for index, item in to_create:
+            if index in names and names[index] not in new_products:
+                ean, model = identifiers(item)
+                new_products[names[index]] = Product(name=names[index], ean=ean, model_number=model)
+
+        products = Product.objects.bulk_create(
+            new_products.values(),
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=["name"],
+            update_fields=["name"],
+        )
+        product_ids = {product.name: product.id for product in products}
+        product_of = {index: product_ids[name] for index, name in names.items()}
+        product_of.update(matched)
+        for temp_id, name in pending.items():
+            matcher.replace(temp_id, product_ids[name])
+
+        stocks = bulk_create_with_history(
+            [
+                Stock(
+                    price=parse_price(item["price"]),
+                    is_available=parse_bool(item["is_available"]),
+                    url=item["link"],
+                    photo=item["photo"],
+                    category=categories[item["category"]],
+                    sub_group=sub_groups[item["sub_group"]],
+                    store=stores[item["store"]],
+                    product_id=product_of[index],
+                )
+                for index, item in to_create
+            ],
+            Stock,
+            batch_size=batch_size,
+        )
+
+        # bulk_create não dispara post_save: avisa os interessados de uma vez só
+        prices_changed.send(
+            sender=Stock,
+            changes=[PriceChange(stock=stock, old_price=None, old_is_available=None, created=True) for stock in stocks],
+        )
+
+    for (index, _), stock in zip(to_create, stocks):
+        results[index] = {
+            "index": index,
+            "success": True,
+            "product_id": stock.product_id,
+            "stock_id": stock.id,
+            "matched": index in matched,
+        }
+    return results
@@ -0,0 +1,139 @@
+"""
+Contagens por categoria, sub-grupo e loja (barra de filtros do front-end).
+
+As três contagens saem de uma única consulta (três GROUP BY unidos com
+UNION ALL) sobre os stocks que passam pelos filtros da listagem. O resultado
+é cacheado por combinação de filtros; a chave inclui uma versão que sobe a
+cada escrita que muda as contagens (stock novo, apagado ou que trocou de
+produto/loja/categoria/sub-grupo; produto ou loja salvos ou apagados), o que
+invalida todas as combinações de uma vez. Saves só de preço não sobem a versão.
+
+Os filtros de preço/disponibilidade seguem a listagem: com loja, valem para o
+stock daquela loja; sem loja, para o menor preço do produto. Combinações com
+esses filtros também levam na chave uma versão de preços, que sobe a cada
+prices_changed.
+"""
+
+import hashlib
+import json
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import CharField, Count, F, Value
+from django.db.models.functions import Cast
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Product, Stock, Store
+from .signals import prices_changed
+from .stores import store_registry
+
+FACETS = ("category", "sub_group", "store")
+VERSION_KEY = "products:facets-version"
+PRICES_VERSION_KEY = "products:facets-prices-version"
+
+
+def bump_version(key=VERSION_KEY):
+    try:
+        cache.incr(key)
+    except ValueError:  # chave ainda não existe (ou expirou)
+        cache.add(key, 1, timeout=None)
+
+
+def cache_key(product_search, store, category=None, sub_group=None, min_price=None, max_price=None,
+              available_only=False):
+    filters = json.dumps([
+        product_search or "", store or "", category or "", sub_group or "", min_price, max_price, bool(available_only)
+    ])
+    digest = hashlib.sha1(filters.encode()).hexdigest()
+    version = cache.get(VERSION_KEY, 0)
+    if min_price is not None or max_price is not None or available_only:
+        version = f"{version}.{cache.get(PRICES_VERSION_KEY, 0)}"
+    return f"products:facets:{version}:{digest}"
+
+
+def compute_facets(product_search=None, store=None, category=None, sub_group=None, min_price=None,
+                   max_price=None, available_only=False):
+    """{"category": [{"value", "count"}], "sub_group": [...], "store": [{"id", "value", "count"}]}"""
+    stocks = Stock.objects.all()
+    if product_search:
+        stocks = stocks.filter(product__name__icontains=product_search)
+    if store:
+        stocks = stocks.filter(store_id__in=store_registry.ids_matching(store))
+    if category:
+        stocks = stocks.filter(category__name=category)
+    if sub_group:
+        stocks = stocks.filter(sub_group__name=sub_group)
+
+    # mesma regra da listagem: com loja, o preço do próprio stock; sem loja, o menor preço do produto
+    prefix = "" if store else "product__lowest_"
+    if min_price is not None:
+        stocks = stocks.filter(**{f"{prefix}price__gte": min_price})
+    if max_price is not None:
+        stocks = stocks.filter(**{f"{prefix}price__lte": max_price})
+    if available_only:
+        stocks = stocks.filter(is_available=True) if store else stocks.filter(product__is_available=True)
+
+    def grouped(facet, value):
+        # conta produtos distintos: um produto com dois stocks na mesma categoria conta uma vez
+        return (
+            stocks.annotate(facet=Value(facet, output_field=CharField()), value=value)
+            .values("facet", "value")
+            .annotate(count=Count("product_id", distinct=True))
+            .values_list("facet", "value", "count")
+        )
+
+    rows = grouped("category", F("category__name")).union(
+        grouped("sub_group", F("sub_group__name")),
+        grouped("store", Cast("store_id", CharField())),
+        all=True,
+    )
+
+    facets = {facet: [] for facet in FACETS}
+    for facet, value, count in rows:
+        if facet == "store":
+            rendered = store_registry.render(int(value))
+            facets[facet].append({"id": int(value), "value": rendered["name"] if rendered else value, "count": count})
+        else:
+            facets[facet].append({"value": value, "count": count})
+    for values in facets.values():
+        values.sort(key=lambda item: (-item["count"], item["value"]))
+    return facets
+
+
+def get_facets(product_search=None, store=None, category=None, sub_group=None, min_price=None, max_price=None,
+               available_only=False):
+    filters = (product_search, store, category, sub_group, min_price, max_price, available_only)
+    key = cache_key(*filters)
+    facets = cache.get(key)
+    if facets is None:
+        facets = compute_facets(*filters)
+        cache.set(key, facets, getattr(settings, "PRODUCT_FACETS_CACHE_TIMEOUT", 300))
+    return facets
+
+
+@receiver(post_save, sender=Stock)
+def invalidate_on_stock_save(sender, instance, created, update_fields=None, **kwargs):
+    if update_fields is not None and not set(update_fields) & set(Stock.FACET_FIELDS):
+        return  # ex.: save(update_fields=["price"]); os campos em memória não foram gravados
+    state = instance.facet_state()
+    if created or state != instance._loaded_facets:
+        bump_version()
+    instance._loaded_facets = state
+
+
+@receiver(post_delete, sender=Stock)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Store)  # o nome da loja vai junto no resultado cacheado
+def invalidate_on_write(sender, **kwargs):
+    bump_version()
+
+
+@receiver(prices_changed)
+def invalidate_on_bulk_create(sender, changes, **kwargs):
+    # os caminhos em lote (bulk_create) não disparam post_save; mudança só de preço
+    # altera apenas as contagens filtradas por preço/disponibilidade
+    if any(change.created for change in changes):
+        bump_version()
+    bump_version(PRICES_VERSION_KEY)
@@ -0,0 +1,123 @@
+"""
+Histórico compacto de preços (PricePoint/DailyPrice).
+
+O HistoricalStock do simple_history não guarda preço nem disponibilidade (e
+saves que só mudam esses campos não geram linha nele): o histórico de preços
+é só este, com o que é lido (preço, disponibilidade e data) e apenas quando
+algo muda. Pontos antigos são reduzidos a min/max/fechamento por dia. Os
+registros de preço que o HistoricalStock tinha foram copiados para cá pelas
+migrações 0012 e 0013.
+"""
+
+from datetime import datetime, time
+
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import DailyPrice, PricePoint, Stock
+from .signals import prices_changed
+
+
+@receiver(prices_changed)
+def record_price_points(sender, changes, **kwargs):
+    now = timezone.now()
+    PricePoint.objects.bulk_create(
+        [
+            PricePoint(
+                stock_id=change.stock.id,
+                timestamp=now,
+                price=change.stock.price,
+                is_available=change.stock.is_available,
+            )
+            for change in changes
+        ]
+    )
+
+
+def price_history(stock):
+    """
+    Histórico do stock em ordem cronológica, no formato {price, history_date}.
+    Usa os prefetches de `daily_prices`/`price_points` quando existirem.
+    """
+    tz = timezone.get_current_timezone()
+    history = [
+        {
+            "price": day.close_price,
+            "history_date": timezone.make_aware(datetime.combine(day.date, time.min), tz),
+        }
+        for day in stock.daily_prices.all()
+    ]
+    history += [
+        {"price": point.price, "history_date": point.timestamp}
+        for point in stock.price_points.all()
+    ]
+    history.sort(key=lambda item: item["history_date"])
+    return history
+
+
+def downsample_stock(stock, cutoff):
+    """
+    Reduz os PricePoints do stock anteriores a `cutoff` a um DailyPrice por
+    dia (mínimo, máximo e último preço do dia). Retorna quantos pontos saíram.
+    """
+    old_points = stock.price_points.filter(timestamp__lt=cutoff)
+    days = {}
+    for price, is_available, ts in old_points.order_by("timestamp").values_list(
+        "price", "is_available", "timestamp"
+    ).iterator():
+        day = timezone.localdate(ts)
+        if day in days:
+            summary = days[day]
+            summary.min_price = min(summary.min_price, price)
+            summary.max_price = max(summary.max_price, price)
+            summary.close_price = price  # pontos em ordem cronológica: o último do dia fecha
+            summary.close_at = ts
+            summary.is_available = is_available
+        else:
+            days[day] = DailyPrice(
+                stock_id=stock.id,
+                date=day,
+                min_price=price,
+                max_price=price,
+                close_price=price,
+                close_at=ts,
+                is_available=is_available,
+            )
+
+    if not days:
+        return 0
+
+    with transaction.atomic():
+        # Dias já resumidos numa execução anterior são mesclados
+        for existing in DailyPrice.objects.filter(stock_id=stock.id, date__in=days):
+            summary = days[existing.date]
+            summary.min_price = min(summary.min_price, existing.min_price)
+            summary.max_price = max(summary.max_price, existing.max_price)
+            if existing.close_at and existing.close_at > summary.close_at:
+                # o resumo gravado fecha depois dos pontos desta execução: o fechamento dele vale
+                summary.close_price, summary.close_at = existing.close_price, existing.close_at
+                summary.is_available = existing.is_available
+
+        DailyPrice.objects.bulk_create(
+            days.values(),
+            update_conflicts=True,
+            unique_fields=["stock", "date"],
+            update_fields=["min_price", "max_price", "close_price", "close_at", "is_available"],
+        )
+        removed, _ = old_points.delete()
+
+    return removed
+
+
+def compact_stocks(cutoff, batch_size=1000, prune_history=False):
+    """Executa a redução para todos os stocks; usado pelo compact_history."""
+    totals = {"downsampled": 0, "pruned": 0}
+
+    for stock in Stock.objects.only("id").order_by("id").iterator(chunk_size=batch_size):
+        totals["downsampled"] += downsample_stock(stock, cutoff)
+
+    if prune_history:
+        totals["pruned"], _ = Stock.history.filter(history_date__lt=cutoff).delete()
+
+    return totals
@@ -0,0 +1,85 @@
+"""
+Importação em lote a partir de links de produto.
+
+Os links são deduplicados (entre si e contra Stock.url), raspados em paralelo
+com get_product_info_from_url e gravados em lotes pelo bulk_create_products.
+Cada link recebe seu próprio resultado.
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+
+from .bulk import bulk_create_products
+from .models import Stock
+from .scraper_metrics import flush_samples
+
+
+def default_scrape(url):
+    # import tardio: o scraper puxa requests, bs4 e lxml
+    from .scrapper import get_product_info_from_url
+
+    return get_product_info_from_url(url)
+
+
+def _scrape_safely(scrape, url):
+    try:
+        return scrape(url)
+    except Exception as e:
+        return f"Erro ao processar link: {str(e)}"
+
+
+def import_links(links, scrape=default_scrape, workers=8, batch_size=100, matcher=None):
+    """
+    Importa os links e retorna [{"link", "status", ...}], um por link de
+    entrada e na mesma ordem, com status "created", "duplicate" ou "error".
+    Links repetidos são raspados uma vez só; as repetições de um link criado
+    aparecem como "duplicate" do produto criado. Com um ProductMatcher, os
+    itens de outras lojas são anexados ao produto equivalente já cadastrado.
+    """
+    inputs = [link.strip() if link else "" for link in links]
+    links = list(dict.fromkeys(link for link in inputs if link))
+    existing = dict(Stock.objects.filter(url__in=links).values_list("url", "product_id"))
+
+    results = {}
+    pending = []
+    for link in links:
+        if link in existing:
+            results[link] = {"link": link, "status": "duplicate", "product_id": existing[link]}
+        else:
+            pending.append(link)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for start in range(0, len(pending), batch_size):
+            batch = pending[start:start + batch_size]
+            scraped = list(executor.map(lambda link: _scrape_safely(scrape, link), batch))
+            flush_samples()  # as métricas das buscas vão para o banco a cada lote
+
+            items, item_links = [], []
+            for link, data in zip(batch, scraped):
+                if not data or isinstance(data, str):
+                    results[link] = {"link": link, "status": "error", "message": data or "Sem dados"}
+                    continue
+                items.append({**data, "link": link})
+                item_links.append(link)
+
+            for link, result in zip(item_links, bulk_create_products(items, matcher=matcher)):
+                if result["success"]:
+                    results[link] = {
+                        "link": link,
+                        "status": "created",
+                        "product_id": result["product_id"],
+                        "stock_id": result["stock_id"],
+                        "matched": result["matched"],
+                    }
+                else:
+                    results[link] = {"link": link, "status": "error", "message": result["message"]}
+
+    report, seen = [], set()
+    for link in inputs:
+        if not link:
+            report.append({"link": link, "status": "error", "message": "Link vazio"})
+        elif link in seen and results[link]["status"] == "created":
+            report.append({"link": link, "status": "duplicate", "product_id": results[link]["product_id"]})
+        else:
+            report.append(dict(results[link]))
+        seen.add(link)
+    return report
@@ -0,0 +1,167 @@
+"""
+Teste de carga da API de produtos (ver manage.py loadtest).
+
+Monta um plano com uma mistura de requisições (listagem paginada, busca por
+nome, filtro por loja e scrape de uma loja stub), executa com N threads e
+resume latência p50/p95/p99 e vazão por cenário. O mesmo plano roda dentro
+do processo (django.test.Client, sem rede) ou contra um servidor rodando.
+"""
+
+import json
+import random
+import threading
+from collections import defaultdict
+from time import perf_counter
+from urllib.parse import quote
+
+from django.conf import settings
+from django.db import connection
+from django.test import Client
+
+from .metrics import percentile
+
+DEFAULT_MIX = {"list": 40, "search": 25, "store": 20, "scrape": 15}
+
+
+def parse_mix(raw):
+    """ "list=40,scrape=10" -> {"list": 40, "scrape": 10}. Levanta ValueError."""
+    mix = {}
+    for part in raw.split(","):
+        scenario, _, weight = part.partition("=")
+        scenario = scenario.strip()
+        if scenario not in DEFAULT_MIX:
+            raise ValueError(f"Cenário desconhecido: {scenario}")
+        mix[scenario] = int(weight)
+    return mix
+
+
+def in_process_sender(user):
+    """Fábrica de senders (um por thread) que chamam a API pelo django.test.Client."""
+    host = next((h.lstrip(".") for h in settings.ALLOWED_HOSTS if h != "*"), "localhost")
+
+    def factory():
+        client = Client(HTTP_HOST=host)
+        client.force_login(user)
+
+        def send(path):
+            response = client.get(path)
+            return response.status_code, response.content
+
+        return send
+
+    return factory
+
+
+def http_sender(base_url, auth=None):
+    """Fábrica de senders que chamam um servidor de verdade (auth: (usuário, senha) para Basic)."""
+    import requests
+
+    def factory():
+        session = requests.Session()
+        session.auth = auth
+
+        def send(path):
+            response = session.get(base_url.rstrip("/") + path, timeout=60)
+            return response.status_code, response.content
+
+        return send
+
+    return factory
+
+
+def vocabulary(send, pages=3):
+    """Nomes de produtos e de lojas lidos da própria API, para montar buscas e filtros."""
+    names, stores = [], set()
+    for page in range(1, pages + 1):
+        status, content = send(f"/api/products/?page={page}&page_size=100")
+        if status != 200:
+            break
+        results = json.loads(content)["results"]
+        for product in results:
+            names.append(product["name"])
+            stores.update(stock["store"]["name"] for stock in product["stocks"])
+        if len(results) < 100:
+            break
+    return names, sorted(stores)
+
+
+def build_plan(total, mix, names, stores, scrape_urls=(), seed=0):
+    """Lista de (cenário, caminho) sorteada segundo os pesos de `mix`."""
+    rng = random.Random(seed)
+    mix = {scenario: weight for scenario, weight in mix.items() if weight > 0}
+    if not names or not stores:
+        mix = {s: w for s, w in mix.items() if s not in ("search", "store")}
+    if not scrape_urls:
+        mix.pop("scrape", None)
+    if not mix:
+        raise ValueError("Nenhum cenário executável (o catálogo está vazio?)")
+
+    terms = [word for name in names for word in name.split() if len(word) >= 3 and not word.startswith("#")]
+    plan = []
+    for scenario in rng.choices(list(mix), weights=list(mix.values()), k=total):
+        if scenario == "list":
+            path = f"/api/products/?page={rng.randint(1, 20)}&page_size={rng.choice((5, 20, 50))}"
+        elif scenario == "search":
+            path = f"/api/products/?product_search={quote(rng.choice(terms))}"
+        elif scenario == "store":
+            path = f"/api/products/?store={quote(rng.choice(stores))}&page_size=20"
+        else:
+            path = f"/api/products/scrape/?link={quote(rng.choice(scrape_urls))}"
+        plan.append((scenario, path))
+    return plan
+
+
+def run_plan(plan, sender_factory, concurrency=1):
+    """Executa o plano. Retorna ([(cenário, status, segundos)], duração total)."""
+    samples = []
+    lock = threading.Lock()
+    queue = iter(plan)
+
+    def worker():
+        send = sender_factory()
+        local = []
+        try:
+            while True:
+                with lock:
+                    item = next(queue, None)
+                if item is None:
+                    break
+                scenario, path = item
+                start = perf_counter()
+                status, _ = send(path)
+                local.append((scenario, status, perf_counter() - start))
+        finally:
+            with lock:
+                samples.extend(local)
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+
+    start = perf_counter()
+    if concurrency <= 1:
+        worker()
+    else:
+        threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    return samples, perf_counter() - start
+
+
+def summarize(samples, elapsed):
+    """{cenário: {count, errors, p50, p95, p99 (ms), rps}}, com a linha "total"."""
+    groups = defaultdict(list)
+    for scenario, status, seconds in samples:
+        groups[scenario].append((status, seconds))
+        groups["total"].append((status, seconds))
+
+    summary = {}
+    for scenario, rows in groups.items():
+        timings = [seconds * 1000 for _, seconds in rows]
+        summary[scenario] = {
+            "count": len(rows),
+            "errors": sum(1 for status, _ in rows if status >= 400),
+            **{f"p{p}": percentile(timings, p) for p in (50, 95, 99)},
+            "rps": len(rows) / elapsed if elapsed else 0.0,
+        }
+    return summary
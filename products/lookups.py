@@ -0,0 +1,32 @@
+"""
+Categorias e sub-grupos dos stocks.
+
+Ficam em tabelas próprias (Category/SubGroup) e o stock guarda só o id; a
+API continua recebendo e devolvendo os nomes. Nomes novos são criados na
+hora, com ignore_conflicts para não falhar se outro processo criar o mesmo
+nome ao mesmo tempo.
+"""
+
+from .models import Category, SubGroup
+
+
+def resolve_names(model, names):
+    """{nome: instância de `model`} para todos os `names`, criando os que faltam."""
+    names = set(names)
+    if not names:
+        return {}
+    found = {row.name: row for row in model.objects.filter(name__in=names)}
+    missing = names - found.keys()
+    if missing:
+        model.objects.bulk_create([model(name=name) for name in missing], ignore_conflicts=True)
+        # ignore_conflicts não devolve os ids: busca os recém-criados
+        found.update((row.name, row) for row in model.objects.filter(name__in=missing))
+    return found
+
+
+def classification(category, sub_group):
+    """Campos category/sub_group de um Stock a partir dos nomes: Stock(..., **classification(c, s))."""
+    return {
+        "category": resolve_names(Category, [category])[category],
+        "sub_group": resolve_names(SubGroup, [sub_group])[sub_group],
+    }
@@ -0,0 +1,36 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.history import compact_stocks
+
+
+class Command(BaseCommand):
+    help = (
+        "Reduz os pontos do histórico de preços (PricePoint) com mais de N dias "
+        "a min/max/fechamento diários."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=90,
+            help="Pontos mais antigos que isso viram resumos diários (padrão: 90)",
+        )
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument(
+            "--prune-history", action="store_true",
+            help="Apaga também os registros do HistoricalStock mais antigos que --days",
+        )
+
+    def handle(self, *args, **options):
+        cutoff = timezone.now() - timedelta(days=options["days"])
+        totals = compact_stocks(
+            cutoff, batch_size=options["batch_size"], prune_history=options["prune_history"]
+        )
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{totals['downsampled']} pontos reduzidos a resumos diários, "
+                f"{totals['pruned']} registros do histórico apagados"
+            )
+        )
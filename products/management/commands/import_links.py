@@ -0,0 +1,43 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from products.importer import import_links
+from products.matching import ProductMatcher
+
+
+class Command(BaseCommand):
+    help = "Importa produtos a partir de links de lojas (um por linha, de um arquivo ou da entrada padrão)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("file", nargs="?", help="Arquivo com um link por linha (padrão: stdin)")
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument(
+            "--match", action="store_true",
+            help="Anexa itens de outras lojas ao produto equivalente já cadastrado",
+        )
+
+    def handle(self, *args, **options):
+        if options["file"]:
+            with open(options["file"], encoding="utf-8") as f:
+                links = f.read().splitlines()
+        else:
+            links = sys.stdin.read().splitlines()
+
+        links = [link for link in links if link.strip()]  # linhas em branco do arquivo
+        matcher = ProductMatcher.from_database() if options["match"] else None
+        results = import_links(
+            links, workers=options["workers"], batch_size=options["batch_size"], matcher=matcher
+        )
+
+        for result in results:
+            if result["status"] == "error":
+                self.stderr.write(f"{result['link']}: {result['message']}")
+
+        counts = {status: sum(1 for r in results if r["status"] == status) for status in ("created", "duplicate", "error")}
+        matched = sum(1 for r in results if r.get("matched"))
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['created']} criados ({matched} anexados a produtos existentes), "
+            f"{counts['duplicate']} já cadastrados, {counts['error']} com erro"
+        ))
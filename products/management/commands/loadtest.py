@@ -0,0 +1,76 @@
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+
+from products.loadtest import (
+    DEFAULT_MIX, build_plan, http_sender, in_process_sender, parse_mix, run_plan, summarize, vocabulary,
+)
+from products.stubstore import StubStoreServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Dispara uma mistura de requisições (listagem, busca, filtro por loja e scrape "
+        "numa loja stub) e mostra latência p50/p95/p99 e vazão. Use seed_catalog antes."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500)
+        parser.add_argument("--concurrency", type=int, default=4)
+        parser.add_argument(
+            "--mix", default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()),
+            help="Pesos dos cenários (padrão: %(default)s)",
+        )
+        parser.add_argument("--warmup", type=int, default=20, help="Requisições descartadas antes da medição")
+        parser.add_argument(
+            "--base-url",
+            help="Servidor a testar (ex.: http://localhost:8000). Sem isso, roda dentro do processo",
+        )
+        parser.add_argument("--username", help="Usuário para o scrape com --base-url (Basic auth)")
+        parser.add_argument("--password")
+        parser.add_argument("--seed", type=int, default=0)
+
+    def handle(self, *args, **options):
+        try:
+            mix = parse_mix(options["mix"])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options["base_url"]:
+            auth = (options["username"], options["password"]) if options["username"] else None
+            factory = http_sender(options["base_url"], auth)
+        else:
+            user, _ = get_user_model().objects.get_or_create(username="loadtest")
+            factory = in_process_sender(user)
+
+        names, stores = vocabulary(factory())
+        rng = random.Random(options["seed"])
+        stub = StubStoreServer({
+            str(i): {"name": name, "price": round(rng.uniform(30, 5000), 2)}
+            for i, name in enumerate(names[:50])
+        }).start()
+        try:
+            scrape_urls = [stub.url(key) for key in stub.products]
+            try:
+                warmup = build_plan(options["warmup"], mix, names, stores, scrape_urls, seed=options["seed"] + 1)
+                plan = build_plan(options["requests"], mix, names, stores, scrape_urls, seed=options["seed"])
+            except ValueError as e:
+                raise CommandError(str(e))
+            run_plan(warmup, factory, options["concurrency"])
+            samples, elapsed = run_plan(plan, factory, options["concurrency"])
+        finally:
+            stub.stop()
+
+        summary = summarize(samples, elapsed)
+        self.stdout.write(
+            f"{len(samples)} requisições em {elapsed:.2f}s com {options['concurrency']} threads "
+            f"({summary['total']['rps']:.1f} req/s)"
+        )
+        self.stdout.write(f"{'cenário':<10} {'reqs':>6} {'erros':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'req/s':>8}")
+        for scenario in (*[s for s in DEFAULT_MIX if s in summary], "total"):
+            row = summary[scenario]
+            self.stdout.write(
+                f"{scenario:<10} {row['count']:>6} {row['errors']:>6} {row['p50']:>9.1f} "
+                f"{row['p95']:>9.1f} {row['p99']:>9.1f} {row['rps']:>8.1f}"
+            )
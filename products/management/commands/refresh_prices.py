@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from products.refresh import refresh_catalog, shares_price_changes
+
+
+class Command(BaseCommand):
+    help = (
+        "Atualiza preço/disponibilidade de todo o catálogo em lotes, salvando um checkpoint "
+        "a cada lote. Se a execução anterior não terminou, continua de onde parou."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=500)
+        parser.add_argument("--workers", type=int, default=8)
+        parser.add_argument("--restart", action="store_true", help="Ignora o checkpoint e começa do início")
+
+    def handle(self, *args, **options):
+        if not shares_price_changes():
+            self.stderr.write(self.style.WARNING(
+                "Cache padrão ou PRODUCTS_PUBSUB_BROKER locais ao processo: os workers web só verão os "
+                "novos preços quando seus caches expirarem, e o stream de preços não receberá eventos."
+            ))
+        def progress(checkpoint, changed):
+            self.stdout.write(
+                f"até o produto {checkpoint.last_product_id}: {checkpoint.processed} processados, "
+                f"{checkpoint.updated} atualizados"
+            )
+
+        checkpoint = refresh_catalog(
+            chunk_size=options["chunk_size"], workers=options["workers"],
+            restart=options["restart"], on_chunk=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{checkpoint.processed} produtos processados e {checkpoint.updated} atualizados "
+            f"em {(checkpoint.finished_at - checkpoint.started_at).total_seconds():.0f}s"
+        ))
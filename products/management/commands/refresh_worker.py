@@ -0,0 +1,39 @@
+from django.core.management.base import BaseCommand
+
+from products.refresh import run_worker, shares_price_changes, worker_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Atualiza os stocks desatualizados reservando lotes com lease, até não sobrar nenhum. "
+        "Vários workers (processos ou máquinas) podem rodar ao mesmo tempo sobre o mesmo banco."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=50)
+        parser.add_argument("--workers", type=int, default=8, help="Threads de scraping por lote")
+        parser.add_argument("--lease-seconds", type=int, default=300, help="Validade da reserva de um lote")
+        parser.add_argument(
+            "--max-age", type=int, default=3600, help="Atualiza stocks não atualizados há mais de N segundos"
+        )
+        parser.add_argument("--name", default=None, help="Nome do worker (padrão: host:pid)")
+
+    def handle(self, *args, **options):
+        name = options["name"] or worker_name()
+        if not shares_price_changes():
+            self.stderr.write(self.style.WARNING(
+                "Cache padrão ou PRODUCTS_PUBSUB_BROKER locais ao processo: os workers web só verão os "
+                "novos preços quando seus caches expirarem, e o stream de preços não receberá eventos."
+            ))
+
+        def progress(stocks, changed):
+            self.stdout.write(f"{name}: lote de {len(stocks)} stocks, {len(changed)} atualizados")
+
+        totals = run_worker(
+            batch_size=options["batch_size"], workers=options["workers"],
+            lease_seconds=options["lease_seconds"], max_age=options["max_age"],
+            worker=name, on_batch=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{name}: {totals['processed']} stocks processados e {totals['updated']} atualizados"
+        ))
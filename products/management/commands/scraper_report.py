@@ -0,0 +1,76 @@
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from products.metrics import percentile
+from products.models import ScrapeSample
+from products.scraper_metrics import PHASES
+
+
+def ms(value):
+    return "-" if value is None else f"{value * 1000:.0f}"
+
+
+class Command(BaseCommand):
+    help = (
+        "Resume as buscas do scraper por loja: volume, falhas por categoria e "
+        "p50/p95 de cada fase (DNS, TTFB, download, parse), da loja mais lenta para a mais rápida."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--hours", type=int, default=24, help="Janela do relatório (padrão: 24)")
+        parser.add_argument("--store", help="Só esta loja (domínio, ex.: kabum.com.br)")
+        parser.add_argument(
+            "--prune-days", type=int,
+            help="Apaga as amostras mais antigas que N dias antes de gerar o relatório",
+        )
+
+    def handle(self, *args, **options):
+        now = timezone.now()
+        if options["prune_days"] is not None:
+            deleted, _ = ScrapeSample.objects.filter(
+                started_at__lt=now - timedelta(days=options["prune_days"])
+            ).delete()
+            self.stdout.write(f"{deleted} amostras antigas apagadas")
+
+        samples = ScrapeSample.objects.filter(started_at__gte=now - timedelta(hours=options["hours"]))
+        if options["store"]:
+            samples = samples.filter(store=options["store"])
+
+        stores = defaultdict(lambda: {"count": 0, "failures": Counter(), "bytes": [], "total": [], **{p: [] for p in PHASES}})
+        for row in samples.values("store", "failure", "bytes", *PHASES).iterator():
+            store = stores[row["store"]]
+            store["count"] += 1
+            if row["failure"]:
+                store["failures"][row["failure"]] += 1
+            if row["bytes"] is not None:
+                store["bytes"].append(row["bytes"])
+            for phase in PHASES:
+                if row[phase] is not None:
+                    store[phase].append(row[phase])
+            store["total"].append(sum(row[phase] or 0 for phase in PHASES))
+
+        if not stores:
+            self.stdout.write(f"Nenhuma busca nas últimas {options['hours']} horas")
+            return
+
+        header = f"{'loja':<30} {'buscas':>7} {'falhas':>7}" + "".join(
+            f" {phase + ' p50/p95 ms':>20}" for phase in (*PHASES, "total")
+        ) + f" {'KB médio':>9}"
+        self.stdout.write(header)
+
+        ranked = sorted(stores.items(), key=lambda item: percentile(item[1]["total"], 95) or 0, reverse=True)
+        for name, store in ranked:
+            failures = sum(store["failures"].values())
+            line = f"{name:<30} {store['count']:>7} {failures:>7}"
+            for phase in (*PHASES, "total"):
+                timing = f"{ms(percentile(store[phase], 50))}/{ms(percentile(store[phase], 95))}"
+                line += f" {timing:>20}"
+            kb = sum(store["bytes"]) / len(store["bytes"]) / 1024 if store["bytes"] else None
+            line += f" {'-' if kb is None else f'{kb:.1f}':>9}"
+            self.stdout.write(line)
+            if failures:
+                categories = ", ".join(f"{category}={count}" for category, count in store["failures"].most_common())
+                self.stdout.write(f"    falhas: {categories}")
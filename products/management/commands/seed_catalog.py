@@ -0,0 +1,28 @@
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from products.seeding import seed_catalog
+
+
+class Command(BaseCommand):
+    help = "Gera um catálogo sintético (lojas, produtos, ofertas e histórico de preços) para testes de carga."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--products", type=int, default=1000)
+        parser.add_argument("--stores", type=int, default=10)
+        parser.add_argument("--history-points", type=int, default=30,
+                            help="Preços diários por oferta em PricePoint (padrão: 30)")
+        parser.add_argument("--seed", type=int, default=0)
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        start = perf_counter()
+        counts = seed_catalog(
+            options["products"], options["stores"], options["history_points"],
+            seed=options["seed"], batch_size=options["batch_size"],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"{counts['stores']} lojas, {counts['products']} produtos, {counts['stocks']} ofertas e "
+            f"{counts['price_points']} pontos de preço criados em {perf_counter() - start:.1f}s"
+        ))
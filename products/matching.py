@@ -0,0 +1,141 @@
+"""
+Casamento de produtos entre lojas.
+
+O nome de um mesmo produto varia de loja para loja ("SSD 1 TB Kingston NV2..."
+vs "SSD Kingston NV2 1TB..."), então comparamos nomes normalizados. Para não
+comparar todos contra todos, um índice invertido (token -> produtos) gera os
+candidatos a partir dos tokens mais raros do nome (blocking); só esses
+candidatos são pontuados. EAN e número de modelo, quando existem, decidem o
+casamento sozinhos.
+"""
+
+import re
+import unicodedata
+from array import array
+from collections import Counter, defaultdict
+
+STOPWORDS = {
+    "a", "as", "o", "os", "e", "de", "da", "das", "do", "dos", "com", "para",
+    "em", "no", "na", "por", "sem", "and", "the", "for", "with",
+}
+UNITS = {"gb", "tb", "mb", "mhz", "ghz", "hz", "w", "mm", "cm", "pol", "v", "ml", "l", "kg", "g"}
+MODEL_NUMBER = re.compile(r"^(?=.*[a-z])(?=.*\d)[a-z\d]{5,}$")
+
+
+def normalize_tokens(name):
+    """Tokens normalizados: minúsculas, sem acentos, sem stopwords e com "1 tb" -> "1tb"."""
+    text = unicodedata.normalize("NFKD", name.lower())
+    text = "".join(char for char in text if not unicodedata.combining(char))
+    raw = re.findall(r"[a-z0-9]+", text)
+
+    tokens = []
+    for token in raw:
+        if token in UNITS and tokens and tokens[-1].isdigit():
+            tokens[-1] += token
+        elif token not in STOPWORDS:
+            tokens.append(token)
+    return tokens
+
+
+def model_numbers(tokens):
+    """Tokens com letras e dígitos (SNV2S1000G, RTX5070...) que parecem códigos de modelo."""
+    # "1000gb"/"3500mb" são capacidades, não modelos: número seguido só de letras
+    return {
+        token for token in tokens
+        if MODEL_NUMBER.match(token) and not re.fullmatch(r"\d+[a-z]+", token)
+    }
+
+
+def identifiers(data):
+    """EAN e modelo de um item raspado (chaves "ean"/"model", quando a loja fornece)."""
+    ean = re.sub(r"\D", "", str(data.get("ean") or "")) or None
+    model = "".join(normalize_tokens(str(data.get("model") or ""))) or None
+    return ean, model
+
+
+class ProductMatcher:
+    def __init__(self, threshold=0.6, candidate_tokens=4, max_candidates=10):
+        self.threshold = threshold
+        self.candidate_tokens = candidate_tokens
+        self.max_candidates = max_candidates
+        self.postings = defaultdict(lambda: array("q"))
+        self.names = {}  # product_id -> tokens normalizados (separados por espaço)
+        self.by_ean = {}
+        self.by_model = {}
+        self.identifiers = {}  # só dos ids provisórios (negativos), ver replace()
+
+    @classmethod
+    def from_database(cls, chunk_size=10000, **kwargs):
+        from .models import Product
+
+        matcher = cls(**kwargs)
+        products = Product.objects.values_list("id", "name", "ean", "model_number").order_by("id")
+        for product_id, name, ean, model in products.iterator(chunk_size=chunk_size):
+            matcher.add(product_id, name, ean=ean, model=model)
+        return matcher
+
+    def add(self, product_id, name, ean=None, model=None):
+        tokens = list(dict.fromkeys(normalize_tokens(name)))
+        self.names[product_id] = " ".join(tokens)
+        for token in tokens:
+            self.postings[token].append(product_id)
+        if ean:
+            self.by_ean[ean] = product_id
+        if model:
+            self.by_model[model] = product_id
+        if product_id < 0:
+            self.identifiers[product_id] = (ean, model)
+
+    def replace(self, old_id, new_id):
+        """Troca um id provisório (produto ainda não gravado) pelo id definitivo."""
+        name = self.names.pop(old_id)
+        self.names[new_id] = name
+        for token in name.split():
+            postings = self.postings[token]
+            # Ids provisórios foram adicionados por último: procura do fim
+            for i in range(len(postings) - 1, -1, -1):
+                if postings[i] == old_id:
+                    postings[i] = new_id
+                    break
+        ean, model = self.identifiers.pop(old_id, (None, None))
+        if ean:
+            self.by_ean[ean] = new_id
+        if model:
+            self.by_model[model] = new_id
+
+    def candidates(self, tokens):
+        """Produtos que compartilham algum dos tokens mais raros do nome."""
+        known = [token for token in tokens if token in self.postings]
+        rarest = sorted(known, key=lambda token: len(self.postings[token]))[: self.candidate_tokens]
+        counts = Counter()
+        for token in rarest:
+            counts.update(self.postings[token])
+        return [product_id for product_id, _ in counts.most_common(self.max_candidates)]
+
+    def score(self, tokens, product_id):
+        other = set(self.names[product_id].split())
+        tokens = set(tokens)
+        ours, theirs = model_numbers(tokens), model_numbers(other)
+        if ours and theirs and not ours & theirs:
+            return 0.0  # códigos de modelo diferentes: produtos diferentes
+        return len(tokens & other) / len(tokens | other)
+
+    def match(self, name, ean=None, model=None):
+        """Retorna (product_id, score) do melhor candidato acima do limiar, ou None."""
+        if ean and ean in self.by_ean:
+            return self.by_ean[ean], 1.0
+        if model and model in self.by_model:
+            return self.by_model[model], 1.0
+
+        tokens = list(dict.fromkeys(normalize_tokens(name)))
+        if not tokens:
+            return None
+
+        best = max(
+            ((product_id, self.score(tokens, product_id)) for product_id in self.candidates(tokens)),
+            key=lambda candidate: candidate[1],
+            default=None,
+        )
+        if best and best[1] >= self.threshold:
+            return best
+        return None
@@ -0,0 +1,109 @@
+"""
+Métricas em memória no formato de texto do Prometheus.
+
+Cada processo (worker) mantém o seu registro; o Prometheus soma os workers ao
+raspar /api/_metrics de cada um. As operações são um lock + bisect, baratas o
+bastante para ficarem ligadas em produção.
+"""
+
+import math
+import threading
+from bisect import bisect_left
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+COUNT_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # o último é o +Inf
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+def percentile(values, p):
+    """Percentil p (0-100) pelo método do posto mais próximo; None sem valores."""
+    if not values:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
+
+
+def _labels(labels, **extra):
+    items = {**labels, **extra}
+    if not items:
+        return ""
+    return "{" + ",".join(f'{key}="{value}"' for key, value in sorted(items.items())) + "}"
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # nome -> (help, buckets, {labels: Histogram})
+        self._counters = {}  # nome -> (help, {labels: valor})
+
+    def histogram(self, name, help_text, buckets=LATENCY_BUCKETS):
+        with self._lock:
+            self._histograms.setdefault(name, (help_text, buckets, {}))
+
+    def counter(self, name, help_text):
+        with self._lock:
+            self._counters.setdefault(name, (help_text, {}))
+
+    def observe(self, name, value, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            _, buckets, series = self._histograms[name]
+            if key not in series:
+                series[key] = Histogram(buckets)
+            series[key].observe(value)
+
+    def inc(self, name, amount=1, **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._counters[name][1]
+            series[key] = series.get(key, 0) + amount
+
+    def snapshot(self, name):
+        """{labels: Histogram ou valor} de uma métrica (cópia rasa, para relatórios/testes)."""
+        with self._lock:
+            if name in self._histograms:
+                return dict(self._histograms[name][2])
+            return dict(self._counters[name][1])
+
+    def render(self):
+        lines = []
+        with self._lock:
+            for name, (help_text, series) in sorted(self._counters.items()):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} counter"]
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_labels(dict(key))} {value}")
+
+            for name, (help_text, buckets, series) in sorted(self._histograms.items()):
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} histogram"]
+                for key, histogram in sorted(series.items()):
+                    labels = dict(key)
+                    cumulative = 0
+                    for bound, count in zip((*buckets, "+Inf"), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_labels(labels, le=bound)} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {histogram.sum}")
+                    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+
+        return "\n".join(lines) + "\n"
+
+
+registry = MetricsRegistry()
+
+registry.counter("http_requests_total", "Requisições atendidas por view, método e status.")
+registry.histogram("http_request_duration_seconds", "Latência total da requisição.")
+registry.histogram("http_request_db_seconds", "Tempo gasto em SQL por requisição.")
+registry.histogram("http_request_db_queries", "Consultas SQL por requisição.", COUNT_BUCKETS)
+registry.histogram("http_request_serialize_seconds", "Tempo dos serializers (sem o SQL disparado por eles).")
+registry.histogram("http_request_render_seconds", "Tempo de renderização do JSON da resposta.")
@@ -0,0 +1,109 @@
+from contextlib import ExitStack, contextmanager, nullcontext
+from contextvars import ContextVar
+from time import perf_counter
+
+from django.db import connections
+
+from .metrics import registry
+
+# Estatísticas da requisição em andamento, para quem mede fora do middleware (serializers)
+current_stats = ContextVar("request_stats", default=None)
+
+
+class RequestStats:
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serialize_time = 0.0
+        self.serializing = False
+        self.render_start = None
+        self.render_time = 0.0
+        self.view = "unresolved"
+
+    @contextmanager
+    def serialization(self):
+        # Só o serializer mais externo conta; o SQL disparado dentro dele fica no "db"
+        if self.serializing:
+            yield
+            return
+        self.serializing = True
+        start, db_time = perf_counter(), self.db_time
+        try:
+            yield
+        finally:
+            self.serializing = False
+            self.serialize_time += perf_counter() - start - (self.db_time - db_time)
+
+    def __call__(self, execute, sql, params, many, context):
+        # execute_wrapper: mede cada consulta em qualquer conexão (primária/réplica)
+        start = perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += perf_counter() - start
+            self.queries += 1
+
+
+def timed_serialization():
+    """Soma o tempo do bloco ao "serialize" da requisição em andamento (se houver)."""
+    stats = current_stats.get()
+    return stats.serialization() if stats else nullcontext()
+
+
+class PerformanceMiddleware:
+    """
+    Mede, por requisição, número de consultas, tempo de SQL, tempo dos
+    serializers (ver TimedSerializerMixin), tempo de renderização do JSON e
+    latência total. Os valores vão no header Server-Timing e nos histogramas
+    do /api/_metrics.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = request._performance = RequestStats()
+        token = current_stats.set(stats)
+        start = perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            current_stats.reset(token)
+        total = perf_counter() - start
+
+        labels = {"view": stats.view, "method": request.method}
+        registry.inc("http_requests_total", status=response.status_code, **labels)
+        registry.observe("http_request_duration_seconds", total, **labels)
+        registry.observe("http_request_db_seconds", stats.db_time, **labels)
+        registry.observe("http_request_db_queries", stats.queries, **labels)
+        registry.observe("http_request_serialize_seconds", stats.serialize_time, **labels)
+        if stats.render_start is not None:
+            registry.observe("http_request_render_seconds", stats.render_time, **labels)
+
+        app_time = max(total - stats.db_time - stats.serialize_time - stats.render_time, 0)
+        response["Server-Timing"] = ", ".join([
+            f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries"',
+            f"serialize;dur={stats.serialize_time * 1000:.1f}",
+            f"render;dur={stats.render_time * 1000:.1f}",
+            f"app;dur={app_time * 1000:.1f}",
+            f"total;dur={total * 1000:.1f}",
+        ])
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, "view_class", None)
+        request._performance.view = (view_class or view_func).__name__
+
+    def process_template_response(self, request, response):
+        # Respostas do DRF são renderizadas (JSONRenderer) logo depois deste hook
+        stats = request._performance
+        stats.render_start = perf_counter()
+
+        def render_done(response):
+            stats.render_time = perf_counter() - stats.render_start
+
+        response.add_post_render_callback(render_done)
+        return response
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyPrice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='Dia')),
+                ('min_price', models.FloatField(verbose_name='Preço mínimo')),
+                ('max_price', models.FloatField(verbose_name='Preço máximo')),
+                ('close_price', models.FloatField(verbose_name='Preço de fechamento')),
+                ('is_available', models.BooleanField()),
+                ('stock', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='daily_prices', to='products.stock')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('stock', 'date'), name='dailyprice_stock_date_uniq')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PricePoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('timestamp', models.DateTimeField(verbose_name='Data')),
+                ('price', models.FloatField(verbose_name='Preço')),
+                ('is_available', models.BooleanField()),
+                ('stock', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='price_points', to='products.stock')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['stock', 'timestamp'], name='pricepoint_stock_ts_idx')],
+            },
+        ),
+    ]
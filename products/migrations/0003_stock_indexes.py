@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0002_dailyprice_pricepoint"),
+    ]
+
+    operations = [
+        # Histórico por stock (HistoricalStock é gerado pelo simple_history,
+        # então o índice não pode ser declarado no Meta do modelo)
+        migrations.RunSQL(
+            "CREATE INDEX historicalstock_id_date_idx "
+            "ON products_historicalstock (id, history_date)",
+            "DROP INDEX historicalstock_id_date_idx",
+        ),
+        migrations.AlterField(
+            model_name="stock",
+            name="store",
+            field=models.ForeignKey(
+                db_index=False,
+                on_delete=django.db.models.deletion.CASCADE,
+                to="products.store",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stock",
+            index=models.Index(
+                fields=["store", "product"], name="stock_store_product_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stock",
+            index=models.Index(fields=["url"], name="stock_url_idx"),
+        ),
+    ]
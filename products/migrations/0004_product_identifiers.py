@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0003_stock_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="ean",
+            field=models.CharField(
+                blank=True, db_index=True, max_length=14, null=True, verbose_name="EAN"
+            ),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="model_number",
+            field=models.CharField(
+                blank=True,
+                db_index=True,
+                max_length=50,
+                null=True,
+                verbose_name="Modelo",
+            ),
+        ),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0004_product_identifiers"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ScrapeSample",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "store",
+                    models.CharField(max_length=100, verbose_name="Loja (domínio)"),
+                ),
+                ("url", models.URLField(max_length=500)),
+                ("started_at", models.DateTimeField()),
+                ("status_code", models.PositiveSmallIntegerField(null=True)),
+                (
+                    "failure",
+                    models.CharField(
+                        blank=True,
+                        default="",
+                        max_length=30,
+                        verbose_name="Categoria da falha",
+                    ),
+                ),
+                ("dns", models.FloatField(null=True)),
+                ("ttfb", models.FloatField(null=True)),
+                ("download", models.FloatField(null=True)),
+                ("parse", models.FloatField(null=True)),
+                ("bytes", models.PositiveIntegerField(null=True)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(
+                        fields=["started_at", "store"], name="scrapesample_started_idx"
+                    )
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,144 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_lookups(apps, schema_editor):
+    Category = apps.get_model("products", "Category")
+    SubGroup = apps.get_model("products", "SubGroup")
+    Stock = apps.get_model("products", "Stock")
+    HistoricalStock = apps.get_model("products", "HistoricalStock")
+
+    for model, field in ((Category, "category"), (SubGroup, "sub_group")):
+        names = set(Stock.objects.values_list(field, flat=True).distinct())
+        names |= set(HistoricalStock.objects.values_list(field, flat=True).distinct())
+        model.objects.bulk_create([model(name=name) for name in sorted(names)])
+
+        # um UPDATE por nome distinto (poucos), em vez de um por linha
+        for lookup in model.objects.all():
+            Stock.objects.filter(**{field: lookup.name}).update(**{f"{field}_ref": lookup})
+            HistoricalStock.objects.filter(**{field: lookup.name}).update(**{f"{field}_ref": lookup})
+
+
+def fill_names(apps, schema_editor):
+    Category = apps.get_model("products", "Category")
+    SubGroup = apps.get_model("products", "SubGroup")
+    Stock = apps.get_model("products", "Stock")
+    HistoricalStock = apps.get_model("products", "HistoricalStock")
+
+    for model, field in ((Category, "category"), (SubGroup, "sub_group")):
+        for lookup in model.objects.all():
+            Stock.objects.filter(**{f"{field}_ref": lookup}).update(**{field: lookup.name})
+            HistoricalStock.objects.filter(**{f"{field}_ref": lookup}).update(**{field: lookup.name})
+
+
+INDEX_SQL = "CREATE INDEX IF NOT EXISTS historicalstock_id_date_idx ON products_historicalstock (id, history_date)"
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0006_refreshcheckpoint"),
+    ]
+
+    operations = [
+        # volta: as recriações de tabela do SQLite levam o índice da 0003; ao fim da reversão ele é recriado
+        migrations.RunSQL(migrations.RunSQL.noop, INDEX_SQL),
+        migrations.CreateModel(
+            name="Category",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=50, unique=True, verbose_name="Nome")),
+            ],
+        ),
+        migrations.CreateModel(
+            name="SubGroup",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("name", models.CharField(max_length=50, unique=True, verbose_name="Nome")),
+            ],
+        ),
+        # 1) colunas novas, 2) dados, 3) sai o texto e as colunas novas assumem o nome
+        migrations.AddField(
+            model_name="stock",
+            name="category_ref",
+            field=models.ForeignKey(
+                null=True, on_delete=django.db.models.deletion.PROTECT, related_name="+", to="products.category"
+            ),
+        ),
+        migrations.AddField(
+            model_name="stock",
+            name="sub_group_ref",
+            field=models.ForeignKey(
+                null=True, on_delete=django.db.models.deletion.PROTECT, related_name="+", to="products.subgroup"
+            ),
+        ),
+        migrations.AddField(
+            model_name="historicalstock",
+            name="category_ref",
+            field=models.ForeignKey(
+                blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+", to="products.category",
+            ),
+        ),
+        migrations.AddField(
+            model_name="historicalstock",
+            name="sub_group_ref",
+            field=models.ForeignKey(
+                blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+", to="products.subgroup",
+            ),
+        ),
+        # texto anulável antes dos dados: na volta, as colunas são recriadas vazias e preenchidas por fill_names
+        *[
+            migrations.AlterField(
+                model_name=model_name,
+                name=name,
+                field=models.CharField(max_length=50, null=True, verbose_name=verbose_name),
+            )
+            for model_name in ("stock", "historicalstock")
+            for name, verbose_name in (("category", "Categoria"), ("sub_group", "Sub-grupo"))
+        ],
+        migrations.RunPython(fill_lookups, fill_names),
+        migrations.RemoveField(model_name="stock", name="category"),
+        migrations.RemoveField(model_name="stock", name="sub_group"),
+        migrations.RemoveField(model_name="historicalstock", name="category"),
+        migrations.RemoveField(model_name="historicalstock", name="sub_group"),
+        migrations.RenameField(model_name="stock", old_name="category_ref", new_name="category"),
+        migrations.RenameField(model_name="stock", old_name="sub_group_ref", new_name="sub_group"),
+        migrations.RenameField(model_name="historicalstock", old_name="category_ref", new_name="category"),
+        migrations.RenameField(model_name="historicalstock", old_name="sub_group_ref", new_name="sub_group"),
+        migrations.AlterField(
+            model_name="stock",
+            name="category",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT, related_name="stocks", to="products.category",
+                verbose_name="Categoria",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="stock",
+            name="sub_group",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.PROTECT, related_name="stocks", to="products.subgroup",
+                verbose_name="Sub-grupo",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicalstock",
+            name="category",
+            field=models.ForeignKey(
+                blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+", to="products.category", verbose_name="Categoria",
+            ),
+        ),
+        migrations.AlterField(
+            model_name="historicalstock",
+            name="sub_group",
+            field=models.ForeignKey(
+                blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="+", to="products.subgroup", verbose_name="Sub-grupo",
+            ),
+        ),
+        # no SQLite o RemoveField recria a tabela e leva junto o índice criado em SQL na 0003
+        migrations.RunSQL(INDEX_SQL, migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:11
+
+from django.db import migrations, models
+from django.db.models import Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_lowest_prices(apps, schema_editor):
+    # mesmo cálculo de products/pricing.py, num único UPDATE com subconsultas correlacionadas
+    Product = apps.get_model("products", "Product")
+    Stock = apps.get_model("products", "Stock")
+    stocks = Stock.objects.filter(product_id=OuterRef("pk"))
+    available = stocks.filter(is_available=True)
+    Product.objects.update(
+        lowest_price=Coalesce(
+            Subquery(available.order_by("price").values("price")[:1]),
+            Subquery(stocks.order_by("price").values("price")[:1]),
+        ),
+        is_available=Exists(available),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0007_category_subgroup"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="product",
+            name="is_available",
+            field=models.BooleanField(default=False, verbose_name="Disponível"),
+        ),
+        migrations.AddField(
+            model_name="product",
+            name="lowest_price",
+            field=models.FloatField(
+                blank=True, db_index=True, null=True, verbose_name="Menor preço"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="product",
+            index=models.Index(
+                fields=["is_available", "lowest_price"],
+                name="product_available_price_idx",
+            ),
+        ),
+        migrations.RunPython(fill_lowest_prices, migrations.RunPython.noop),
+    ]
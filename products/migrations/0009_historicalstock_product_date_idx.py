@@ -0,0 +1,18 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0008_product_lowest_price"),
+    ]
+
+    operations = [
+        # Última mudança de um produto (ETag/Last-Modified do /api/products/<id>/):
+        # MAX(history_date) por produto vira uma única busca no índice
+        migrations.RunSQL(
+            "CREATE INDEX historicalstock_product_date_idx "
+            "ON products_historicalstock (product_id, history_date)",
+            "DROP INDEX historicalstock_product_date_idx",
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0009_historicalstock_product_date_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stock",
+            name="lease_expires_at",
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name="stock",
+            name="lease_owner",
+            field=models.CharField(blank=True, max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name="stock",
+            name="refreshed_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Atualizado em"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stock",
+            index=models.Index(fields=["refreshed_at"], name="stock_refreshed_at_idx"),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0010_stock_refresh_lease"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="stock",
+            name="failure_count",
+            field=models.PositiveIntegerField(
+                default=0, verbose_name="Falhas seguidas"
+            ),
+        ),
+        migrations.AddField(
+            model_name="stock",
+            name="last_error",
+            field=models.CharField(
+                blank=True, max_length=30, null=True, verbose_name="Última falha"
+            ),
+        ),
+        migrations.AddField(
+            model_name="stock",
+            name="next_attempt_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Próxima tentativa"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="stock",
+            index=models.Index(
+                fields=["failure_count"], name="stock_failure_count_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:30
+
+from datetime import datetime, time
+
+from django.db import migrations, models
+from django.db.models import Min
+from django.utils import timezone
+
+
+def import_historical_records(apps, schema_editor):
+    """
+    Copia o HistoricalStock existente para PricePoint: só registros
+    anteriores ao primeiro ponto compacto de cada stock e só quando
+    preço/disponibilidade mudam. Idempotente (a 0013 roda de novo antes de
+    tirar as colunas de preço do HistoricalStock).
+    """
+    HistoricalStock = apps.get_model("products", "HistoricalStock")
+    PricePoint = apps.get_model("products", "PricePoint")
+    DailyPrice = apps.get_model("products", "DailyPrice")
+
+    first_point = dict(PricePoint.objects.values("stock_id").annotate(first=Min("timestamp")).values_list("stock_id", "first"))
+    for stock_id, first_day in DailyPrice.objects.values("stock_id").annotate(first=Min("date")).values_list("stock_id", "first"):
+        day_start = timezone.make_aware(datetime.combine(first_day, time.min))
+        first_point[stock_id] = min(first_point.get(stock_id, day_start), day_start)
+
+    Stock = apps.get_model("products", "Stock")
+    points, previous = [], None
+    # índice (id, history_date); stocks já apagados não têm onde receber pontos
+    records = HistoricalStock.objects.exclude(history_type="-").filter(id__in=Stock.objects.values("id"))
+    records = records.order_by("id", "history_date")
+    for stock_id, price, is_available, history_date in records.values_list(
+        "id", "price", "is_available", "history_date"
+    ).iterator(chunk_size=2000):
+        if stock_id in first_point and history_date >= first_point[stock_id]:
+            continue
+        if previous == (stock_id, price, is_available):
+            continue
+        previous = (stock_id, price, is_available)
+        points.append(PricePoint(stock_id=stock_id, timestamp=history_date, price=price, is_available=is_available))
+        if len(points) >= 2000:
+            PricePoint.objects.bulk_create(points)
+            points = []
+    PricePoint.objects.bulk_create(points)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0011_stock_failure_tracking"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="dailyprice",
+            name="close_at",
+            field=models.DateTimeField(
+                blank=True, null=True, verbose_name="Horário do fechamento"
+            ),
+        ),
+        migrations.RunPython(import_historical_records, migrations.RunPython.noop),
+    ]
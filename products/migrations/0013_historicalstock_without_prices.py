@@ -0,0 +1,67 @@
+# Generated by Django 5.2.5 on 2026-10-19 15:15
+
+from importlib import import_module
+
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+# Os registros gravados desde a 0012 também vão para o PricePoint antes de as colunas saírem
+import_historical_records = import_module(
+    "products.migrations.0012_dailyprice_close_at_history_backfill"
+).import_historical_records
+
+
+def restore_prices(apps, schema_editor):
+    """
+    Volta as colunas com o preço atual de cada stock (o histórico de preços
+    continua no PricePoint); registros de stocks apagados ficam com 0.
+    """
+    HistoricalStock = apps.get_model("products", "HistoricalStock")
+    Stock = apps.get_model("products", "Stock")
+    current = Stock.objects.filter(id=OuterRef("id"))
+    HistoricalStock.objects.update(
+        price=Subquery(current.values("price")[:1]),
+        is_available=Subquery(current.values("is_available")[:1]),
+    )
+    HistoricalStock.objects.filter(price__isnull=True).update(price=0, is_available=False)
+
+
+# Índices do HistoricalStock criados em SQL (0003 e 0009): no SQLite, mudar colunas recria a tabela sem eles
+INDEX_SQL = [
+    "CREATE INDEX IF NOT EXISTS historicalstock_id_date_idx ON products_historicalstock (id, history_date)",
+    "CREATE INDEX IF NOT EXISTS historicalstock_product_date_idx ON products_historicalstock (product_id, history_date)",
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("products", "0012_dailyprice_close_at_history_backfill"),
+    ]
+
+    operations = [
+        # volta: recria os índices que as recriações de tabela abaixo levaram
+        migrations.RunSQL(migrations.RunSQL.noop, INDEX_SQL),
+        migrations.RunPython(import_historical_records, migrations.RunPython.noop),
+        # nulas antes de sair: ao desfazer, as colunas voltam vazias e são preenchidas por restore_prices
+        migrations.AlterField(
+            model_name="historicalstock",
+            name="price",
+            field=models.FloatField(null=True, verbose_name="Preço"),
+        ),
+        migrations.AlterField(
+            model_name="historicalstock",
+            name="is_available",
+            field=models.BooleanField(null=True),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restore_prices),
+        migrations.RemoveField(
+            model_name="historicalstock",
+            name="is_available",
+        ),
+        migrations.RemoveField(
+            model_name="historicalstock",
+            name="price",
+        ),
+        migrations.RunSQL(INDEX_SQL, migrations.RunSQL.noop),
+    ]
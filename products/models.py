@@ -6,6 +6,19 @@ class Product(models.Model):
     name = models.CharField(
         verbose_name="Nome", max_length=200, null=False, blank=False, unique=True
     )
+    # Identificadores usados para casar o mesmo produto entre lojas (products/matching.py)
+    ean = models.CharField(verbose_name="EAN", max_length=14, null=True, blank=True, db_index=True)
+    model_number = models.CharField(
+        verbose_name="Modelo", max_length=50, null=True, blank=True, db_index=True
+    )
+    # Menor preço atual e disponibilidade, mantidos por products/pricing.py (filtro e ordenação da listagem)
+    lowest_price = models.FloatField(verbose_name="Menor preço", null=True, blank=True, db_index=True)
+    is_available = models.BooleanField(verbose_name="Disponível", default=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["is_available", "lowest_price"], name="product_available_price_idx"),
+        ]
 
 
 class Store(models.Model):
@@ -16,6 +29,20 @@ class Store(models.Model):
     url = models.CharField(verbose_name="Link", max_length=100, null=False, blank=False)
 
 
+class Category(models.Model):
+    name = models.CharField(verbose_name="Nome", max_length=50, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
+class SubGroup(models.Model):
+    name = models.CharField(verbose_name="Nome", max_length=50, unique=True)
+
+    def __str__(self):
+        return self.name
+
+
 class Stock(models.Model):
     price = models.FloatField(verbose_name="Preço", null=False, blank=False)
     is_available = models.BooleanField(null=False, blank=False)
@@ -23,12 +50,139 @@ class Stock(models.Model):
     photo = models.CharField(
         verbose_name="Foto", max_length=200, null=False, blank=False
     )
-    category = models.CharField(
-        verbose_name="Categoria", max_length=50, null=False, blank=False
+    # Tabelas de lookup (products/lookups.py): a API continua recebendo e devolvendo os nomes
+    category = models.ForeignKey(
+        "Category", verbose_name="Categoria", on_delete=models.PROTECT, related_name="stocks"
     )
-    sub_group = models.CharField(
-        verbose_name="Sub-grupo", max_length=50, null=False, blank=False
+    sub_group = models.ForeignKey(
+        "SubGroup", verbose_name="Sub-grupo", on_delete=models.PROTECT, related_name="stocks"
     )
-    store = models.ForeignKey(Store, on_delete=models.CASCADE)
+    # store_id é coberto pelo índice composto (store, product)
+    store = models.ForeignKey(Store, on_delete=models.CASCADE, db_index=False)
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
-    history = HistoricalRecords()
+    # Atualização distribuída entre workers (products/refresh.py: claim_stocks). O lease
+    # é a reserva do stock por um worker até lease_expires_at; depois disso outro pode pegá-lo
+    refreshed_at = models.DateTimeField(verbose_name="Atualizado em", null=True, blank=True)
+    lease_owner = models.CharField(max_length=64, null=True, blank=True)
+    lease_expires_at = models.DateTimeField(null=True, blank=True)
+    # Falhas seguidas ao raspar o link (categoria de ScrapeFailure em last_error); com
+    # falhas, o stock só volta a ser raspado depois de next_attempt_at (backoff exponencial)
+    failure_count = models.PositiveIntegerField(verbose_name="Falhas seguidas", default=0)
+    last_error = models.CharField(verbose_name="Última falha", max_length=30, null=True, blank=True)
+    next_attempt_at = models.DateTimeField(verbose_name="Próxima tentativa", null=True, blank=True)
+    # Preço/disponibilidade têm histórico próprio, compacto (PricePoint/DailyPrice, products/history.py)
+    history = HistoricalRecords(excluded_fields=[
+        "price", "is_available",
+        "refreshed_at", "lease_owner", "lease_expires_at", "failure_count", "last_error", "next_attempt_at",
+    ])
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["store", "product"], name="stock_store_product_idx"),
+            models.Index(fields=["refreshed_at"], name="stock_refreshed_at_idx"),
+            models.Index(fields=["failure_count"], name="stock_failure_count_idx"),
+            models.Index(fields=["url"], name="stock_url_idx"),
+        ]
+
+    # Preço/disponibilidade como estavam no banco, usados para detectar mudanças
+    # (ver products.signals.prices_changed)
+    _loaded_price = None
+    _loaded_is_available = None
+    # Campos que entram nas contagens da barra de filtros (products.facets), como estavam no banco
+    FACET_FIELDS = ("product", "store", "category", "sub_group")
+    _loaded_facets = None
+    # Campos guardados no HistoricalStock, como estavam no banco: um save que não muda
+    # nenhum deles (só preço, por exemplo) não gera linha de histórico
+    HISTORY_FIELDS = ("url", "photo", *FACET_FIELDS)
+    _loaded_history = None
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.remember_price_state()
+        instance._loaded_facets = instance.facet_state()
+        instance._loaded_history = instance.history_state()
+        return instance
+
+    def save(self, *args, **kwargs):
+        if self._loaded_history is not None and self.history_state() == self._loaded_history:
+            self.skip_history_when_saving = True  # lido pelo simple_history no post_save
+        try:
+            super().save(*args, **kwargs)
+        finally:
+            self.__dict__.pop("skip_history_when_saving", None)
+        self._loaded_history = self.history_state()
+
+    def remember_price_state(self):
+        self._loaded_price = self.__dict__.get("price")
+        self._loaded_is_available = self.__dict__.get("is_available")
+
+    def facet_state(self):
+        return tuple(self.__dict__.get(f"{field}_id") for field in self.FACET_FIELDS)
+
+    def history_state(self):
+        return tuple(self.__dict__.get(self._meta.get_field(field).attname) for field in self.HISTORY_FIELDS)
+
+
+class PricePoint(models.Model):
+    # Histórico compacto de preços: uma linha por mudança de preço/disponibilidade
+    stock = models.ForeignKey(
+        Stock, on_delete=models.CASCADE, related_name="price_points", db_index=False
+    )
+    timestamp = models.DateTimeField(verbose_name="Data")
+    price = models.FloatField(verbose_name="Preço")
+    is_available = models.BooleanField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["stock", "timestamp"], name="pricepoint_stock_ts_idx")
+        ]
+
+
+class DailyPrice(models.Model):
+    # Pontos antigos reduzidos a um resumo diário (ver manage.py compact_history)
+    stock = models.ForeignKey(
+        Stock, on_delete=models.CASCADE, related_name="daily_prices", db_index=False
+    )
+    date = models.DateField(verbose_name="Dia")
+    min_price = models.FloatField(verbose_name="Preço mínimo")
+    max_price = models.FloatField(verbose_name="Preço máximo")
+    close_price = models.FloatField(verbose_name="Preço de fechamento")
+    # momento do ponto que deu o fechamento: resumos mesclados mantêm o mais recente
+    close_at = models.DateTimeField(verbose_name="Horário do fechamento", null=True, blank=True)
+    is_available = models.BooleanField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["stock", "date"], name="dailyprice_stock_date_uniq")
+        ]
+
+
+class ScrapeSample(models.Model):
+    # Uma busca do scraper: tempos por fase (segundos) e categoria da falha.
+    # Gravado em lote por products.scraper_metrics; lido por manage.py scraper_report.
+    store = models.CharField(max_length=100, verbose_name="Loja (domínio)")
+    url = models.URLField(max_length=500)
+    started_at = models.DateTimeField()
+    status_code = models.PositiveSmallIntegerField(null=True)
+    failure = models.CharField(max_length=30, blank=True, default="", verbose_name="Categoria da falha")
+    dns = models.FloatField(null=True)
+    ttfb = models.FloatField(null=True)
+    download = models.FloatField(null=True)
+    parse = models.FloatField(null=True)
+    bytes = models.PositiveIntegerField(null=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["started_at", "store"], name="scrapesample_started_idx")]
+
+
+class RefreshCheckpoint(models.Model):
+    # Progresso da atualização completa do catálogo (products/refresh.py): o último
+    # produto processado é salvo a cada lote para retomar depois de uma queda/deploy.
+    name = models.CharField(max_length=50, unique=True)
+    last_product_id = models.BigIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    updated = models.PositiveIntegerField(default=0)
+    started_at = models.DateTimeField()
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
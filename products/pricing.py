@@ -0,0 +1,49 @@
+"""
+Menor preço atual de cada produto, guardado no próprio Product.
+
+Product.lowest_price é o menor preço entre os stocks disponíveis (ou entre
+todos, se nenhum estiver disponível) e Product.is_available diz se há algum
+stock disponível. Os dois são indexados: a listagem filtra por faixa de preço
+e ordena por preço sem agregar os stocks a cada requisição. São recalculados
+a cada prices_changed e quando um stock é apagado, com um único UPDATE por
+lote de produtos.
+"""
+
+from django.db.models import Exists, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+
+from .models import Product, Stock
+from .signals import prices_changed
+
+
+def lowest_price_fields():
+    """Expressões de lowest_price/is_available para um UPDATE em Product (ver também a migração 0008)."""
+    stocks = Stock.objects.filter(product_id=OuterRef("pk"))
+
+    def lowest(queryset):
+        return Subquery(queryset.order_by("price").values("price")[:1])
+
+    return {
+        "lowest_price": Coalesce(lowest(stocks.filter(is_available=True)), lowest(stocks)),
+        "is_available": Exists(stocks.filter(is_available=True)),
+    }
+
+
+def refresh_lowest_prices(product_ids):
+    """Recalcula lowest_price/is_available dos produtos informados. Retorna quantos foram atualizados."""
+    product_ids = list(product_ids)
+    if not product_ids:
+        return 0
+    return Product.objects.filter(id__in=product_ids).update(**lowest_price_fields())
+
+
+@receiver(prices_changed)
+def update_lowest_prices(sender, changes, **kwargs):
+    refresh_lowest_prices({change.stock.product_id for change in changes})
+
+
+@receiver(post_delete, sender=Stock)
+def remove_deleted_stock(sender, instance, **kwargs):
+    refresh_lowest_prices([instance.product_id])
@@ -0,0 +1,108 @@
+"""
+Pub/sub em processo para notificar clientes sobre mudanças de preço.
+
+O broker padrão vive na memória do processo: basta para um único worker ASGI.
+Para vários processos, aponte PRODUCTS_PUBSUB_BROKER (settings) para uma classe
+com a mesma interface (subscribe/publish) apoiada em um broker externo.
+"""
+
+import asyncio
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .signals import prices_changed
+
+
+class Subscription:
+    def __init__(self, broker, product_ids, loop):
+        self.broker = broker
+        self.product_ids = frozenset(product_ids)
+        self.loop = loop
+        self.queue = asyncio.Queue()
+
+    def deliver(self, event):
+        # Chamado de qualquer thread; a fila pertence ao loop do assinante
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, event)
+
+    async def get(self, timeout=None):
+        """Próximo evento, ou None se `timeout` segundos passarem sem nada."""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        self.broker.unsubscribe(self)
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = set()
+
+    def subscribe(self, product_ids):
+        """Deve ser chamado de dentro de um event loop (view async)."""
+        subscription = Subscription(self, product_ids, asyncio.get_running_loop())
+        with self._lock:
+            self._subscriptions.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscriptions.discard(subscription)
+
+    def publish(self, event):
+        with self._lock:
+            targets = [s for s in self._subscriptions if event["product_id"] in s.product_ids]
+
+        for subscription in targets:
+            try:
+                subscription.deliver(event)
+            except RuntimeError:  # loop do assinante já foi fechado
+                self.unsubscribe(subscription)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                path = getattr(settings, "PRODUCTS_PUBSUB_BROKER", "products.pubsub.InProcessBroker")
+                _broker = import_string(path)()
+    return _broker
+
+
+def price_event(change):
+    stock = change.stock
+    return {
+        "product_id": stock.product_id,
+        "stock_id": stock.id,
+        "store_id": stock.store_id,
+        "price": stock.price,
+        "is_available": stock.is_available,
+        "old_price": change.old_price,
+        "old_is_available": change.old_is_available,
+        "timestamp": timezone.now().isoformat(),
+    }
+
+
+@receiver(prices_changed)
+def publish_price_changes(sender, changes, **kwargs):
+    events = [price_event(change) for change in changes]
+
+    def publish():
+        broker = get_broker()
+        for event in events:
+            broker.publish(event)
+
+    # Só notifica o que de fato foi gravado
+    transaction.on_commit(publish)
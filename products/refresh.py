@@ -0,0 +1,312 @@
+"""
+Atualização de preços a partir das lojas.
+
+refresh_stocks raspa um conjunto de stocks em paralelo e grava as mudanças
+de uma vez (bulk_update + um único prices_changed, que grava o histórico).
+refresh_catalog percorre o catálogo inteiro em lotes ordenados por id de
+produto (keyset, sem OFFSET nem o catálogo em memória) e salva um
+RefreshCheckpoint depois de cada lote: se o processo morrer, a próxima
+execução continua do último lote concluído.
+
+Para dividir a atualização entre vários processos/máquinas, cada worker
+(run_worker, comando refresh_worker) reserva lotes de stocks desatualizados
+com claim_stocks: um UPDATE condicional grava lease_owner/lease_expires_at
+(com SELECT ... FOR UPDATE SKIP LOCKED onde o banco suporta), então dois
+workers nunca pegam o mesmo stock enquanto o lease vale. Ao terminar o lote o
+worker grava refreshed_at e solta o lease; se ele morrer, o lease expira e o
+lote volta a ficar disponível. Um worker que demorar mais que o lease pode ter
+o lote reprocessado por outro (a gravação é idempotente).
+
+prices_changed dispara no processo que grava os preços. Os caches
+(estatísticas, facets, lojas) só são invalidados nos outros processos se o
+cache padrão for compartilhado, e o stream de preços só chega aos assinantes
+de outros processos com um PRODUCTS_PUBSUB_BROKER externo (ver
+shares_price_changes). Sem os dois, update_prices roda a atualização numa
+thread do próprio processo web, e os comandos avisam ao começar.
+"""
+
+import os
+import socket
+import subprocess
+import sys
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .importer import _scrape_safely, default_scrape
+from .models import Product, RefreshCheckpoint, Stock
+from .scraper_metrics import flush_samples
+from .signals import PriceChange, prices_changed
+
+FULL_REFRESH = "full"
+
+
+def first_stocks(product_ids):
+    """{product_id: primeiro stock do produto} numa única consulta."""
+    stocks = {}
+    for stock in Stock.objects.filter(product_id__in=product_ids).order_by("product_id", "id"):
+        stocks.setdefault(stock.product_id, stock)
+    return stocks
+
+
+def backoff(failures):
+    """Espera antes da próxima tentativa depois de `failures` falhas seguidas."""
+    base = getattr(settings, "REFRESH_BACKOFF_SECONDS", 3600)
+    limit = getattr(settings, "REFRESH_BACKOFF_MAX_SECONDS", 7 * 24 * 3600)
+    return timedelta(seconds=min(base * 2 ** (failures - 1), limit))
+
+
+def backing_off(stock, now=None):
+    """True se o stock ainda está esperando a próxima tentativa (next_attempt_at no futuro)."""
+    return bool(stock.next_attempt_at) and stock.next_attempt_at > (now or timezone.now())
+
+
+def failure_category(data):
+    """Categoria da falha de um resultado do scraper (ver products.scrapper.ScrapeFailure)."""
+    if isinstance(data, str):
+        return getattr(data, "category", "error")
+    return "invalid_data"
+
+
+def refresh_stocks(stocks, scrape=default_scrape, workers=8, lease_owner=None):
+    """
+    Raspa o link de cada stock e grava preço/disponibilidade que mudaram.
+    Stocks em backoff (next_attempt_at no futuro) não são raspados. Cada
+    falha incrementa failure_count e adia a próxima tentativa; depois de
+    REFRESH_FAILURE_THRESHOLD falhas seguidas o stock fica indisponível.
+    Os stocks raspados recebem refreshed_at; com `lease_owner`, só os que
+    ainda estão reservados por ele, e o lease é solto. Retorna os stocks alterados.
+    """
+    now = timezone.now()
+    stocks = [stock for stock in stocks if not backing_off(stock, now)]
+    if not stocks:
+        return []
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        scraped = list(executor.map(lambda stock: _scrape_safely(scrape, stock.url), stocks))
+    flush_samples()
+
+    threshold = getattr(settings, "REFRESH_FAILURE_THRESHOLD", 5)
+    changes = []
+    attempts = []  # stocks cujo estado de falha mudou (nova falha ou recuperação)
+    for stock, data in zip(stocks, scraped):
+        try:
+            price, is_available = data["price"], data["is_available"]
+        except (KeyError, TypeError):
+            stock.failure_count += 1
+            stock.last_error = failure_category(data)
+            stock.next_attempt_at = now + backoff(stock.failure_count)
+            attempts.append(stock)
+            if stock.failure_count >= threshold and stock.is_available:
+                # link morto: o produto some das ofertas (listas, menor preço) até voltar a responder
+                changes.append(PriceChange(stock=stock, old_price=stock.price, old_is_available=True))
+                stock.is_available = False
+            continue
+
+        if stock.failure_count:
+            stock.failure_count, stock.last_error, stock.next_attempt_at = 0, None, None
+            attempts.append(stock)
+        if stock.price != price or stock.is_available != is_available:
+            changes.append(PriceChange(stock=stock, old_price=stock.price, old_is_available=stock.is_available))
+            stock.price, stock.is_available = price, is_available
+
+    changed = [change.stock for change in changes]
+    if changed or attempts:
+        # preço e estado de falha juntos: um link morto não fica indisponível sem o failure_count que o explica
+        # (sem mudança de preço, o bulk_update sozinho já é atômico)
+        with transaction.atomic() if changed else nullcontext():
+            if changed:
+                # sem HistoricalStock: preço/disponibilidade ficam só no histórico compacto (PricePoint)
+                Stock.objects.bulk_update(changed, ["price", "is_available"], batch_size=500)
+                # bulk_update não dispara post_save: avisa os interessados de uma vez só
+                prices_changed.send(sender=Stock, changes=changes)
+            if attempts:
+                Stock.objects.bulk_update(attempts, ["failure_count", "last_error", "next_attempt_at"], batch_size=500)
+        for stock in changed:
+            stock.remember_price_state()
+
+    done = Stock.objects.filter(id__in=[stock.id for stock in stocks])
+    if lease_owner:
+        done.filter(lease_owner=lease_owner).update(
+            refreshed_at=timezone.now(), lease_owner=None, lease_expires_at=None
+        )
+    else:
+        done.update(refreshed_at=timezone.now())
+
+    return changed
+
+
+def worker_name():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def claim_stocks(worker, limit, lease_seconds=300, max_age=3600, now=None):
+    """
+    Reserva até `limit` stocks não atualizados há mais de `max_age` segundos,
+    fora de backoff e sem lease válido, por `lease_seconds`. Retorna os stocks reservados
+    (todos com o mesmo lease_owner, "<worker>/<token>").
+    """
+    now = now or timezone.now()
+    owner = f"{worker}/{uuid.uuid4().hex[:12]}"[-64:]
+    due = Q(refreshed_at__isnull=True) | Q(refreshed_at__lt=now - timedelta(seconds=max_age))
+    due &= Q(next_attempt_at__isnull=True) | Q(next_attempt_at__lte=now)  # links em backoff esperam
+    free = Q(lease_expires_at__isnull=True) | Q(lease_expires_at__lt=now)
+
+    while True:
+        with transaction.atomic():
+            candidates = Stock.objects.filter(due, free).order_by(F("refreshed_at").asc(nulls_first=True), "id")
+            if connection.features.has_select_for_update_skip_locked:
+                candidates = candidates.select_for_update(skip_locked=True)
+            ids = list(candidates.values_list("id", flat=True)[:limit])
+            if not ids:
+                return []
+            # o UPDATE repete a condição: sem SKIP LOCKED (SQLite) outro worker pode ter reservado antes
+            claimed = Stock.objects.filter(free, id__in=ids).update(
+                lease_owner=owner, lease_expires_at=now + timedelta(seconds=lease_seconds)
+            )
+        if claimed:
+            return list(Stock.objects.filter(id__in=ids, lease_owner=owner).order_by("id"))
+        # outro worker levou o lote inteiro: tenta os próximos
+
+
+def run_worker(scrape=default_scrape, batch_size=50, workers=8, lease_seconds=300, max_age=3600,
+               worker=None, on_batch=None):
+    """
+    Reserva e atualiza lotes até não sobrar stock desatualizado. Vários
+    processos podem rodar ao mesmo tempo sobre o mesmo banco.
+    on_batch(stocks, changed) é chamado após cada lote. Retorna {"processed", "updated"}.
+    """
+    worker = worker or worker_name()
+    totals = {"processed": 0, "updated": 0}
+    while True:
+        stocks = claim_stocks(worker, batch_size, lease_seconds=lease_seconds, max_age=max_age)
+        if not stocks:
+            return totals
+        changed = refresh_stocks(stocks, scrape=scrape, workers=workers, lease_owner=stocks[0].lease_owner)
+        totals["processed"] += len(stocks)
+        totals["updated"] += len(changed)
+        if on_batch:
+            on_batch(stocks, changed)
+
+
+def _restart(checkpoint):
+    checkpoint.last_product_id = checkpoint.processed = checkpoint.updated = 0
+    checkpoint.started_at = timezone.now()
+    checkpoint.finished_at = None
+    checkpoint.save()
+
+
+def spawn_refresh_command():
+    """Roda `manage.py refresh_prices` num processo separado, sem esperar por ele."""
+    subprocess.Popen(
+        [sys.executable, str(settings.BASE_DIR / "manage.py"), "refresh_prices"],
+        stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+
+
+def refresh_in_thread(**kwargs):
+    """Roda refresh_catalog(**kwargs) numa thread deste processo, sem esperar por ela."""
+    def run():
+        try:
+            refresh_catalog(**kwargs)
+        finally:
+            connection.close()  # a thread tem a própria conexão
+
+    thread = threading.Thread(target=run, name="catalog-refresh", daemon=True)
+    thread.start()
+    return thread
+
+
+PROCESS_LOCAL_CACHES = {
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+}
+
+
+def shares_price_changes():
+    """
+    True se o efeito de prices_changed chega aos outros processos: cache padrão
+    compartilhado (caches de estatísticas e facets, registro de lojas) e
+    PRODUCTS_PUBSUB_BROKER apoiado num broker externo (stream de preços). Sem
+    isso, uma atualização feita em outro processo deixa os caches dos workers
+    web velhos até expirarem e os assinantes do stream sem eventos.
+    """
+    backend = settings.CACHES["default"]["BACKEND"]
+    broker = getattr(settings, "PRODUCTS_PUBSUB_BROKER", "products.pubsub.InProcessBroker")
+    return backend not in PROCESS_LOCAL_CACHES and broker != "products.pubsub.InProcessBroker"
+
+
+def start_catalog_refresh(name=FULL_REFRESH):
+    """
+    Dispara a atualização do catálogo inteiro em segundo plano, a menos que uma já
+    esteja em andamento: checkpoint sem finished_at e salvo há menos de
+    REFRESH_RUNNING_TIMEOUT_SECONDS. Com cache e broker compartilhados
+    (shares_price_changes) ela roda em outro processo (spawn_refresh_command);
+    senão, numa thread deste processo, para que as mudanças cheguem aos caches e
+    aos assinantes daqui. Retorna (checkpoint, iniciou).
+    """
+    timeout = timedelta(seconds=getattr(settings, "REFRESH_RUNNING_TIMEOUT_SECONDS", 600))
+    with transaction.atomic():
+        checkpoint, created = RefreshCheckpoint.objects.select_for_update().get_or_create(
+            name=name, defaults={"started_at": timezone.now()}
+        )
+        if not created and checkpoint.finished_at is None and checkpoint.updated_at > timezone.now() - timeout:
+            return checkpoint, False
+        # Marca como em andamento já aqui: o processo só salva o checkpoint ao fim do primeiro lote
+        if checkpoint.finished_at is not None:
+            _restart(checkpoint)
+        else:
+            checkpoint.save(update_fields=["updated_at"])
+    if shares_price_changes():
+        spawn_refresh_command()
+    else:
+        refresh_in_thread(name=name)
+    return checkpoint, True
+
+
+def refresh_catalog(scrape=default_scrape, chunk_size=500, workers=8, restart=False,
+                    name=FULL_REFRESH, on_chunk=None):
+    """
+    Atualiza o primeiro stock de cada produto, lote a lote, retomando do
+    checkpoint `name` se a última execução não terminou (ou do início, com
+    restart=True). on_chunk(checkpoint, changed_stocks) é chamado após cada
+    lote. Retorna o checkpoint final.
+    """
+    checkpoint, _ = RefreshCheckpoint.objects.get_or_create(
+        name=name, defaults={"started_at": timezone.now()}
+    )
+    if restart or checkpoint.finished_at is not None:
+        _restart(checkpoint)
+
+    while True:
+        product_ids = list(
+            Product.objects.filter(id__gt=checkpoint.last_product_id)
+            .order_by("id")
+            .values_list("id", flat=True)[:chunk_size]
+        )
+        if not product_ids:
+            break
+
+        changed = refresh_stocks(first_stocks(product_ids).values(), scrape=scrape, workers=workers)
+
+        checkpoint.last_product_id = product_ids[-1]
+        checkpoint.processed += len(product_ids)
+        checkpoint.updated += len(changed)
+        checkpoint.save(update_fields=["last_product_id", "processed", "updated", "updated_at"])
+        if on_chunk:
+            on_chunk(checkpoint, changed)
+
+        if len(product_ids) < chunk_size:
+            break
+
+    checkpoint.finished_at = timezone.now()
+    checkpoint.save(update_fields=["finished_at", "updated_at"])
+    return checkpoint
@@ -0,0 +1,78 @@
+"""
+Métricas do scraper, por loja (domínio).
+
+Cada busca vira observações nos histogramas do /api/_metrics (DNS, TTFB,
+download, parse, bytes e falhas por categoria) e uma linha de ScrapeSample,
+que o manage.py scraper_report resume. As linhas ficam num buffer em memória
+(as buscas rodam em threads do importador) e são gravadas em lote pela thread
+principal: ao fim de cada requisição ou pelo flush_samples() dos comandos.
+"""
+
+import threading
+from datetime import datetime, timezone
+
+from django.core.signals import request_finished
+from django.dispatch import receiver
+
+from .metrics import registry
+
+PHASES = ("dns", "ttfb", "download", "parse")
+BYTES_BUCKETS = (10_000, 50_000, 100_000, 250_000, 500_000, 1_000_000, 2_500_000, 5_000_000)
+MAX_PENDING = 10_000
+
+registry.counter("scraper_fetches_total", "Buscas do scraper por loja e resultado (ok ou categoria da falha).")
+registry.histogram("scraper_phase_seconds", "Tempo de cada fase da busca (dns, ttfb, download, parse).")
+registry.histogram("scraper_response_bytes", "Tamanho da página baixada.", BYTES_BUCKETS)
+
+_pending = []
+_lock = threading.Lock()
+
+
+def record_fetch(stats):
+    registry.inc("scraper_fetches_total", store=stats.store, outcome=stats.failure or "ok")
+    for phase in PHASES:
+        value = getattr(stats, phase)
+        if value is not None:
+            registry.observe("scraper_phase_seconds", value, store=stats.store, phase=phase)
+    if stats.bytes is not None:
+        registry.observe("scraper_response_bytes", stats.bytes, store=stats.store)
+
+    with _lock:
+        if len(_pending) < MAX_PENDING:  # sem flush (ex.: shell), não cresce sem limite
+            _pending.append(stats)
+
+
+def flush_samples():
+    """Grava as buscas pendentes como ScrapeSample. Devolve quantas foram gravadas."""
+    from .models import ScrapeSample
+
+    with _lock:
+        pending = _pending[:]
+        _pending.clear()
+    if not pending:
+        return 0
+
+    ScrapeSample.objects.bulk_create(
+        [
+            ScrapeSample(
+                store=stats.store,
+                url=stats.url[:500],
+                started_at=datetime.fromtimestamp(stats.started_at, tz=timezone.utc),
+                status_code=stats.status_code,
+                failure=stats.failure,
+                dns=stats.dns,
+                ttfb=stats.ttfb,
+                download=stats.download,
+                parse=stats.parse,
+                bytes=stats.bytes,
+            )
+            for stats in pending
+        ],
+        batch_size=500,
+    )
+    return len(pending)
+
+
+@receiver(request_finished)
+def flush_after_request(sender, **kwargs):
+    flush_samples()
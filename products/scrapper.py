@@ -1,42 +1,167 @@
 import requests
 from bs4 import BeautifulSoup
 import json
+import socket
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
 
 import sys
 
-sys.stdout.reconfigure(encoding="utf-8")  # Force UTF-8 output
+from .scraper_metrics import record_fetch
+
+# (conexão, leitura) em segundos; sem isso uma loja travada segura a thread para sempre
+TIMEOUT = (5, 20)
+
+# O DNS é medido com um getaddrinfo à parte, no máximo uma vez por minuto por host
+DNS_SAMPLE_SECONDS = 60
+_dns_sampled_at = {}
+
+
+class ScrapeFailure(str):
+    """
+    Mensagem de erro do scraper. Continua sendo uma str (os chamadores só
+    checam isinstance(result, dict)), mas carrega a categoria da falha:
+    timeout, connection, http_403, http_404, http_429, http_error,
+    missing_json, schema_change, unknown_store ou unknown.
+    """
+
+    def __new__(cls, message, category):
+        failure = super().__new__(cls, message)
+        failure.category = category
+        return failure
+
+
+@dataclass
+class FetchStats:
+    url: str
+    store: str = ""
+    started_at: float = field(default_factory=time.time)
+    status_code: int | None = None
+    failure: str = ""
+    dns: float | None = None
+    ttfb: float | None = None  # inclui conexão/TLS (o requests não separa)
+    download: float | None = None
+    parse: float | None = None
+    bytes: int | None = None
+    downloaded_at: float | None = None
+
+    def __post_init__(self):
+        self.store = self.store or store_label(self.url)
+
+
+def store_label(url: str) -> str:
+    host = urlsplit(url).hostname or "unknown"
+    return host.removeprefix("www.")
+
+
+def _sample_dns(url: str, stats: FetchStats):
+    parts = urlsplit(url)
+    now = time.monotonic()
+    if not parts.hostname or now - _dns_sampled_at.get(parts.hostname, -DNS_SAMPLE_SECONDS) < DNS_SAMPLE_SECONDS:
+        return
+    _dns_sampled_at[parts.hostname] = now
+    start = time.perf_counter()
+    try:
+        socket.getaddrinfo(parts.hostname, parts.port or 443, type=socket.SOCK_STREAM)
+    except OSError:
+        return  # a falha de verdade aparece (e é categorizada) no GET
+    stats.dns = time.perf_counter() - start
+
+
+def fetch(session, url: str, stats: FetchStats, **kwargs):
+    """GET medido: DNS, tempo até o primeiro byte, download e tamanho do corpo."""
+    _sample_dns(url, stats)
+    response = session.get(url, stream=True, timeout=TIMEOUT, **kwargs)
+    stats.status_code = response.status_code
+    stats.ttfb = response.elapsed.total_seconds()
+    start = time.perf_counter()
+    content = response.content
+    stats.download = time.perf_counter() - start
+    stats.bytes = len(content)
+    stats.downloaded_at = time.perf_counter()
+    return response
+
+
+def fail(stats: FetchStats, message: str, category: str) -> ScrapeFailure:
+    stats.failure = category
+    return ScrapeFailure(message, category)
+
+
+def http_failure_category(status_code: int) -> str:
+    if status_code in (403, 404, 429):
+        return f"http_{status_code}"
+    return "http_error"
+
+
+def exception_category(exc: Exception) -> str:
+    if isinstance(exc, requests.Timeout):
+        return "timeout"
+    if isinstance(exc, requests.ConnectionError):
+        return "connection"
+    if isinstance(exc, (KeyError, IndexError, TypeError, ValueError, AttributeError)):
+        return "schema_change"  # o JSON veio, mas não no formato esperado
+    return "unknown"
+
+
+def identifiers_from_ld_json(product_info: dict) -> dict:
+    # EAN e código do fabricante (schema.org), quando a loja publica
+    ean = next(
+        (product_info[key] for key in ("gtin13", "gtin", "gtin14", "gtin12", "gtin8") if product_info.get(key)),
+        None,
+    )
+    return {"ean": ean, "model": product_info.get("mpn")}
+
+
+def ld_json_product(soup) -> dict:
+    for script in soup.find_all("script", type="application/ld+json"):
+        try:
+            data = json.loads(script.get_text())
+        except ValueError:
+            continue
+        if isinstance(data, dict) and data.get("@type") == "Product":
+            return data
+    return {}
 
 
 def get_product_info_from_url(url: str) -> dict | str:
+    stats = FetchStats(url)
     try:
-        if "nike" in url:
-            try:
-                return get_product_from_nike(url)
-            except:
-                return "Could not find store data"
-        elif "adidas" in url:
-            try:
-                return get_product_from_adidas(url)
-            except:
-                return "Could not find store data"
-
-        headers = {
-            "User-Agent": "Mozilla/5.0 (X11; CrOS x86_64 12871.102.0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.141 Safari/537.36"
-        }
+        result = _scrape(url, stats)
+    except Exception:
+        result = fail(stats, "Could not find store data", "unknown")
+    if stats.downloaded_at is not None:
+        stats.parse = time.perf_counter() - stats.downloaded_at
+    record_fetch(stats)
+    return result
 
-        html = requests.get(url, headers=headers).content
-        soup = BeautifulSoup(html, "lxml")
 
-        data = soup.find_all("script", type="application/ld+json")
-        content_store = data[0].get_text()
-        try:
-            if "kabum" in content_store:
-                return get_product_from_kabum(soup, url)
-            return "Could not find product data"
-        except:
-            return "Could not find product data"
-    except:
-        return "Could not find store data"
+def _scrape(url: str, stats: FetchStats) -> dict | str:
+    if "nike" in url:
+        return get_product_from_nike(url, stats)
+    elif "adidas" in url:
+        return get_product_from_adidas(url, stats)
+
+    headers = {
+        "User-Agent": "Mozilla/5.0 (X11; CrOS x86_64 12871.102.0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.141 Safari/537.36"
+    }
+
+    try:
+        response = fetch(requests, url, stats, headers=headers)
+    except Exception as e:
+        return fail(stats, "Could not find store data", exception_category(e))
+    if response.status_code != 200:
+        return fail(stats, "Could not find store data", http_failure_category(response.status_code))
+
+    soup = BeautifulSoup(response.content, "lxml")
+
+    data = soup.find_all("script", type="application/ld+json")
+    if not data:
+        return fail(stats, "Could not find store data", "missing_json")
+    content_store = data[0].get_text()
+    if "kabum" in content_store:
+        return get_product_from_kabum(soup, url, stats)
+    return fail(stats, "Could not find product data", "unknown_store")
 
 
 # def get_product_from_nike(soup, url: str) -> dict | str:
@@ -72,7 +197,8 @@ def get_product_info_from_url(url: str) -> dict | str:
 #         return f"Search failed at: {url}"
 
 
-def get_product_from_nike(url: str) -> dict | str:
+def get_product_from_nike(url: str, stats: FetchStats | None = None) -> dict | str:
+    stats = stats or FetchStats(url)
     try:
         session = requests.Session()
         session.headers.update(
@@ -84,13 +210,13 @@ def get_product_from_nike(url: str) -> dict | str:
         )
 
         # Visit homepage first to get cookies
-        session.get("https://www.nike.com.br")
+        session.get("https://www.nike.com.br", timeout=TIMEOUT)
 
         # Fetch the product page
-        response = session.get(url)
+        response = fetch(session, url, stats)
 
         if response.status_code != 200:
-            return f"Access Denied or Page Not Found: {url}"
+            return fail(stats, f"Access Denied or Page Not Found: {url}", http_failure_category(response.status_code))
 
         # response.encoding = "latin1"
 
@@ -100,7 +226,7 @@ def get_product_from_nike(url: str) -> dict | str:
         # Find product data inside <script> tag
         data = soup.find("script", id="__NEXT_DATA__", type="application/json")
         if not data:
-            return f"Product data not found at: {url}"
+            return fail(stats, f"Product data not found at: {url}", "missing_json")
 
         content = data.get_text()
         json_object = json.loads(content)
@@ -123,10 +249,11 @@ def get_product_from_nike(url: str) -> dict | str:
         return result
 
     except Exception as e:
-        return f"Error fetching product data from: {url} | Error: {str(e)}"
+        return fail(stats, f"Error fetching product data from: {url} | Error: {str(e)}", exception_category(e))
 
 
-def get_product_from_adidas(url: str) -> dict | str:
+def get_product_from_adidas(url: str, stats: FetchStats | None = None) -> dict | str:
+    stats = stats or FetchStats(url)
     try:
         session = requests.Session()
         session.headers.update(
@@ -138,13 +265,13 @@ def get_product_from_adidas(url: str) -> dict | str:
         )
 
         # Visit homepage first to get cookies
-        session.get("https://www.adidas.com.br")
+        session.get("https://www.adidas.com.br", timeout=TIMEOUT)
 
         # Fetch the product page
-        response = session.get(url)
+        response = fetch(session, url, stats)
 
         if response.status_code != 200:
-            return f"Access Denied or Page Not Found: {url}"
+            return fail(stats, f"Access Denied or Page Not Found: {url}", http_failure_category(response.status_code))
 
         # print(response.text.encode("utf-8", "ignore").decode("utf-8"))
 
@@ -154,7 +281,7 @@ def get_product_from_adidas(url: str) -> dict | str:
         # Find product data inside <script> tag
         data = soup.find("script", type="application/ld+json")
         if not data:
-            return f"Product data not found at: {url}"
+            return fail(stats, f"Product data not found at: {url}", "missing_json")
 
         content = data.get_text()
 
@@ -176,17 +303,21 @@ def get_product_from_adidas(url: str) -> dict | str:
             "photo": product_info["image"][0],
             "store": "Adidas",
             "store_url": "https://www.adidas.com.br",
+            **identifiers_from_ld_json(product_info),
         }
 
         return result
 
     except Exception as e:
-        return f"Error fetching product data from: {url} | Error: {str(e)}"
+        return fail(stats, f"Error fetching product data from: {url} | Error: {str(e)}", exception_category(e))
 
 
-def get_product_from_kabum(soup, url: str) -> dict | str:
+def get_product_from_kabum(soup, url: str, stats: FetchStats | None = None) -> dict | str:
+    stats = stats or FetchStats(url)
     try:
         data = soup.find("script", id="__NEXT_DATA__", type="application/json")
+        if not data:
+            return fail(stats, f"Search failed at: {url}", "missing_json")
         content = data.get_text()
         json_object = json.loads(content)
 
@@ -213,16 +344,18 @@ def get_product_from_kabum(soup, url: str) -> dict | str:
         ]["photos"][0]
         result["store"] = "Kabum"
         result["store_url"] = "https://www.kabum.com.br"
+        result.update(identifiers_from_ld_json(ld_json_product(soup)))
 
         return result
     except Exception as e:
-        return f"Search failed at: {url}"
+        return fail(stats, f"Search failed at: {url}", exception_category(e))
 
 
 # ----------------------------------------------------------------
 
 
 def test1():
+    sys.stdout.reconfigure(encoding="utf-8")  # Force UTF-8 output
     url = "https://www.kabum.com.br/produto/380745/ssd-1-tb-kingston-nv2-m-2-2280-pcie-nvme-leitura-3500-mb-s-e-gravacao-2100-mb-s-snv2s-1000g"
     headers = {
         "User-Agent": "Mozilla/5.0 (X11; CrOS x86_64 12871.102.0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/81.0.4044.141 Safari/537.36"
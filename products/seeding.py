@@ -0,0 +1,98 @@
+"""
+Catálogo sintético para testes de carga e de orçamento de consultas.
+
+Gera lojas, produtos com nomes plausíveis (marca + tipo + especificação),
+1 a 4 ofertas por produto e um histórico de preços em PricePoint, tudo com
+bulk_create em lotes. Os sinais (prices_changed, simple_history) não são
+disparados: é um banco novo, sem listas nem histórico a manter; só o menor
+preço de cada produto (products/pricing.py) é calculado no fim de cada lote.
+"""
+
+import random
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .lookups import resolve_names
+from .pricing import refresh_lowest_prices
+from .models import Category, PricePoint, Product, Stock, Store, SubGroup
+from .stores import bump_version
+
+STORE_NAMES = (
+    "Kabum", "Pichau", "Terabyte", "Amazon", "Magalu", "Mercado Livre", "Fast Shop",
+    "Casas Bahia", "Americanas", "Carrefour", "Nike", "Adidas", "Centauro", "Netshoes",
+)
+CATALOG = {
+    ("Hardware", "SSD"): (("Kingston", "Samsung", "WD", "Crucial"), ("NV2", "980 Pro", "Green", "P3"), ("500GB", "1TB", "2TB")),
+    ("Hardware", "Memória"): (("Kingston", "Corsair", "XPG"), ("Fury Beast", "Vengeance", "Spectrix"), ("8GB", "16GB", "32GB")),
+    ("Hardware", "Placa de vídeo"): (("Gigabyte", "Asus", "MSI"), ("RTX 4060", "RTX 4070", "RX 7600"), ("8GB", "12GB", "16GB")),
+    ("Periféricos", "Mouse"): (("Logitech", "Razer", "Redragon"), ("G203", "Viper", "Cobra"), ("Preto", "Branco")),
+    ("Periféricos", "Teclado"): (("Logitech", "Redragon", "HyperX"), ("K120", "Kumara", "Alloy"), ("ABNT2", "US")),
+    ("Calçados", "Tênis"): (("Nike", "Adidas", "Olympikus"), ("Air Max", "Ultraboost", "Corre"), ("38", "40", "42", "44")),
+}
+
+
+def product_name(rng, serial):
+    (category, sub_group), (brands, lines, specs) = rng.choice(list(CATALOG.items()))
+    name = f"{sub_group} {rng.choice(brands)} {rng.choice(lines)} {rng.choice(specs)} #{serial:06d}"
+    return name, category, sub_group
+
+
+def seed_catalog(products, stores, history_points=0, seed=0, batch_size=2000):
+    """
+    Cria `stores` lojas e `products` produtos (com ofertas e `history_points`
+    preços por oferta, um por dia). Retorna {"stores", "products", "stocks", "price_points"}.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    counts = {"stores": stores, "products": 0, "stocks": 0, "price_points": 0}
+
+    store_objs = []
+    for i in range(stores):
+        name = STORE_NAMES[i % len(STORE_NAMES)] + (f" {i // len(STORE_NAMES) + 1}" if i >= len(STORE_NAMES) else "")
+        domain = name.lower().replace(" ", "")
+        store_objs.append(Store(name=name, logo=f"https://{domain}.com.br/logo.png", url=f"https://www.{domain}.com.br"))
+    store_objs = Store.objects.bulk_create(store_objs)
+    bump_version()  # bulk_create não dispara post_save
+    categories = resolve_names(Category, (category for category, _ in CATALOG))
+    sub_groups = resolve_names(SubGroup, (sub_group for _, sub_group in CATALOG))
+
+    first_serial = Product.objects.count() + 1
+    for start in range(0, products, batch_size):
+        with transaction.atomic():
+            rows = [product_name(rng, first_serial + i) for i in range(start, min(start + batch_size, products))]
+            product_objs = Product.objects.bulk_create([Product(name=name) for name, _, _ in rows])
+
+            stocks = []
+            for product, (_, category, sub_group) in zip(product_objs, rows):
+                base = rng.uniform(30, 5000)
+                for store in rng.sample(store_objs, min(len(store_objs), rng.randint(1, 4))):
+                    stocks.append(Stock(
+                        product=product, store=store,
+                        category=categories[category], sub_group=sub_groups[sub_group],
+                        price=round(base * rng.uniform(0.85, 1.2), 2),
+                        is_available=rng.random() > 0.15,
+                        url=f"{store.url}/produto/{product.pk}",
+                        photo=f"{store.url}/fotos/{product.pk}.jpg",
+                    ))
+            stocks = Stock.objects.bulk_create(stocks)
+
+            points = []
+            for stock in stocks:
+                # passeio aleatório terminando no preço atual
+                price = stock.price
+                for day in range(history_points):
+                    points.append(PricePoint(
+                        stock=stock, price=round(price, 2), is_available=stock.is_available,
+                        timestamp=now - timedelta(days=day),
+                    ))
+                    price *= rng.uniform(0.97, 1.04)
+            PricePoint.objects.bulk_create(points, batch_size=batch_size)
+            refresh_lowest_prices(product.id for product in product_objs)
+
+        counts["products"] += len(product_objs)
+        counts["stocks"] += len(stocks)
+        counts["price_points"] += len(points)
+
+    return counts
@@ -1,5 +1,22 @@
 from rest_framework import serializers
 from .models import Product, Stock, Store
+from .history import price_history
+from .middleware import timed_serialization
+from .stores import store_registry
+
+
+class TimedSerializerMixin:
+    """Mede o .data no "serialize" do Server-Timing (products.middleware)."""
+
+    @property
+    def data(self):
+        with timed_serialization():
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    # many=True: use como Meta.list_serializer_class
+    pass
 
 
 class StoreSerializer(serializers.ModelSerializer):
@@ -9,7 +26,11 @@ class StoreSerializer(serializers.ModelSerializer):
 
 
 class StockSerializer(serializers.ModelSerializer):
-    store = StoreSerializer(read_only=True)
+    # dict pré-renderizado do registro de lojas: sem consulta nem StoreSerializer por stock
+    store = serializers.SerializerMethodField()
+    # nomes das tabelas de lookup (Category/SubGroup)
+    category = serializers.CharField(source="category.name")
+    sub_group = serializers.CharField(source="sub_group.name")
     history = serializers.SerializerMethodField()
 
     class Meta:
@@ -26,24 +47,54 @@ class StockSerializer(serializers.ModelSerializer):
             "history"
         ]
 
+    def get_store(self, obj):
+        return store_registry.render(obj.store_id)
+
     def get_history(self, obj):
-        # pega os últimos registros do histórico
-        qs = obj.history.all().order_by("history_date")  # ou "-history_date" se quiser mais recente primeiro
-        return StockHistorySerializer(qs, many=True).data
+        # histórico compacto (PricePoint/DailyPrice) em ordem cronológica
+        return StockHistorySerializer(price_history(obj), many=True).data
 
 
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     stocks = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
-        fields = ["id", "name", "stocks"]
+        list_serializer_class = TimedListSerializer
+        fields = ["id", "name", "lowest_price", "is_available", "stocks"]
 
     def get_stocks(self, obj):
-        stocks = obj.stock_set.all()
+        if "stock_set" in getattr(obj, "_prefetched_objects_cache", {}):
+            stocks = obj.stock_set.all()
+        else:
+            stocks = obj.stock_set.select_related("category", "sub_group")
         return StockSerializer(stocks, many=True).data
 
 
+class BrokenLinkSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    product_name = serializers.CharField(source="product.name")
+    store = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Stock
+        list_serializer_class = TimedListSerializer
+        fields = [
+            "id",
+            "product_id",
+            "product_name",
+            "url",
+            "store",
+            "is_available",
+            "failure_count",
+            "last_error",
+            "next_attempt_at",
+            "refreshed_at",
+        ]
+
+    def get_store(self, obj):
+        return store_registry.render(obj.store_id)
+
+
 class StockHistorySerializer(serializers.Serializer):
     price = serializers.FloatField()
     history_date = serializers.DateTimeField()
\ No newline at end of file
@@ -0,0 +1,39 @@
+from dataclasses import dataclass
+
+from django.db.models.signals import post_save
+from django.dispatch import Signal, receiver
+
+from .models import Stock
+
+
+# Disparado sempre que o preço ou a disponibilidade de um ou mais stocks mudam.
+# Recebe `changes`: lista de PriceChange. Caminhos em lote (bulk) enviam um
+# único sinal com todas as mudanças, os saves individuais enviam uma lista com
+# um único item.
+prices_changed = Signal()
+
+
+@dataclass(frozen=True)
+class PriceChange:
+    stock: Stock
+    old_price: float | None
+    old_is_available: bool | None
+    created: bool = False
+
+
+@receiver(post_save, sender=Stock)
+def detect_price_change(sender, instance, created, raw=False, **kwargs):
+    if raw:  # loaddata
+        return
+
+    old_price, old_is_available = instance._loaded_price, instance._loaded_is_available
+    if created or old_price != instance.price or old_is_available != instance.is_available:
+        change = PriceChange(
+            stock=instance,
+            old_price=None if created else old_price,
+            old_is_available=None if created else old_is_available,
+            created=created,
+        )
+        prices_changed.send(sender=Stock, changes=[change])
+
+    instance.remember_price_state()
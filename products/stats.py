@@ -0,0 +1,151 @@
+"""
+Estatísticas de preço por stock (mínima histórica, médias de 30/90 dias e
+percentual abaixo da média), calculadas sobre o histórico compacto e
+cacheadas por stock até chegar um novo ponto de preço.
+
+As médias são ponderadas pelo tempo: cada preço vale pelo intervalo em que
+ficou em vigor, e a janela começa com o último preço anterior a ela (um
+preço que durou 60 dias pesa mais que outro que durou 1). Intervalos em que
+o stock esteve indisponível ficam de fora.
+"""
+
+from datetime import datetime, time, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import OuterRef, Q, Subquery
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .models import DailyPrice, PricePoint, Stock
+from .signals import prices_changed
+
+WINDOWS = (30, 90)
+
+
+def cache_key(stock_id):
+    return f"products:stock-stats:{stock_id}"
+
+
+def _lowest(queryset, field):
+    return Subquery(queryset.filter(stock_id=OuterRef("pk"), is_available=True).order_by(field).values(field)[:1])
+
+
+def _window_rows(queryset, date_field, stock_ids, since):
+    """Linhas de `queryset` a partir de `since` mais a última anterior a ela, para cada stock."""
+    before = queryset.filter(stock_id=OuterRef("pk"), **{f"{date_field}__lt": since})
+    anchors = Stock.objects.filter(id__in=stock_ids).values(
+        anchor=Subquery(before.order_by(f"-{date_field}", "-id").values("id")[:1])
+    )
+    return queryset.filter(Q(**{f"{date_field}__gte": since}) | Q(id__in=anchors), stock_id__in=stock_ids)
+
+
+def _timelines(stock_ids, since):
+    """{stock_id: [(momento, preço, disponível), ...]} em ordem, começando pelo último preço antes de `since`."""
+    timelines = {stock_id: [] for stock_id in stock_ids}
+    points = _window_rows(PricePoint.objects.all(), "timestamp", stock_ids, since)
+    for stock_id, moment, price, available in points.values_list("stock_id", "timestamp", "price", "is_available"):
+        timelines[stock_id].append((moment, price, available))
+
+    days = _window_rows(DailyPrice.objects.all(), "date", stock_ids, since.date())
+    for stock_id, day, close_at, price, available in days.values_list(
+        "stock_id", "date", "close_at", "close_price", "is_available"
+    ):
+        # resumos antigos, sem close_at, valem a partir do início do dia
+        moment = close_at or timezone.make_aware(datetime.combine(day, time.min))
+        timelines[stock_id].append((moment, price, available))
+
+    for timeline in timelines.values():
+        timeline.sort(key=lambda point: point[0])
+    return timelines
+
+
+def _time_weighted_average(timeline, since, now):
+    """Média dos preços disponíveis entre `since` e `now`, ponderada pelo tempo em vigor de cada um."""
+    total = weight = 0.0
+    for i, (moment, price, available) in enumerate(timeline):
+        end = timeline[i + 1][0] if i + 1 < len(timeline) else now
+        seconds = (min(end, now) - max(moment, since)).total_seconds()
+        if available and seconds > 0:
+            total += price * seconds
+            weight += seconds
+    return total / weight if weight else None
+
+
+def _pct_below(current, average):
+    if not average:
+        return None
+    return round((average - current) / average * 100, 2)
+
+
+def compute_stats(stock_ids):
+    """Calcula (sem cache) as estatísticas dos stocks informados."""
+    now = timezone.now()
+    stocks = Stock.objects.filter(id__in=stock_ids).values(
+        "id", "product_id", "store_id", "price", "is_available",
+        point_low=_lowest(PricePoint.objects.all(), "price"),
+        day_low=_lowest(DailyPrice.objects.all(), "min_price"),
+    )
+    timelines = _timelines(list(stock_ids), now - timedelta(days=max(WINDOWS)))
+
+    result = {}
+    for stock in stocks:
+        current = stock["price"]
+        lows = [low for low in (stock["point_low"], stock["day_low"]) if low is not None]
+        if stock["is_available"]:
+            lows.append(current)
+
+        stats = {
+            "stock_id": stock["id"],
+            "product_id": stock["product_id"],
+            "store_id": stock["store_id"],
+            "current_price": current,
+            "is_available": stock["is_available"],
+            "all_time_low": min(lows) if lows else None,
+        }
+        for window in WINDOWS:
+            average = _time_weighted_average(timelines[stock["id"]], now - timedelta(days=window), now)
+            # Sem histórico disponível na janela, o preço ficou parado no valor atual
+            average = round(average, 2) if average is not None else current
+            stats[f"avg_{window}"] = average
+            stats[f"pct_below_avg_{window}"] = _pct_below(current, average)
+
+        result[stock["id"]] = stats
+    return result
+
+
+def get_stats(stock_ids):
+    """Estatísticas dos stocks, lendo do cache e calculando só o que faltar."""
+    keys = {stock_id: cache_key(stock_id) for stock_id in stock_ids}
+    cached = cache.get_many(keys.values())
+    result = {stock_id: cached[key] for stock_id, key in keys.items() if key in cached}
+
+    missing = [stock_id for stock_id in stock_ids if stock_id not in result]
+    if missing:
+        computed = compute_stats(missing)
+        timeout = getattr(settings, "PRODUCT_STATS_CACHE_TIMEOUT", 60 * 60)
+        cache.set_many({keys[stock_id]: stats for stock_id, stats in computed.items()}, timeout)
+        result.update(computed)
+
+    return result
+
+
+def get_product_stats(product_ids):
+    """Agrupa as estatísticas dos stocks por produto: {product_id: [stats, ...]}."""
+    stock_ids = list(
+        Stock.objects.filter(product_id__in=product_ids).order_by("id").values_list("id", flat=True)
+    )
+    by_product = {product_id: [] for product_id in product_ids}
+    stats = get_stats(stock_ids)
+    for stock_id in stock_ids:
+        if stock_id in stats:  # pode ter sido apagado entre as consultas
+            by_product[stats[stock_id]["product_id"]].append(stats[stock_id])
+    return by_product
+
+
+@receiver(prices_changed)
+def invalidate_stats(sender, changes, **kwargs):
+    keys = [cache_key(change.stock.id) for change in changes]
+    # Só depois do commit: antes disso outra requisição recalcularia (e cachearia) o histórico antigo
+    transaction.on_commit(lambda: cache.delete_many(keys))
@@ -0,0 +1,148 @@
+"""
+Registro em memória das lojas.
+
+Store é uma tabela pequena que quase nunca muda, então cada processo a
+carrega inteira uma vez e resolve nome -> loja e id -> dict já serializado
+sem ir ao banco (e sem JOIN com products_store nas listagens).
+
+Invalidação: post_save/post_delete de Store limpam o registro do próprio
+processo na hora e, no commit, incrementam uma versão guardada no cache do
+Django (antes do commit outro processo recarregaria os dados antigos já com a
+versão nova). Os outros processos comparam a versão do cache no máximo uma
+vez a cada STORE_REGISTRY_CHECK_SECONDS (padrão: 1s) e recarregam se ela
+mudou; isso só vale entre processos com um cache compartilhado
+(Redis/Memcached). Escritas que não disparam sinais (bulk_create, loaddata,
+SQL) devem chamar bump_version(). Se a transação que alterou a loja for
+desfeita, o processo que a alterou só volta ao estado do banco na próxima
+invalidação.
+
+Um nome ou id desconhecido recarrega o registro uma vez (a loja pode ter sido
+criada em outro processo); se continuar faltando, a falta fica guardada por
+STORE_REGISTRY_MISS_SECONDS (padrão: 5s), para que buscas repetidas por uma
+loja inexistente não releiam a tabela a cada requisição.
+"""
+
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Store
+
+VERSION_KEY = "products:stores-version"
+
+
+def bump_version():
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:  # chave ainda não existe (ou expirou)
+        cache.add(VERSION_KEY, 1, timeout=None)
+    store_registry.invalidate()
+
+
+class StoreRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._loaded = False
+        self._version = None
+        self._checked_at = 0.0
+        self._by_id = {}
+        self._by_name = {}
+        self._rendered = {}
+        self._misses = {}  # ("name"|"id", chave) -> quando a recarga não a encontrou
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded = False
+
+    def _load(self):
+        from .serializers import StoreSerializer
+
+        version = cache.get(VERSION_KEY)
+        stores = list(Store.objects.order_by("id"))
+        by_name = {}
+        for store in stores:
+            by_name.setdefault(store.name, store)  # nomes repetidos: vale a loja mais antiga
+        with self._lock:
+            self._by_id = {store.id: store for store in stores}
+            self._by_name = by_name
+            self._rendered = {store.id: dict(StoreSerializer(store).data) for store in stores}
+            self._version = version
+            self._checked_at = time.monotonic()
+            self._misses = {}
+            self._loaded = True
+
+    def _ensure_fresh(self):
+        if not self._loaded:
+            return self._load()
+        interval = getattr(settings, "STORE_REGISTRY_CHECK_SECONDS", 1)
+        if time.monotonic() - self._checked_at >= interval:
+            if cache.get(VERSION_KEY) != self._version:
+                return self._load()
+            self._checked_at = time.monotonic()
+
+    def by_name(self):
+        """{nome: Store} de todas as lojas."""
+        self._ensure_fresh()
+        return self._by_name
+
+    def _reload_for(self, missing):
+        """
+        Recarrega por causa das chaves `missing` (("name", nome) ou ("id", id)), a menos
+        que todas já tenham faltado numa recarga há menos de STORE_REGISTRY_MISS_SECONDS.
+        """
+        ttl = getattr(settings, "STORE_REGISTRY_MISS_SECONDS", 5)
+        now = time.monotonic()
+        if all(now - self._misses.get(key, -ttl) < ttl for key in missing):
+            return
+        self._load()
+        with self._lock:
+            for kind, key in missing:
+                if key not in (self._by_name if kind == "name" else self._by_id):
+                    self._misses[kind, key] = time.monotonic()
+
+    def resolve(self, names):
+        """
+        {nome: Store} para os nomes pedidos que existem. Se algum faltar, recarrega
+        uma vez (a loja pode ter sido criada em outro processo há menos de um intervalo).
+        """
+        names = set(names)
+        by_name = self.by_name()
+        if not names <= by_name.keys():
+            self._reload_for([("name", name) for name in names - by_name.keys()])
+            by_name = self._by_name
+        return {name: by_name[name] for name in names if name in by_name}
+
+    def get(self, store_id):
+        self._ensure_fresh()
+        if store_id not in self._by_id:
+            self._reload_for([("id", store_id)])
+        return self._by_id.get(store_id)
+
+    def render(self, store_id):
+        """Dict da loja no formato do StoreSerializer (uma cópia; None se não existir)."""
+        self._ensure_fresh()
+        if store_id not in self._rendered:
+            self._reload_for([("id", store_id)])
+        rendered = self._rendered.get(store_id)
+        return dict(rendered) if rendered is not None else None
+
+    def ids_matching(self, text):
+        """Ids das lojas cujo nome contém `text` (sem diferenciar maiúsculas)."""
+        self._ensure_fresh()
+        text = text.casefold()
+        return [store_id for store_id, store in self._by_id.items() if text in store.name.casefold()]
+
+
+store_registry = StoreRegistry()
+
+
+@receiver(post_save, sender=Store)
+@receiver(post_delete, sender=Store)
+def invalidate_store_registry(sender, **kwargs):
+    store_registry.invalidate()
+    transaction.on_commit(bump_version)
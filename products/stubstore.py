@@ -0,0 +1,114 @@
+"""
+Servidor HTTP local que imita páginas de produto da Kabum.
+
+Usado nos testes e no teste de carga para exercitar o scraper de verdade
+(requests + BeautifulSoup) sem depender da internet:
+
+    with StubStoreServer({"1": {"name": "SSD", "price": 299.9}}) as store:
+        get_product_info_from_url(store.url("1"))
+
+Um produto pode trocar a página por {"status": 403} (resposta de erro),
+{"status": 302, "location": "..."} (redirecionamento),
+{"html": "..."} (página arbitrária, para simular mudança de layout) ou
+{"body": b"...", "content_type": "image/jpeg"} (qualquer arquivo, ex.: fotos).
+`delay` (segundos) atrasa todas as respostas, como a latência de uma loja real.
+"""
+
+import json
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+PAGE = """<html><head>
+<script type="application/ld+json">{ld_json}</script>
+<script id="__NEXT_DATA__" type="application/json">{next_data}</script>
+</head><body></body></html>"""
+
+
+def render_product_page(product):
+    description = {
+        "name": product["name"],
+        "priceDetails": {"discountPrice": product["price"]},
+        "menus": [
+            {"name": product.get("category", "Hardware")},
+            {"name": product.get("sub_group", "SSD")},
+        ],
+        "available": product.get("is_available", True),
+        "photos": [product.get("photo", "https://images.kabum.com.br/produto.jpg")],
+    }
+    ld_json = {"@context": "https://schema.org", "@type": "Product", "brand": "kabum", "name": product["name"]}
+    for key in ("gtin13", "mpn"):
+        if product.get(key):
+            ld_json[key] = product[key]
+    next_data = {"props": {"pageProps": {"initialZustandState": {"descriptionProduct": description}}}}
+    return PAGE.format(ld_json=json.dumps(ld_json), next_data=json.dumps(next_data))
+
+
+class StubStoreServer:
+    def __init__(self, products=None, host="127.0.0.1", port=0, delay=0):
+        self.products = dict(products or {})
+        self.delay = delay
+        self.hits = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                key = self.path.rstrip("/").rsplit("/", 1)[-1]
+                with stub._lock:
+                    stub.hits[key] += 1
+                product = stub.products.get(key)
+                if stub.delay:
+                    time.sleep(stub.delay)
+
+                if product is None or "status" in product:
+                    self.send_response(404 if product is None else product["status"])
+                    if product and "location" in product:
+                        self.send_header("Location", product["location"])
+                    self.end_headers()
+                    return
+
+                if "body" in product:
+                    body, content_type = product["body"], product.get("content_type", "application/octet-stream")
+                else:
+                    html = product["html"] if "html" in product else render_product_page(product)
+                    body, content_type = html.encode("utf-8"), "text/html; charset=utf-8"
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass  # silencioso nos testes
+
+        return Handler
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def url(self, key):
+        return f"{self.base_url}/produto/{key}"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
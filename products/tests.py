@@ -1,9 +1,51 @@
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.contrib.auth.models import User
+from unittest import skipUnless
 from unittest.mock import patch
+from datetime import timedelta
+from io import BytesIO, StringIO
+from contextlib import ExitStack
+from time import perf_counter
+import asyncio
+import json
+import os
+import re
+import socket
+import subprocess
+import sys
+import tempfile
 
-from .models import Product, Store, Stock
+import urllib3
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, connections
+from django.db.models import ProtectedError, Q
+from django.urls import URLPattern
+from django.test.utils import CaptureQueriesContext
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from .models import Category, DailyPrice, PricePoint, Product, RefreshCheckpoint, ScrapeSample, Store, Stock, SubGroup
+from .matching import ProductMatcher, normalize_tokens
+from .bulk import bulk_create_products
+from .history import downsample_stock
+from .importer import import_links
+from .lookups import classification, resolve_names
+from .pubsub import InProcessBroker, get_broker
+from .metrics import registry
+from .scraper_metrics import flush_samples
+from .scrapper import get_product_info_from_url
+from .signals import prices_changed
+from .serializers import ProductSerializer
+from .refresh import claim_stocks, refresh_catalog, refresh_in_thread, refresh_stocks, run_worker, start_catalog_refresh
+from .seeding import seed_catalog
+from .facets import PRICES_VERSION_KEY
+from .stats import cache_key as stats_cache_key
+from .stores import store_registry
+from . import thumbnails
+from .stubstore import StubStoreServer
 
 class ProductListAPITest(APITestCase):
     @classmethod
@@ -23,8 +65,7 @@ class ProductListAPITest(APITestCase):
                 is_available=True,
                 url="",
                 photo="",
-                category="Categoria",
-                sub_group="Subgrupo"
+                **(classification("Hardware", "SSD") if i % 5 == 0 else classification("Categoria", "Subgrupo"))
             )
 
     def setUp(self):
@@ -68,6 +109,98 @@ class ProductListAPITest(APITestCase):
             store_names = [s["store"]["name"] for s in item["stocks"]]
             self.assertTrue(any("Loja A" in name for name in store_names))
 
+    def test_filter_by_category_and_sub_group(self):
+        """Filtros por categoria e sub-grupo usam o nome exato"""
+        data = self.client.get("/api/products/?category=Hardware").json()
+        self.assertEqual(sorted(item["name"] for item in data["results"]), ["Produto 10", "Produto 5"])
+        self.assertEqual(data["results"][0]["stocks"][0]["category"], "Hardware")
+        self.assertEqual(data["results"][0]["stocks"][0]["sub_group"], "SSD")
+
+        data = self.client.get("/api/products/?sub_group=Subgrupo&page_size=20").json()
+        self.assertEqual(data["count"], 8)
+        self.assertEqual(self.client.get("/api/products/?category=hardware").json()["count"], 0)
+
+    def test_stock_filters_apply_to_the_same_stock(self):
+        """Loja e categoria precisam casar no mesmo stock do produto"""
+        product = Product.objects.create(name="Produto misto")
+        for store_name, names in (("Loja A", ("Hardware", "SSD")), ("Loja B", ("Categoria", "Subgrupo"))):
+            Stock.objects.create(
+                product=product, store=Store.objects.get(name=store_name), price=1, is_available=True,
+                url="", photo="", **classification(*names)
+            )
+        names = [item["name"] for item in self.client.get("/api/products/?store=Loja B&category=Hardware").json()["results"]]
+        self.assertNotIn("Produto misto", names)
+        names = [item["name"] for item in self.client.get("/api/products/?store=Loja A&category=Hardware").json()["results"]]
+        self.assertEqual(names, ["Produto 10", "Produto misto"])
+
+    def test_filter_by_price_range(self):
+        """Faixa de preço pelo menor preço atual do produto"""
+        data = self.client.get("/api/products/?min_price=150&max_price=200&page_size=20").json()
+        self.assertEqual(sorted(item["lowest_price"] for item in data["results"]), [160, 180, 200])
+
+    def test_price_range_with_store(self):
+        """Com loja, a faixa de preço e a disponibilidade valem para o stock daquela loja"""
+        product = Product.objects.create(name="Produto em duas lojas")
+        for store_name, price, available in (("Loja A", 50, True), ("Loja B", 500, False)):
+            Stock.objects.create(
+                product=product, store=Store.objects.get(name=store_name), price=price, is_available=available,
+                url="", photo="", **classification("Categoria", "Subgrupo")
+            )
+
+        def names(query):
+            return [item["name"] for item in self.client.get(f"/api/products/?page_size=20&{query}").json()["results"]]
+
+        self.assertIn("Produto em duas lojas", names("max_price=100"))  # menor preço: 50
+        self.assertIn("Produto em duas lojas", names("store=Loja A&max_price=100"))
+        self.assertNotIn("Produto em duas lojas", names("store=Loja B&max_price=100"))
+        self.assertIn("Produto em duas lojas", names("store=Loja B&min_price=400"))
+        self.assertNotIn("Produto em duas lojas", names("store=Loja B&min_price=400&available_only=1"))
+
+    def test_ordering_by_price(self):
+        """Mais barato primeiro, mais caro primeiro ou por nome"""
+        prices = [item["lowest_price"] for item in self.client.get("/api/products/?ordering=price&page_size=20").json()["results"]]
+        self.assertEqual(prices, sorted(prices))
+        self.assertEqual(prices[0], 120)
+        prices = [item["lowest_price"] for item in self.client.get("/api/products/?ordering=-price&page_size=3").json()["results"]]
+        self.assertEqual(prices, [300, 280, 260])
+        names = [item["name"] for item in self.client.get("/api/products/?ordering=name&page_size=2").json()["results"]]
+        self.assertEqual(names, ["Produto 1", "Produto 10"])
+
+    def test_available_only_and_lowest_price_maintenance(self):
+        """O menor preço acompanha mudanças de preço, disponibilidade e stocks apagados"""
+        product = Product.objects.get(name="Produto 3")
+        stock = product.stock_set.get()
+        cheaper = Stock.objects.create(
+            product=product, store=stock.store, price=50, is_available=True, url="", photo="",
+            **classification("Categoria", "Subgrupo")
+        )
+        product.refresh_from_db()
+        self.assertEqual((product.lowest_price, product.is_available), (50, True))
+
+        cheaper.is_available = False
+        cheaper.save()
+        product.refresh_from_db()
+        self.assertEqual(product.lowest_price, 160)  # o indisponível só conta se não houver outro
+
+        stock.is_available = False
+        stock.save()
+        product.refresh_from_db()
+        self.assertEqual((product.lowest_price, product.is_available), (50, False))
+        names = [item["name"] for item in self.client.get("/api/products/?available_only=1&page_size=20").json()["results"]]
+        self.assertNotIn("Produto 3", names)
+        self.assertEqual(len(names), 9)
+
+        cheaper.delete()
+        product.refresh_from_db()
+        self.assertEqual(product.lowest_price, 160)
+
+    def test_invalid_price_params(self):
+        """Ordenação ou preço inválido retornam 400"""
+        for query in ("ordering=stock", "min_price=abc", "max_price=nan"):
+            response = self.client.get(f"/api/products/?{query}")
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, query)
+            self.assertFalse(response.json()["success"])
+
     def test_pagination(self):
         """Verifica se a paginação funciona"""
         response = self.client.get("/api/products/?page=1&page_size=5")
@@ -199,6 +332,9 @@ class ProductCreateAPITest(APITestCase):
         self.assertEqual(data["product"]["name"], self.valid_payload["name"])
         self.assertEqual(len(data["product"]["stocks"]), 1)
         self.assertEqual(data["product"]["stocks"][0]["store"]["name"], self.store.name)
+        # menor preço já calculado a partir do stock recém-criado
+        self.assertEqual(data["product"]["lowest_price"], 199.99)
+        self.assertTrue(data["product"]["is_available"])
 
     def test_missing_fields(self):
         """Falha quando algum campo obrigatório está faltando"""
@@ -247,8 +383,7 @@ class ProductUpdatePricesAPITest(APITestCase):
                 is_available=True,
                 url=f"https://linkproduto{i}.com",
                 photo="",
-                category="Categoria",
-                sub_group="Subgrupo"
+                **classification("Categoria", "Subgrupo")
             )
             cls.products.append(product)
 
@@ -263,26 +398,58 @@ class ProductUpdatePricesAPITest(APITestCase):
         response = self.client.patch("/api/products/update_prices/")
         self.assertIn(response.status_code, [401, 403])
 
-    @patch("products.views.get_product_info_from_url")
-    def test_update_all_products(self, mock_scrape):
-        """Atualiza todos os produtos sem fornecer IDs e verifica se os produtos são atualizados corretamente"""
-        # Simula alterações de preço e disponibilidade
-        def side_effect(url):
-            return {"price": 999, "is_available": False}
-        mock_scrape.side_effect = side_effect
-
+    @patch("products.refresh.refresh_in_thread")
+    def test_update_all_products_in_background(self, mock_spawn):
+        """Sem IDs, dispara a atualização do catálogo em segundo plano e retorna só o checkpoint"""
         response = self.client.patch("/api/products/update_prices/")
         data = response.json()
-        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
         self.assertTrue(data["success"])
-        self.assertEqual(data["total_updated"], len(self.products))
-        self.assertEqual(len(data["updated_products"]), len(self.products))
+        self.assertEqual(data["message"], "Atualização do catálogo iniciada")
+        self.assertEqual(data["checkpoint"]["processed"], 0)
+        self.assertNotIn("updated_products", data)
+        mock_spawn.assert_called_once()
 
-        # Verifica no banco
-        for product in self.products:
-            stock = product.stock_set.first()
-            self.assertEqual(stock.price, 999)
-            self.assertFalse(stock.is_available)
+        # Não dispara outra enquanto a primeira estiver em andamento
+        data = self.client.patch("/api/products/update_prices/").json()
+        self.assertEqual(data["message"], "Atualização do catálogo já em andamento")
+        mock_spawn.assert_called_once()
+
+        # Depois de terminada, a próxima começa do início
+        RefreshCheckpoint.objects.filter(name="full").update(
+            last_product_id=self.products[-1].id, processed=5, updated=5, finished_at=timezone.now()
+        )
+        data = self.client.patch("/api/products/update_prices/").json()
+        self.assertEqual(data["message"], "Atualização do catálogo iniciada")
+        self.assertEqual((data["checkpoint"]["last_product_id"], data["checkpoint"]["processed"]), (0, 0))
+        self.assertEqual(mock_spawn.call_count, 2)
+
+    @patch("products.refresh.refresh_in_thread")
+    def test_resumes_stalled_refresh(self, mock_spawn):
+        """Uma execução que parou de salvar o checkpoint é retomada de onde parou"""
+        checkpoint = RefreshCheckpoint.objects.create(
+            name="full", last_product_id=self.products[1].id, processed=2, started_at=timezone.now()
+        )
+        RefreshCheckpoint.objects.filter(pk=checkpoint.pk).update(updated_at=timezone.now() - timedelta(hours=1))
+        data = self.client.patch("/api/products/update_prices/").json()
+        self.assertEqual(data["message"], "Atualização do catálogo iniciada")
+        self.assertEqual(data["checkpoint"]["last_product_id"], self.products[1].id)
+        mock_spawn.assert_called_once()
+
+    @patch("products.refresh.refresh_in_thread")
+    @patch("products.refresh.spawn_refresh_command")
+    def test_separate_process_needs_shared_cache_and_broker(self, mock_spawn, mock_thread):
+        """Outro processo só com cache e broker compartilhados; senão a atualização roda neste processo"""
+        with override_settings(PRODUCTS_PUBSUB_BROKER="pubsub.RedisBroker"):
+            start_catalog_refresh(name="local-cache")
+        mock_thread.assert_called_once_with(name="local-cache")
+        mock_spawn.assert_not_called()
+
+        shared_cache = {"default": {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://cache"}}
+        with override_settings(CACHES=shared_cache, PRODUCTS_PUBSUB_BROKER="pubsub.RedisBroker"):
+            start_catalog_refresh(name="shared")
+        mock_spawn.assert_called_once()
+        mock_thread.assert_called_once()
 
     @patch("products.views.get_product_info_from_url")
     def test_update_specific_products(self, mock_scrape):
@@ -304,7 +471,8 @@ class ProductUpdatePricesAPITest(APITestCase):
         product_no_stock = Product.objects.create(name="Sem Stock")
         mock_scrape.return_value = {"price": 500, "is_available": True}
 
-        response = self.client.patch("/api/products/update_prices/")
+        product_ids = [product_no_stock.id, self.products[0].id]
+        response = self.client.patch("/api/products/update_prices/", {"product_ids": product_ids}, format='json')
         data = response.json()
         self.assertEqual(response.status_code, 200)
         self.assertTrue(data["success"])
@@ -315,7 +483,8 @@ class ProductUpdatePricesAPITest(APITestCase):
     def test_scrape_returns_invalid_data(self, mock_scrape):
         """Scrapper retorna None ou string (erro), fazendo com que o produto não deva ser atualizado"""
         mock_scrape.side_effect = lambda url: "Erro"  # retorno inválido
-        response = self.client.patch("/api/products/update_prices/")
+        product_ids = [product.id for product in self.products]
+        response = self.client.patch("/api/products/update_prices/", {"product_ids": product_ids}, format='json')
         data = response.json()
         self.assertEqual(response.status_code, 200)
         self.assertTrue(data["success"])
@@ -326,9 +495,1905 @@ class ProductUpdatePricesAPITest(APITestCase):
     def test_scrape_raises_exception(self, mock_scrape):
         """Scrapper levanta exceção não quebrando o endpoint"""
         mock_scrape.side_effect = Exception("Erro inesperado")
-        response = self.client.patch("/api/products/update_prices/")
+        product_ids = [product.id for product in self.products]
+        response = self.client.patch("/api/products/update_prices/", {"product_ids": product_ids}, format='json')
         data = response.json()
         self.assertEqual(response.status_code, 200)
         self.assertTrue(data["success"])
         # Nenhum produto foi atualizado
-        self.assertEqual(data["total_updated"], 0)
\ No newline at end of file
+        self.assertEqual(data["total_updated"], 0)
+
+
+class PriceStreamTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.store = Store.objects.create(name="Loja Teste", logo="", url="")
+        cls.product = Product.objects.create(name="Produto Stream")
+        cls.stock = Stock.objects.create(
+            product=cls.product,
+            store=cls.store,
+            price=100,
+            is_available=True,
+            url="https://example.com/p",
+            photo="",
+            **classification("Categoria", "Subgrupo")
+        )
+
+    def test_broker_delivers_only_subscribed_products(self):
+        """Assinante recebe apenas eventos dos produtos assinados"""
+        async def scenario():
+            broker = InProcessBroker()
+            subscription = broker.subscribe([1, 2])
+            broker.publish({"product_id": 3, "price": 1})
+            broker.publish({"product_id": 2, "price": 2})
+            event = await subscription.get(timeout=1)
+            self.assertEqual(event["product_id"], 2)
+            subscription.close()
+            self.assertIsNone(await subscription.get(timeout=0.01))
+
+        asyncio.run(scenario())
+
+    @patch("products.pubsub.get_broker")
+    def test_price_change_is_published(self, mock_get_broker):
+        """Salvar um stock com novo preço publica o evento após o commit"""
+        stock = Stock.objects.get(pk=self.stock.pk)
+        stock.price = 80
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.save()
+
+        event = mock_get_broker.return_value.publish.call_args.args[0]
+        self.assertEqual(event["product_id"], self.product.id)
+        self.assertEqual(event["price"], 80)
+        self.assertEqual(event["old_price"], 100)
+
+    @patch("products.pubsub.get_broker")
+    def test_unchanged_save_is_not_published(self, mock_get_broker):
+        """Salvar sem alterar preço/disponibilidade não gera evento"""
+        stock = Stock.objects.get(pk=self.stock.pk)
+        stock.photo = "https://example.com/foto.jpg"
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.save()
+
+        mock_get_broker.return_value.publish.assert_not_called()
+
+    def test_missing_ids(self):
+        """Falha quando nenhum id é informado"""
+        response = self.client.get("/api/products/stream/")
+        self.assertEqual(response.status_code, 400)
+
+    def test_stream_pushes_events(self):
+        """O stream SSE envia os eventos publicados para os ids assinados"""
+        async def scenario():
+            response = await self.async_client.get(f"/api/products/stream/?ids={self.product.id}")
+            self.assertEqual(response["Content-Type"], "text/event-stream")
+            chunks = response.streaming_content
+            self.assertTrue((await anext(chunks)).startswith(b"retry:"))
+
+            get_broker().publish({"product_id": self.product.id, "price": 50})
+            chunk = await asyncio.wait_for(anext(chunks), 1)
+            await chunks.aclose()
+            return chunk
+
+        chunk = asyncio.run(scenario())
+        self.assertTrue(chunk.startswith(b"event: price"))
+        self.assertEqual(json.loads(chunk.split(b"data: ")[1])["price"], 50)
+
+
+class CompactHistoryTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.store = Store.objects.create(name="Loja Teste", logo="", url="")
+        cls.product = Product.objects.create(name="Produto Histórico")
+        cls.stock = Stock.objects.create(
+            product=cls.product,
+            store=cls.store,
+            price=100,
+            is_available=True,
+            url="https://example.com/p",
+            photo="",
+            **classification("Categoria", "Subgrupo")
+        )
+
+    def test_point_written_only_on_price_change(self):
+        """Um PricePoint é gravado na criação e a cada mudança de preço"""
+        stock = Stock.objects.get(pk=self.stock.pk)
+        stock.photo = "https://example.com/foto.jpg"
+        stock.save()
+        stock.price = 90
+        stock.save()
+
+        prices = list(self.stock.price_points.order_by("timestamp").values_list("price", flat=True))
+        self.assertEqual(prices, [100, 90])
+
+    def test_compact_history_downsamples(self):
+        """O comando reduz pontos antigos a resumos diários"""
+        PricePoint.objects.all().delete()
+        old_day = timezone.now() - timedelta(days=200)
+        PricePoint.objects.bulk_create([
+            PricePoint(stock=self.stock, timestamp=old_day + timedelta(minutes=offset), price=price, is_available=True)
+            for offset, price in [(1, 120), (2, 80), (3, 110)]
+        ])
+
+        call_command("compact_history", days=90, stdout=StringIO())
+
+        self.assertFalse(PricePoint.objects.filter(stock=self.stock).exists())
+        day = DailyPrice.objects.get(stock=self.stock)
+        self.assertEqual((day.min_price, day.max_price, day.close_price), (80, 120, 110))
+
+        # Executar de novo não duplica nada
+        call_command("compact_history", days=90, stdout=StringIO())
+        self.assertEqual(DailyPrice.objects.filter(stock=self.stock).count(), 1)
+        self.assertFalse(PricePoint.objects.filter(stock=self.stock).exists())
+
+    def test_price_saves_skip_full_history(self):
+        """Preço e disponibilidade só vão para o histórico compacto; o HistoricalStock guarda o resto"""
+        stock = Stock.objects.get(pk=self.stock.pk)
+        records = Stock.history.filter(id=stock.pk).count()
+        stock.price = 90
+        stock.save()
+        stock.is_available = False
+        stock.save()
+        self.assertEqual(Stock.history.filter(id=stock.pk).count(), records)
+        self.assertEqual(self.stock.price_points.count(), 3)
+
+        stock.photo = "https://example.com/outra.jpg"
+        stock.save()
+        self.assertEqual(Stock.history.filter(id=stock.pk).count(), records + 1)
+        self.assertNotIn("price", [field.name for field in Stock.history.model._meta.fields])
+
+    def test_migration_moves_history_prices(self):
+        """A 0013 copia os preços do HistoricalStock para o PricePoint antes de tirar as colunas, e pode ser desfeita"""
+        script = """
+import django; django.setup()
+from datetime import timedelta
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+from django.utils import timezone
+
+call_command("migrate", "products", "0012", verbosity=0)
+apps = MigrationExecutor(connection).loader.project_state(("products", "0012_dailyprice_close_at_history_backfill")).apps
+Stock, HistoricalStock = apps.get_model("products", "Stock"), apps.get_model("products", "HistoricalStock")
+names = {"name": "x"}
+fields = {
+    "url": "https://loja.com/1", "photo": "", "store": apps.get_model("products", "Store").objects.create(logo="", url="", **names),
+    "product": apps.get_model("products", "Product").objects.create(**names),
+    "category": apps.get_model("products", "Category").objects.create(**names),
+    "sub_group": apps.get_model("products", "SubGroup").objects.create(**names),
+}
+stock = Stock.objects.create(price=90, is_available=True, **fields)
+start = timezone.now() - timedelta(days=1)
+for minutes, price in [(0, 100), (1, 100), (2, 90)]:
+    HistoricalStock.objects.create(
+        id=stock.id, price=price, is_available=True, history_date=start + timedelta(minutes=minutes),
+        history_type="~", **fields
+    )
+call_command("migrate", "products", "0013", verbosity=0)
+PricePoint = MigrationExecutor(connection).loader.project_state(("products", "0013_historicalstock_without_prices")).apps.get_model("products", "PricePoint")
+print(list(PricePoint.objects.order_by("timestamp").values_list("price", flat=True)))
+call_command("migrate", "products", "0012", verbosity=0)
+print(sorted(set(HistoricalStock.objects.values_list("price", "is_available"))))
+"""
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                **os.environ, "DJANGO_SETTINGS_MODULE": "setup.settings",
+                "DJANGO_DB_PROFILE": "sqlite", "DJANGO_DB_PATH": os.path.join(tmp, "db.sqlite3"),
+            }
+            result = subprocess.run([sys.executable, "-c", script], env=env, capture_output=True, text=True,
+                                    cwd=settings.BASE_DIR)
+        self.assertEqual(result.returncode, 0, result.stderr)
+        self.assertEqual(result.stdout.split("\n")[:2], ["[100.0, 90.0]", "[(90.0, True)]"])
+
+    def test_downsample_keeps_latest_close(self):
+        """Pontos mais antigos que o fechamento já resumido não o sobrescrevem"""
+        PricePoint.objects.all().delete()
+        day = (timezone.localtime() - timedelta(days=200)).replace(hour=8, minute=0)
+        DailyPrice.objects.create(
+            stock=self.stock, date=timezone.localdate(day), min_price=90, max_price=90,
+            close_price=90, close_at=day + timedelta(hours=2), is_available=True,
+        )
+        PricePoint.objects.create(stock=self.stock, timestamp=day + timedelta(hours=1), price=70, is_available=False)
+
+        downsample_stock(self.stock, timezone.now() - timedelta(days=90))
+        summary = DailyPrice.objects.get(stock=self.stock)
+        self.assertEqual((summary.min_price, summary.close_price, summary.is_available), (70, 90, True))
+
+        PricePoint.objects.create(stock=self.stock, timestamp=day + timedelta(hours=3), price=95, is_available=True)
+        downsample_stock(self.stock, timezone.now() - timedelta(days=90))
+        summary = DailyPrice.objects.get(stock=self.stock)
+        self.assertEqual((summary.max_price, summary.close_price), (95, 95))
+
+    def test_history_serialized_from_compact_tables(self):
+        """O histórico exposto na API vem das tabelas compactas"""
+        response = self.client.get("/api/products/")
+        history = response.json()["results"][0]["stocks"][0]["history"]
+        self.assertEqual([item["price"] for item in history], [100])
+
+
+class ProductBatchAPITest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        store = Store.objects.create(name="Loja A", logo="", url="")
+        cls.products = []
+        for i in range(5):
+            product = Product.objects.create(name=f"Produto {i}")
+            Stock.objects.create(
+                product=product, store=store, price=100 + i, is_available=True,
+                url=f"https://loja.com/{i}", photo="", **classification("Categoria", "Subgrupo")
+            )
+            cls.products.append(product)
+
+    def test_requested_order(self):
+        """Retorna exatamente os produtos pedidos, na ordem pedida"""
+        ids = [self.products[3].id, self.products[0].id, self.products[4].id]
+        data = self.client.get(f"/api/products/batch/?ids={','.join(map(str, ids))}").json()
+        self.assertTrue(data["success"])
+        self.assertEqual([item["id"] for item in data["results"]], ids)
+        self.assertEqual(data["results"][0]["stocks"][0]["price"], 103)
+        self.assertEqual(data["missing"], [])
+
+    def test_post_and_missing_ids(self):
+        """POST com a lista de ids; ids inexistentes e repetidos"""
+        ids = [self.products[1].id, 999999, self.products[1].id, self.products[2].id]
+        data = self.client.post("/api/products/batch/", {"ids": ids}, format="json").json()
+        self.assertEqual([item["id"] for item in data["results"]], [self.products[1].id, self.products[2].id])
+        self.assertEqual(data["missing"], [999999])
+
+    def test_invalid_ids(self):
+        """ids ausentes, inválidos ou acima do limite retornam 400"""
+        for request in (
+            lambda: self.client.get("/api/products/batch/"),
+            lambda: self.client.get("/api/products/batch/?ids=1,a"),
+            lambda: self.client.post("/api/products/batch/", {"ids": [1, None]}, format="json"),
+            lambda: self.client.post("/api/products/batch/", [1, 2], format="json"),
+            lambda: self.client.get(f"/api/products/batch/?ids={','.join(map(str, range(1, 202)))}"),
+            # fora do inteiro de 64 bits, booleanos, floats e tipos errados
+            lambda: self.client.get("/api/products/batch/?ids=99999999999999999999"),
+            lambda: self.client.get("/api/products/batch/?ids=1,-99999999999999999999"),
+            lambda: self.client.get("/api/products/batch/?ids=1.7"),
+            lambda: self.client.get("/api/products/stats/?ids=99999999999999999999"),
+            lambda: self.client.post("/api/products/batch/", {"ids": [True, 1.7]}, format="json"),
+            lambda: self.client.post("/api/products/batch/", {"ids": [True]}, format="json"),
+            lambda: self.client.post("/api/products/batch/", {"ids": [1.0]}, format="json"),
+            lambda: self.client.post("/api/products/batch/", {"ids": [2 ** 63]}, format="json"),
+            lambda: self.client.post("/api/products/batch/", {"ids": 5}, format="json"),
+        ):
+            response = request()
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertFalse(response.json()["success"])
+
+        # o maior id de 64 bits é válido (só não existe)
+        data = self.client.post("/api/products/batch/", {"ids": [2 ** 63 - 1, "1"]}, format="json").json()
+        self.assertEqual(data["missing"][0], 2 ** 63 - 1)
+
+
+class ProductDetailAPITest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.store = Store.objects.create(name="Loja A", logo="", url="")
+        cls.product = Product.objects.create(name="Produto detalhe")
+        cls.stock = Stock.objects.create(
+            product=cls.product, store=cls.store, price=100, is_available=True,
+            url="https://loja.com/detalhe", photo="", **classification("Categoria", "Subgrupo")
+        )
+
+    def get(self, **headers):
+        return self.client.get(f"/api/products/{self.product.id}/", headers=headers)
+
+    def test_detail(self):
+        """Retorna o produto com ETag e Last-Modified"""
+        response = self.get()
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        self.assertTrue(data["success"])
+        self.assertEqual(data["product"]["name"], "Produto detalhe")
+        self.assertEqual(data["product"]["stocks"][0]["price"], 100)
+        self.assertTrue(response["ETag"].startswith(f'"{self.product.id}-'))
+        self.assertIn("Last-Modified", response)
+
+    def test_not_found(self):
+        response = self.client.get("/api/products/999999/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.json()["message"], "Produto não encontrado")
+
+    def test_if_none_match_costs_one_query(self):
+        """ETag ainda válido: 304 com uma única consulta e sem corpo"""
+        etag = self.get()["ETag"]
+        with self.assertNumQueries(1):
+            response = self.get(if_none_match=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b"")
+        self.assertEqual(response["ETag"], etag)
+        self.assertEqual(self.get(if_none_match=f'W/"x", {etag}').status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_changes_with_stocks_and_name(self):
+        """Mudança de preço, stock novo ou novo nome geram outro ETag"""
+        etags = {self.get()["ETag"]}
+
+        self.stock.price = 90
+        self.stock.save()
+        response = self.get(if_none_match=next(iter(etags)))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json()["product"]["lowest_price"], 90)
+        etags.add(response["ETag"])
+
+        Stock.objects.create(
+            product=self.product, store=self.store, price=80, is_available=True,
+            url="https://loja.com/detalhe-2", photo="", **classification("Categoria", "Subgrupo")
+        )
+        etags.add(self.get()["ETag"])
+
+        Product.objects.filter(pk=self.product.pk).update(name="Produto renomeado")
+        etags.add(self.get()["ETag"])
+        self.assertEqual(len(etags), 4)
+
+    def test_if_modified_since(self):
+        """If-Modified-Since (sem If-None-Match) usa o Last-Modified"""
+        last_modified = self.get()["Last-Modified"]
+        self.assertEqual(self.get(if_modified_since=last_modified).status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(
+            self.get(if_modified_since="Mon, 01 Jan 2001 00:00:00 GMT").status_code, status.HTTP_200_OK
+        )
+        # If-None-Match tem precedência
+        self.assertEqual(
+            self.get(if_modified_since=last_modified, if_none_match='"outro"').status_code, status.HTTP_200_OK
+        )
+
+
+class ProductStatsAPITest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.store = Store.objects.create(name="Loja Teste", logo="", url="")
+        cls.product = Product.objects.create(name="Produto Stats")
+        cls.stock = Stock.objects.create(
+            product=cls.product,
+            store=cls.store,
+            price=100,
+            is_available=True,
+            url="https://example.com/p",
+            photo="",
+            **classification("Categoria", "Subgrupo")
+        )
+        now = timezone.now()
+        PricePoint.objects.filter(stock=cls.stock).update(timestamp=now - timedelta(days=60))
+        PricePoint.objects.create(stock=cls.stock, timestamp=now - timedelta(days=10), price=140, is_available=True)
+        DailyPrice.objects.create(
+            stock=cls.stock, date=(now - timedelta(days=200)).date(),
+            min_price=70, max_price=90, close_price=80, is_available=True
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stats(self):
+        """Calcula mínima histórica, médias e % abaixo da média"""
+        response = self.client.get(f"/api/products/{self.product.id}/stats/")
+        self.assertEqual(response.status_code, 200)
+        stats = response.json()["stocks"][0]
+        self.assertEqual(stats["all_time_low"], 70)
+        # 100 de -30 a -10 dias e 140 nos últimos 10: (100 * 20 + 140 * 10) / 30
+        self.assertEqual(stats["avg_30"], 113.33)
+        self.assertEqual(stats["pct_below_avg_30"], 11.76)
+        # a janela de 90 dias começa com o fechamento de 80 do resumo diário anterior a ela
+        self.assertEqual(stats["avg_90"], 97.78)
+        self.assertEqual(stats["pct_below_avg_90"], -2.27)
+
+    def test_unavailable_time_is_ignored(self):
+        """O tempo em que o stock ficou indisponível não entra na média"""
+        PricePoint.objects.create(
+            stock=self.stock, timestamp=timezone.now() - timedelta(days=20), price=10, is_available=False
+        )
+        stats = self.client.get(f"/api/products/{self.product.id}/stats/").json()["stocks"][0]
+        # 100 de -30 a -20 dias, indisponível até -10 e 140 depois
+        self.assertEqual(stats["avg_30"], 120)
+
+    def test_unknown_product(self):
+        """Produto inexistente retorna 404"""
+        response = self.client.get("/api/products/999999/stats/")
+        self.assertEqual(response.status_code, 404)
+
+    def test_batch_keeps_requested_order(self):
+        """A versão em lote devolve os produtos na ordem pedida"""
+        other = Product.objects.create(name="Outro Produto")
+        response = self.client.get(f"/api/products/stats/?ids={other.id},{self.product.id}")
+        results = response.json()["results"]
+        self.assertEqual([r["product_id"] for r in results], [other.id, self.product.id])
+        self.assertEqual(results[0]["stocks"], [])
+
+    def test_batch_invalid_ids(self):
+        """ids inválidos retornam 400"""
+        response = self.client.get("/api/products/stats/?ids=1,a")
+        self.assertEqual(response.status_code, 400)
+
+    def test_cached_until_new_price_point(self):
+        """As estatísticas ficam em cache até chegar um novo preço"""
+        url = f"/api/products/{self.product.id}/stats/"
+        self.client.get(url)
+        with self.assertNumQueries(2):  # só o exists() e a lista de stocks
+            self.client.get(url)
+
+        stock = Stock.objects.get(pk=self.stock.pk)
+        stock.price = 50
+        with self.captureOnCommitCallbacks(execute=True):
+            stock.save()
+            # o cache só é invalidado depois do commit
+            self.assertIsNotNone(cache.get(stats_cache_key(self.stock.id)))
+        stats = self.client.get(url).json()["stocks"][0]
+        self.assertEqual(stats["current_price"], 50)
+        self.assertEqual(stats["all_time_low"], 50)
+
+
+class ProductBulkCreateAPITest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.store = Store.objects.create(name="Loja Teste", logo="", url="")
+        cls.existing = Product.objects.create(name="Produto Existente")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.login(username="testuser", password="12345")
+
+    def item(self, i, **overrides):
+        item = {
+            "name": f"Produto {i}",
+            "price": 100 + i,
+            "is_available": True,
+            "category": "Categoria X",
+            "sub_group": "Subgrupo Y",
+            "link": f"https://example.com/produto/{i}",
+            "photo": "https://example.com/foto.jpg",
+            "store": self.store.name
+        }
+        item.update(overrides)
+        return item
+
+    def test_authentication_required(self):
+        """Falha quando usuário não está autenticado"""
+        self.client.logout()
+        response = self.client.post("/api/products/bulk_create/", [self.item(1)], format='json')
+        self.assertIn(response.status_code, [401, 403])
+
+    def test_bulk_creation(self):
+        """Cria vários produtos, com histórico, num número fixo de consultas"""
+        items = [self.item(i) for i in range(50)]
+        # sessão, usuário, lojas, links, savepoint, categoria e sub-grupo novos
+        # (busca, criação, releitura de cada um), produtos, stocks, histórico,
+        # price points, itens de listas, menor preço dos produtos, release
+        with self.assertNumQueries(18):
+            response = self.client.post("/api/products/bulk_create/", items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        data = response.json()
+        self.assertEqual(data["total_created"], 50)
+        self.assertEqual(Stock.objects.filter(store=self.store).count(), 50)
+        self.assertEqual(Stock.history.filter(store=self.store).count(), 50)
+        self.assertEqual(PricePoint.objects.count(), 50)
+
+    def test_per_item_report(self):
+        """Itens inválidos são reportados sem impedir os demais"""
+        items = [
+            self.item(1),
+            self.item(2, store="Loja Inexistente"),
+            self.item(3, price=None),
+            self.item(4, link="https://example.com/produto/1"),
+            self.item(5, name=self.existing.name, is_available=False),
+        ]
+        data = self.client.post("/api/products/bulk_create/", {"items": items}, format='json').json()
+        results = data["results"]
+        self.assertEqual([r["success"] for r in results], [True, False, False, False, True])
+        self.assertEqual(results[1]["message"], "Loja não encontrada")
+        self.assertEqual(results[2]["message"], "Campos incompletos")
+        self.assertEqual(results[3]["message"], "Link já cadastrado")
+        # Produto existente é reaproveitado pelo nome
+        self.assertEqual(results[4]["product_id"], self.existing.id)
+        self.assertFalse(Stock.objects.get(pk=results[4]["stock_id"]).is_available)
+
+    def test_strict_validation(self):
+        """Textos longos demais, booleanos ambíguos e preços não finitos ou negativos são rejeitados"""
+        items = [
+            self.item(1, name="N" * 201),
+            self.item(2, category="C" * 51),
+            self.item(3, link="https://example.com/" + "l" * 200),
+            self.item(4, is_available="talvez"),
+            self.item(5, is_available=1),
+            self.item(6, price="NaN"),
+            self.item(7, price="inf"),
+            self.item(8, price=-1),
+            self.item(9, price=True),
+            self.item(10, is_available="false"),
+            self.item(11, is_available="True", price="99.90"),
+        ]
+        results = self.client.post("/api/products/bulk_create/", items, format='json').json()["results"]
+        self.assertEqual([r["success"] for r in results], [False] * 9 + [True, True])
+        self.assertEqual(results[0]["message"], "Campo name excede 200 caracteres")
+        self.assertEqual(results[1]["message"], "Campo category excede 50 caracteres")
+        self.assertEqual(results[2]["message"], "Campo link excede 200 caracteres")
+        self.assertEqual({r["message"] for r in results[3:5]}, {"Disponibilidade inválida"})
+        self.assertEqual({r["message"] for r in results[5:9]}, {"Preço inválido"})
+
+        self.assertFalse(Stock.objects.get(pk=results[9]["stock_id"]).is_available)
+        stock = Stock.objects.get(pk=results[10]["stock_id"])
+        self.assertTrue(stock.is_available)
+        self.assertEqual(stock.price, 99.9)
+
+    def test_non_text_fields(self):
+        """Lojas, links e nomes que não são texto e EAN/modelo longos demais reprovam só o próprio item"""
+        items = [
+            self.item(1, store=[]),
+            self.item(2, store={"name": "Kabum"}),
+            self.item(3, link=["https://example.com/3"]),
+            self.item(4, name={"pt": "Produto"}),
+            self.item(5, category=50),
+            self.item(6, ean="7" * 15),
+            self.item(7, model="M" * 51),
+            self.item(8, ean="7891234567890", model="ABC-123"),
+        ]
+        response = self.client.post("/api/products/bulk_create/", items, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        results = response.json()["results"]
+        self.assertEqual([r.get("message") for r in results[:7]], [
+            "Campo store deve ser texto",
+            "Campo store deve ser texto",
+            "Campo link deve ser texto",
+            "Campo name deve ser texto",
+            "Campo category deve ser texto",
+            "Campo ean excede 14 caracteres",
+            "Campo model excede 50 caracteres",
+        ])
+        self.assertTrue(results[7]["success"])
+        product = Product.objects.get(pk=results[7]["product_id"])
+        self.assertEqual((product.ean, product.model_number), ("7891234567890", "abc123"))
+
+    def test_empty_payload(self):
+        """Falha quando nenhum item é enviado"""
+        response = self.client.post("/api/products/bulk_create/", [], format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductImportAPITest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.store = Store.objects.create(name="Kabum", logo="", url="https://www.kabum.com.br")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.login(username="testuser", password="12345")
+        self.stub = StubStoreServer({
+            str(i): {"name": f"SSD {i}", "price": 200 + i} for i in range(1, 6)
+        }).start()
+        self.addCleanup(self.stub.stop)
+
+    def test_authentication_required(self):
+        """Falha quando usuário não está autenticado"""
+        self.client.logout()
+        response = self.client.post("/api/products/import/", {"links": [self.stub.url("1")]}, format='json')
+        self.assertIn(response.status_code, [401, 403])
+
+    def test_import_from_stub_store(self):
+        """Raspa os links na loja local e cria os produtos, reportando cada link"""
+        Stock.objects.create(
+            product=Product.objects.create(name="SSD 5"),
+            store=self.store,
+            price=205,
+            is_available=True,
+            url=self.stub.url("5"),
+            photo="",
+            **classification("Hardware", "SSD")
+        )
+        links = [self.stub.url(key) for key in ("1", "2", "3", "4", "5", "404")] + [self.stub.url("1")]
+
+        response = self.client.post("/api/products/import/", {"links": links}, format='json')
+        data = response.json()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(data["total_created"], 4)
+        self.assertEqual(data["total_duplicates"], 2)
+        self.assertEqual(data["total_failed"], 1)
+        # Um resultado por link enviado; a repetição aponta para o produto criado pela primeira
+        self.assertEqual(
+            [r["status"] for r in data["results"]], ["created"] * 4 + ["duplicate", "error", "duplicate"]
+        )
+        self.assertEqual(data["results"][6]["link"], self.stub.url("1"))
+        self.assertEqual(data["results"][6]["product_id"], data["results"][0]["product_id"])
+        self.assertEqual(Product.objects.get(name="SSD 3").stock_set.get().price, 203)
+        # Links repetidos ou já cadastrados não são raspados
+        self.assertEqual(self.stub.hits["1"], 1)
+        self.assertEqual(self.stub.hits["5"], 0)
+
+    def test_import_command(self):
+        """O comando import_links lê os links de um arquivo"""
+        path = self.enterContext(tempfile.TemporaryDirectory()) + "/links.txt"
+        with open(path, "w") as f:
+            f.write("\n".join(self.stub.url(key) for key in ("1", "2")))
+
+        out = StringIO()
+        call_command("import_links", path, workers=2, stdout=out)
+        self.assertIn("2 criados", out.getvalue())
+        self.assertEqual(Stock.objects.filter(store=self.store).count(), 2)
+
+
+@skipUnless(connection.vendor == "sqlite", "EXPLAIN QUERY PLAN é específico do SQLite")
+class QueryPlanTest(APITestCase):
+    """Falha se alguma consulta dos endpoints fizer full scan de uma tabela"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username="testuser", password="12345")
+        cls.store = Store.objects.create(name="Loja A", logo="", url="")
+        cls.products = []
+        for i in range(20):
+            product = Product.objects.create(name=f"Produto {i}")
+            Stock.objects.create(
+                product=product,
+                store=cls.store,
+                price=100 + i,
+                is_available=True,
+                url=f"https://example.com/produto/{i}",
+                photo="",
+                **classification("Categoria", "Subgrupo")
+            )
+            cls.products.append(product)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.login(username="testuser", password="12345")
+        cache.clear()
+
+    def full_scans(self, sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}")
+            plan = [row[-1] for row in cursor.fetchall()]
+
+        # Subconsultas (CO-ROUTINE/MATERIALIZE) não são tabelas
+        subqueries = {d.split()[-1] for d in plan if d.startswith(("CO-ROUTINE", "MATERIALIZE"))}
+        scans = []
+        for detail in plan:
+            match = re.match(r"SCAN (\w+)", detail)
+            if match and "USING" not in detail and match.group(1) not in subqueries:
+                scans.append(detail)
+        return scans, plan
+
+    def assertNoFullScans(self, request, allowed=()):
+        with CaptureQueriesContext(connection) as context:
+            response = request()
+        self.assertLess(response.status_code, 400)
+
+        for query in context.captured_queries:
+            sql = query["sql"]
+            # Consultas sem WHERE (COUNT da paginação, mapa de lojas) leem a tabela toda por definição
+            if not sql.lstrip().upper().startswith("SELECT") or " WHERE " not in sql:
+                continue
+            scans, plan = self.full_scans(sql)
+            scans = [scan for scan in scans if scan.split()[1] not in allowed]
+            self.assertFalse(scans, f"Full scan em:\n{sql}\nPlano:\n" + "\n".join(plan))
+
+    def test_product_list(self):
+        self.assertNoFullScans(lambda: self.client.get("/api/products/?page_size=20"))
+
+    def test_product_list_filtered_by_store(self):
+        self.assertNoFullScans(lambda: self.client.get("/api/products/?store=Loja"))
+
+    def test_product_list_filtered_by_category(self):
+        self.assertNoFullScans(lambda: self.client.get("/api/products/?category=Categoria&sub_group=Subgrupo"))
+
+    def test_product_list_by_price(self):
+        self.assertNoFullScans(lambda: self.client.get("/api/products/?ordering=-price&min_price=105&max_price=110"))
+        self.assertNoFullScans(lambda: self.client.get("/api/products/?ordering=price&available_only=1"))
+
+    def test_product_list_search(self):
+        # LIKE '%...%' não usa índice: o scan de produtos é esperado
+        self.assertNoFullScans(
+            lambda: self.client.get("/api/products/?product_search=Produto 1"),
+            allowed={"products_product"},
+        )
+
+    def test_product_detail(self):
+        Stock.objects.filter(product=self.products[0]).update(price=1)
+        self.assertNoFullScans(lambda: self.client.get(f"/api/products/{self.products[0].id}/"))
+
+    def test_broken_links(self):
+        Stock.objects.filter(product=self.products[0]).update(failure_count=1, last_error="timeout")
+        self.assertNoFullScans(lambda: self.client.get("/api/products/broken_links/"))
+
+    def test_stats(self):
+        ids = ",".join(str(p.id) for p in self.products[:5])
+        self.assertNoFullScans(lambda: self.client.get(f"/api/products/{self.products[0].id}/stats/"))
+        self.assertNoFullScans(lambda: self.client.get(f"/api/products/stats/?ids={ids}"))
+
+    @patch("products.views.get_product_info_from_url")
+    def test_update_prices(self, mock_scrape):
+        mock_scrape.side_effect = lambda url: {"price": 1, "is_available": True}
+        ids = [p.id for p in self.products[:3]]
+        self.assertNoFullScans(
+            lambda: self.client.patch("/api/products/update_prices/", {"product_ids": ids}, format="json")
+        )
+
+    def test_bulk_create(self):
+        items = [{
+            "name": f"Novo {i}", "price": 10, "is_available": True, "category": "C",
+            "sub_group": "S", "link": f"https://example.com/novo/{i}", "photo": "p", "store": "Loja A",
+        } for i in range(5)]
+        self.assertNoFullScans(lambda: self.client.post("/api/products/bulk_create/", items, format="json"))
+
+    def test_lists(self):
+        from lists.models import List, ListItem
+
+        list_obj = List.objects.create(user=self.user, name="Lista")
+        ListItem.objects.create(list=list_obj, product=self.products[0])
+        self.assertNoFullScans(lambda: self.client.get("/api/lists/"))
+        self.assertNoFullScans(lambda: self.client.get(f"/api/lists/{list_obj.id}/"))
+        self.assertNoFullScans(lambda: self.client.get(f"/api/lists/{list_obj.id}/optimize/"))
+
+
+class ProductNormalizationTest(SimpleTestCase):
+    def test_normalize_tokens(self):
+        """Normaliza acentos, caixa, stopwords e unidades"""
+        self.assertEqual(
+            normalize_tokens("SSD 1 TB Kingston NV2, M.2 2280 - Memória de Vídeo"),
+            ["ssd", "1tb", "kingston", "nv2", "m", "2", "2280", "memoria", "video"],
+        )
+
+    def test_match_same_product_from_other_store(self):
+        """Casa nomes com outra ordem/formatação e rejeita modelos diferentes"""
+        matcher = ProductMatcher()
+        matcher.add(1, "SSD 1 TB Kingston NV2, M.2 2280, PCIe NVMe, SNV2S/1000G")
+        matcher.add(2, "SSD 2 TB Kingston NV2, M.2 2280, PCIe NVMe, SNV2S/2000G")
+        matcher.add(3, "Mouse Gamer Logitech G203 RGB")
+
+        self.assertEqual(matcher.match("Kingston NV2 SSD 1TB M.2 2280 PCIe NVMe SNV2S/1000G")[0], 1)
+        self.assertIsNone(matcher.match("SSD 1TB Kingston NV3 M.2 2280 PCIe NVMe SNV3S/1000G"))
+        self.assertIsNone(matcher.match("Teclado Mecânico Redragon Kumara"))
+
+    def test_match_by_identifiers(self):
+        """EAN ou modelo iguais casam mesmo com nomes diferentes"""
+        matcher = ProductMatcher()
+        matcher.add(1, "Nome qualquer", ean="7891234567895")
+        self.assertEqual(matcher.match("Outro nome", ean="7891234567895"), (1, 1.0))
+
+
+class ProductMatchingTest(APITestCase):
+    def test_bulk_create_attaches_stock_to_matched_product(self):
+        """Com o matcher, o item de outra loja vira um stock do produto existente"""
+        kabum = Store.objects.create(name="Kabum", logo="", url="")
+        pichau = Store.objects.create(name="Pichau", logo="", url="")
+        product = Product.objects.create(name="SSD 1 TB Kingston NV2 M.2 2280 SNV2S/1000G")
+        Stock.objects.create(
+            product=product, store=kabum, price=300, is_available=True,
+            url="https://kabum/1", photo="", **classification("Hardware", "SSD")
+        )
+
+        base = {"price": 290, "is_available": True, "category": "Hardware", "sub_group": "SSD", "photo": "p", "store": "Pichau"}
+        items = [
+            {**base, "name": "Kingston NV2 SSD 1TB M.2 2280 SNV2S/1000G", "link": "https://pichau/1"},
+            {**base, "name": "Mouse Logitech G203", "link": "https://pichau/2"},
+            {**base, "name": "Mouse Gamer Logitech G203", "link": "https://pichau/3", "store": "Kabum"},
+        ]
+        results = bulk_create_products(items, matcher=ProductMatcher.from_database())
+
+        self.assertEqual(results[0]["product_id"], product.id)
+        self.assertTrue(results[0]["matched"])
+        self.assertEqual(product.stock_set.filter(store=pichau).count(), 1)
+        # Itens do mesmo lote também casam entre si
+        self.assertEqual(results[1]["product_id"], results[2]["product_id"])
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_api_match_is_opt_in(self):
+        """Os endpoints de criação em lote e importação usam o matcher com ?match=1"""
+        user = User.objects.create_user(username="testuser", password="12345")
+        self.client.force_authenticate(user)
+        Store.objects.create(name="Kabum", logo="", url="")
+        product = Product.objects.create(name="SSD 1 TB Kingston NV2 M.2 2280 SNV2S/1000G")
+        item = {
+            "name": "Kingston NV2 SSD 1TB M.2 2280 SNV2S/1000G", "price": 290, "is_available": True,
+            "category": "Hardware", "sub_group": "SSD", "photo": "p", "store": "Kabum",
+        }
+
+        result = self.client.post(
+            "/api/products/bulk_create/?match=1", [{**item, "link": "https://kabum/1"}], format="json"
+        ).json()["results"][0]
+        self.assertEqual(result["product_id"], product.id)
+        self.assertTrue(result["matched"])
+
+        with StubStoreServer({"1": {"name": "Kingston NV2 1 TB SSD M.2 2280 SNV2S/1000G", "price": 280}}) as stub:
+            result = self.client.post(
+                "/api/products/import/?match=1", {"links": [stub.url("1")]}, format="json"
+            ).json()["results"][0]
+        self.assertEqual(result["product_id"], product.id)
+        self.assertTrue(result["matched"])
+
+        # Sem o parâmetro, o item cria um produto novo
+        result = self.client.post(
+            "/api/products/bulk_create/", [{**item, "link": "https://kabum/2"}], format="json"
+        ).json()["results"][0]
+        self.assertNotEqual(result["product_id"], product.id)
+        self.assertFalse(result["matched"])
+
+    def test_import_extracts_identifiers(self):
+        """O EAN/modelo publicados pela loja são gravados no produto"""
+        Store.objects.create(name="Kabum", logo="", url="")
+        with StubStoreServer({"1": {"name": "SSD X", "price": 100, "gtin13": "7891234567895", "mpn": "SNV2S/1000G"}}) as stub:
+            import_links([stub.url("1")])
+        product = Product.objects.get(name="SSD X")
+        self.assertEqual((product.ean, product.model_number), ("7891234567895", "snv2s1000g"))
+
+
+class PerformanceMiddlewareTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        store = Store.objects.create(name="Loja A", logo="", url="")
+        product = Product.objects.create(name="Produto 1")
+        Stock.objects.create(
+            product=product, store=store, price=100, is_available=True,
+            url="", photo="", **classification("Categoria", "Subgrupo")
+        )
+
+    def test_server_timing_header(self):
+        """Cada resposta traz o Server-Timing com SQL, serializers, renderização e total"""
+        response = self.client.get("/api/products/")
+        timing = response["Server-Timing"]
+        for metric in ("db;dur=", "serialize;dur=", "render;dur=", "app;dur=", "total;dur="):
+            self.assertIn(metric, timing)
+        self.assertRegex(timing, r'desc="[1-9]\d* queries"')
+
+    def test_serializer_time(self):
+        """O tempo dos serializers entra no "serialize", sem o SQL que eles disparam"""
+        from .middleware import RequestStats, current_stats
+
+        stats = RequestStats()
+        token = current_stats.set(stats)
+        try:
+            with connection.execute_wrapper(stats):
+                # sem prefetch: cada produto busca seus stocks durante a serialização
+                ProductSerializer(Product.objects.all(), many=True).data
+        finally:
+            current_stats.reset(token)
+        self.assertGreater(stats.serialize_time, 0)
+        self.assertGreaterEqual(stats.queries, 2)
+        self.assertFalse(stats.serializing)
+
+    def test_metrics_endpoint(self):
+        """As latências por view aparecem no /api/_metrics"""
+        self.client.get("/api/products/")
+        body = self.client.get("/api/_metrics").content.decode()
+        self.assertIn('http_requests_total{method="GET",status="200",view="ProductListAPI"}', body)
+        self.assertIn('http_request_duration_seconds_bucket{le="+Inf",method="GET",view="ProductListAPI"}', body)
+        self.assertIn("# TYPE http_request_db_queries histogram", body)
+
+    @override_settings(METRICS_TOKEN="segredo")
+    def test_metrics_token(self):
+        """Com METRICS_TOKEN definido, o endpoint exige o token"""
+        self.assertEqual(self.client.get("/api/_metrics").status_code, 403)
+        response = self.client.get("/api/_metrics", headers={"Authorization": "Bearer segredo"})
+        self.assertEqual(response.status_code, 200)
+
+
+class ScraperMetricsTest(TestCase):
+    def setUp(self):
+        flush_samples()  # descarta buscas de outros testes
+        ScrapeSample.objects.all().delete()
+        changed_layout = (
+            '<html><script type="application/ld+json">{"@type": "Product", "brand": "kabum"}</script>'
+            '<script id="__NEXT_DATA__" type="application/json">{"props": {}}</script></html>'
+        )
+        self.stub = StubStoreServer({
+            "ok": {"name": "SSD 1TB", "price": 299.9},
+            "bloqueado": {"status": 403},
+            "sem-json": {"html": "<html><body>Manutenção</body></html>"},
+            "layout-novo": {"html": changed_layout},
+        }).start()
+        self.addCleanup(self.stub.stop)
+
+    def test_failure_categories(self):
+        """Cada falha continua sendo uma string, mas com a categoria certa"""
+        self.assertIsInstance(get_product_info_from_url(self.stub.url("ok")), dict)
+
+        expected = {
+            "bloqueado": "http_403",
+            "nao-existe": "http_404",
+            "sem-json": "missing_json",
+            "layout-novo": "schema_change",
+        }
+        for key, category in expected.items():
+            result = get_product_info_from_url(self.stub.url(key))
+            self.assertIsInstance(result, str)
+            self.assertEqual(result.category, category, key)
+
+        result = get_product_info_from_url("http://127.0.0.1:1/produto/1")
+        self.assertEqual(result.category, "connection")
+        self.assertEqual(result, "Could not find store data")
+
+    def test_samples_and_registry(self):
+        """As buscas viram histogramas por loja e linhas de ScrapeSample"""
+        before = registry.snapshot("scraper_fetches_total").get((("outcome", "http_403"), ("store", "127.0.0.1")), 0)
+        get_product_info_from_url(self.stub.url("ok"))
+        get_product_info_from_url(self.stub.url("bloqueado"))
+
+        after = registry.snapshot("scraper_fetches_total")[(("outcome", "http_403"), ("store", "127.0.0.1"))]
+        self.assertEqual(after, before + 1)
+        self.assertIn((("phase", "ttfb"), ("store", "127.0.0.1")), registry.snapshot("scraper_phase_seconds"))
+
+        self.assertEqual(flush_samples(), 2)
+        ok = ScrapeSample.objects.get(failure="")
+        self.assertEqual((ok.store, ok.status_code), ("127.0.0.1", 200))
+        self.assertGreater(ok.bytes, 0)
+        for phase in ("ttfb", "download", "parse"):
+            self.assertIsNotNone(getattr(ok, phase))
+        self.assertEqual(ScrapeSample.objects.get(failure="http_403").status_code, 403)
+
+    def test_import_flushes_samples(self):
+        """A importação grava as amostras a cada lote"""
+        import_links([self.stub.url("ok"), self.stub.url("sem-json")])
+        self.assertEqual(ScrapeSample.objects.count(), 2)
+
+    def test_scraper_report(self):
+        """O relatório mostra volume, falhas por categoria e tempos por loja"""
+        for key in ("ok", "ok", "bloqueado", "sem-json"):
+            get_product_info_from_url(self.stub.url(key))
+        flush_samples()
+
+        out = StringIO()
+        call_command("scraper_report", stdout=out)
+        report = out.getvalue()
+        self.assertRegex(report, r"127\.0\.0\.1\s+4\s+2")
+        self.assertIn("http_403=1", report)
+        self.assertIn("missing_json=1", report)
+
+
+class SeedAndLoadTest(TestCase):
+    def test_seed_catalog(self):
+        """O catálogo sintético cria lojas, produtos, ofertas e histórico"""
+        counts = seed_catalog(products=60, stores=3, history_points=4, batch_size=25)
+        self.assertEqual(counts["products"], 60)
+        self.assertEqual(Product.objects.count(), 60)
+        self.assertEqual(Store.objects.count(), 3)
+        self.assertEqual(Stock.objects.count(), counts["stocks"])
+        self.assertGreaterEqual(counts["stocks"], 60)
+        self.assertEqual(PricePoint.objects.count(), counts["stocks"] * 4)
+
+        # uma segunda rodada não colide com os nomes existentes
+        seed_catalog(products=10, stores=1)
+        self.assertEqual(Product.objects.count(), 70)
+
+    def test_loadtest_in_process(self):
+        """O teste de carga roda a mistura de cenários e reporta os percentis"""
+        call_command("seed_catalog", products=30, stores=3, history_points=2, stdout=StringIO())
+        out = StringIO()
+        call_command("loadtest", requests=40, concurrency=1, warmup=0, stdout=out)
+        report = out.getvalue()
+        self.assertIn("40 requisições", report)
+        for scenario in ("list", "search", "store", "scrape"):
+            self.assertRegex(report, rf"{scenario}\s+\d+\s+0\s")
+        self.assertRegex(report, r"total\s+40\s+0\s")
+
+
+def jpeg_bytes(width=800, height=600, color="navy"):
+    from PIL import Image
+
+    out = BytesIO()
+    Image.new("RGB", (width, height), color).save(out, "JPEG")
+    return out.getvalue()
+
+
+class QueryBudgetTest(APITestCase):
+    """
+    Orçamento de consultas e de tempo para cada endpoint de products/urls.py,
+    sobre um catálogo sintético. O número de consultas não pode depender do
+    tamanho da página/lote (N+1); ao estourar, a mensagem lista o SQL.
+    """
+    # segundos por 100 itens; folgado para CI, pega regressões de ordem de grandeza
+    latency_budget_per_100 = 1.5
+    # rotas sem SQL por requisição e cobertas por testes próprios
+    unbudgeted = {"api-product-stream"}
+
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(products=120, stores=4, history_points=10)
+        cls.user = User.objects.create_user(username="budget", password="12345")
+        cls.product_ids = list(Product.objects.order_by("id").values_list("id", flat=True))
+        cls.store_name = Store.objects.values_list("name", flat=True).first()
+        # categorias dos itens já cadastradas, o caso comum: uma consulta por tabela de lookup
+        resolve_names(Category, ["C"])
+        resolve_names(SubGroup, ["S"])
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)  # sem consultas de sessão
+        cache.clear()
+        store_registry.by_name()  # registro de lojas já carregado, como num worker aquecido
+
+    def measure(self, request):
+        with ExitStack() as stack:
+            contexts = [stack.enter_context(CaptureQueriesContext(conn)) for conn in connections.all()]
+            start = perf_counter()
+            response = request()
+            elapsed = perf_counter() - start
+        queries = [query["sql"] for context in contexts for query in context.captured_queries]
+        self.assertLess(response.status_code, 300, response.content[:500])
+        return queries, elapsed
+
+    @staticmethod
+    def statements(queries):
+        # um bulk_create que o banco divide em lotes (limite de parâmetros do SQLite) conta uma vez
+        collapsed = []
+        for sql in queries:
+            if not (collapsed and sql.startswith("INSERT") and sql.split(" (", 1)[0] == collapsed[-1].split(" (", 1)[0]):
+                collapsed.append(sql)
+        return collapsed
+
+    def assertBudget(self, budget, request, items=None, label=""):
+        queries, elapsed = self.measure(request)
+        if len(self.statements(queries)) > budget:
+            self.fail(
+                f"{label}: {len(self.statements(queries))} consultas (orçamento {budget}):\n"
+                + "\n".join(f"{i}. {sql}" for i, sql in enumerate(queries, 1))
+            )
+        if items:
+            limit = self.latency_budget_per_100 * max(items, 100) / 100
+            self.assertLess(elapsed, limit, f"{label}: {elapsed:.2f}s para {items} itens")
+        return queries
+
+    def assertConstant(self, budget, request_for, small, large, label=""):
+        """Mesmo número de consultas com `small` e `large` itens, dentro do orçamento."""
+        few = self.assertBudget(budget, lambda: request_for(small), label=f"{label} ({small})")
+        many = self.assertBudget(budget, lambda: request_for(large), items=large, label=f"{label} ({large})")
+        if len(self.statements(few)) != len(self.statements(many)):
+            self.fail(
+                f"{label}: {len(few)} consultas com {small} itens e {len(many)} com {large} (N+1?):\n"
+                + "\n".join(f"{i}. {sql}" for i, sql in enumerate(many, 1))
+            )
+
+    def test_every_route_has_a_budget(self):
+        """Toda rota nova precisa entrar neste orçamento"""
+        from . import urls
+
+        names = {pattern.name for pattern in urls.urlpatterns if isinstance(pattern, URLPattern)}
+        tested = {name.removeprefix("test_") for name in dir(self) if name.startswith("test_api_")}
+        missing = {name for name in names - self.unbudgeted if name.replace("-", "_") not in tested}
+        self.assertEqual(missing, set())
+
+    def test_api_product_list(self):
+        """Listagem, busca, filtros e ordenação por preço: consultas fixas para qualquer page_size"""
+        for query in (
+            "", "&product_search=SSD", f"&store={self.store_name}", "&category=Hardware&sub_group=SSD",
+            "&ordering=price&min_price=100&max_price=3000&available_only=1",
+        ):
+            self.assertConstant(
+                5, lambda size: self.client.get(f"/api/products/?page_size={size}{query}"),
+                5, 100, label=f"lista{query}",
+            )
+
+    @patch("products.views.get_product_info_from_url")
+    def test_api_product_scrape(self, mock_scrape):
+        """Scrape não toca o banco"""
+        mock_scrape.return_value = {"name": "SSD", "price": 10, "is_available": True}
+        self.assertBudget(0, lambda: self.client.get("/api/products/scrape/?link=https://x.com/1"), label="scrape")
+
+    def test_api_product_create(self):
+        """Criação de um produto"""
+        payload = {
+            "name": "Produto orçamento", "price": 10, "is_available": True, "category": "C",
+            "sub_group": "S", "link": "https://x.com/orcamento", "photo": "x", "store": self.store_name,
+        }
+        # inclui a releitura de lowest_price/is_available para a resposta
+        self.assertBudget(12, lambda: self.client.post("/api/products/create/", payload, format="json"), label="create")
+
+    def test_api_product_bulk_create(self):
+        """Criação em lote: consultas fixas para 5 ou 100 itens"""
+        def request_for(size):
+            items = [
+                {"name": f"Lote {size}-{i}", "price": 10 + i, "is_available": True, "category": "C",
+                 "sub_group": "S", "link": f"https://x.com/lote/{size}/{i}", "photo": "x", "store": self.store_name}
+                for i in range(size)
+            ]
+            return self.client.post("/api/products/bulk_create/", items, format="json")
+
+        self.assertConstant(11, request_for, 5, 100, label="bulk_create")
+
+    @patch("products.views.get_product_info_from_url")
+    def test_api_product_import(self, mock_scrape):
+        """Importação: consultas fixas para 5 ou 100 links"""
+        mock_scrape.side_effect = lambda url: {
+            "name": f"Importado {url}", "price": 10, "is_available": True, "category": "C",
+            "sub_group": "S", "photo": "x", "store": self.store_name,
+        }
+        self.assertConstant(
+            12, lambda size: self.client.post(
+                "/api/products/import/", {"links": [f"https://x.com/import/{size}/{i}" for i in range(size)]},
+                format="json",
+            ),
+            5, 100, label="import",
+        )
+
+    @patch("products.views.get_product_info_from_url")
+    def test_api_product_update_prices(self, mock_scrape):
+        """Atualização em que todas as raspagens falham: leitura, falhas e refreshed_at, para qualquer número de produtos"""
+        mock_scrape.side_effect = lambda url: "Sem alteração"
+        self.assertConstant(
+            3, lambda size: self.client.patch(
+                "/api/products/update_prices/", {"product_ids": self.product_ids[:size]}, format="json",
+            ),
+            5, 100, label="update_prices",
+        )
+
+    def test_api_product_batch(self):
+        """Produtos por id: consultas fixas para 5 ou 100 ids, por GET ou POST"""
+        self.assertConstant(
+            4, lambda size: self.client.get(f"/api/products/batch/?ids={','.join(map(str, self.product_ids[:size]))}"),
+            5, 100, label="batch",
+        )
+        self.assertConstant(
+            4, lambda size: self.client.post("/api/products/batch/", {"ids": self.product_ids[:size]}, format="json"),
+            5, 100, label="batch (POST)",
+        )
+
+    def test_api_product_detail(self):
+        """Detalhe de um produto; revalidação com ETag válido em uma consulta"""
+        url = f"/api/products/{self.product_ids[0]}/"
+        self.assertBudget(4, lambda: self.client.get(url), label="detail")
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_api_product_broken_links(self):
+        """Links quebrados: consultas fixas para qualquer page_size"""
+        Stock.objects.filter(product_id__in=self.product_ids[:100]).update(failure_count=2, last_error="http_404")
+        self.assertConstant(
+            2, lambda size: self.client.get(f"/api/products/broken_links/?page_size={size}"),
+            5, 100, label="broken_links",
+        )
+
+    def test_api_product_batch_stats(self):
+        """Estatísticas em lote: consultas fixas para 5 ou 100 ids"""
+        self.assertConstant(
+            4, lambda size: self.client.get(f"/api/products/stats/?ids={','.join(map(str, self.product_ids[:size]))}"),
+            5, 100, label="stats",
+        )
+
+    def test_api_product_stats(self):
+        """Estatísticas de um produto"""
+        self.assertBudget(5, lambda: self.client.get(f"/api/products/{self.product_ids[0]}/stats/"), label="stats/id")
+
+    def test_api_product_thumbnail(self):
+        """Miniatura: uma consulta (o link da foto); o resto vem do cache em disco"""
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        stub = StubStoreServer({"foto": {"body": jpeg_bytes(), "content_type": "image/jpeg"}}).start()
+        self.addCleanup(stub.stop)
+        stock = Stock.objects.first()
+        stock.photo = stub.url("foto")
+        stock.save()
+
+        with override_settings(THUMBNAIL_CACHE_DIR=directory.name, THUMBNAIL_ALLOWED_HOSTS=["127.0.0.1"]):
+            self.assertBudget(1, lambda: self.client.get(f"/api/products/thumbnail/{stock.id}/?size=128"), label="thumbnail")
+
+    def test_api_product_facets(self):
+        """Facetas: uma consulta agregada para qualquer filtro; zero com o cache quente"""
+        for query in ("", "?product_search=SSD", f"?store={self.store_name}"):
+            self.assertBudget(1, lambda: self.client.get(f"/api/products/facets/{query}"), items=100, label=f"facets{query}")
+            self.assertBudget(0, lambda: self.client.get(f"/api/products/facets/{query}"), label=f"facets{query} (cache)")
+
+    def test_api_metrics(self):
+        """Métricas não tocam o banco"""
+        self.assertBudget(0, lambda: self.client.get("/api/_metrics"), label="metrics")
+
+
+class RefreshCatalogTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(products=23, stores=1)
+
+    def setUp(self):
+        self.scraped = []
+
+    def scrape(self, url):
+        self.scraped.append(url)
+        return {"price": 1.5, "is_available": True}
+
+    def test_resume_after_crash(self):
+        """Se o processo cai no meio, a próxima execução continua do último lote salvo"""
+        def crash_on_second_chunk(checkpoint, changed):
+            if checkpoint.processed == 10:
+                raise KeyboardInterrupt  # worker morto depois de gravar o checkpoint
+
+        with self.assertRaises(KeyboardInterrupt):
+            refresh_catalog(scrape=self.scrape, chunk_size=5, on_chunk=crash_on_second_chunk)
+        first_run = set(self.scraped)
+        self.assertEqual(len(first_run), 10)
+        self.assertIsNone(RefreshCheckpoint.objects.get().finished_at)
+
+        self.scraped.clear()
+        checkpoint = refresh_catalog(scrape=self.scrape, chunk_size=5)
+        self.assertEqual(len(self.scraped), 13)
+        self.assertFalse(first_run & set(self.scraped))
+        self.assertEqual(checkpoint.processed, 23)
+        self.assertIsNotNone(checkpoint.finished_at)
+        self.assertFalse(Stock.objects.exclude(price=1.5).exists())
+
+    def test_finished_run_starts_over(self):
+        """Depois de uma execução completa, a próxima começa do início"""
+        refresh_catalog(scrape=self.scrape, chunk_size=10)
+        self.scraped.clear()
+        checkpoint = refresh_catalog(scrape=self.scrape, chunk_size=10)
+        self.assertEqual(len(self.scraped), 23)
+        self.assertEqual(checkpoint.updated, 0)  # os preços já estavam atualizados
+
+    def test_keyset_chunks(self):
+        """Os lotes usam WHERE id > último (sem OFFSET) e as mudanças vão em lote"""
+        history = Stock.history.count()
+        with CaptureQueriesContext(connection) as ctx:
+            checkpoint = refresh_catalog(scrape=self.scrape, chunk_size=10)
+
+        product_selects = [q["sql"] for q in ctx.captured_queries if q["sql"].startswith('SELECT "products_product"."id"')]
+        self.assertEqual(len(product_selects), 3)
+        for sql in product_selects:
+            self.assertIn("LIMIT 10", sql)
+            self.assertNotIn("OFFSET", sql)
+        self.assertEqual(Stock.history.count(), history)  # preço só vai para o histórico compacto
+        self.assertEqual(PricePoint.objects.filter(price=1.5).count(), checkpoint.updated)
+
+
+class RefreshInThreadTest(TransactionTestCase):
+    def test_changes_reach_this_process(self):
+        """A atualização numa thread dispara prices_changed aqui: caches e assinantes deste processo veem as mudanças"""
+        seed_catalog(products=3, stores=1)
+        received = []
+
+        def record(sender, changes, **kwargs):
+            received.extend(change.stock.product_id for change in changes)
+
+        prices_changed.connect(record)
+        self.addCleanup(prices_changed.disconnect, record)
+        version = cache.get(PRICES_VERSION_KEY, 0)
+
+        thread = refresh_in_thread(scrape=lambda url: {"price": 1.5, "is_available": True}, chunk_size=2)
+        thread.join(timeout=10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(sorted(received), list(Product.objects.order_by("id").values_list("id", flat=True)))
+        self.assertNotEqual(cache.get(PRICES_VERSION_KEY, 0), version)
+        self.assertIsNotNone(RefreshCheckpoint.objects.get().finished_at)
+
+
+class RefreshWorkerTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed_catalog(products=12, stores=1)
+
+    def scrape(self, url):
+        return {"price": 1.5, "is_available": True}
+
+    def test_claims_do_not_overlap(self):
+        """Dois workers nunca recebem o mesmo stock enquanto o lease vale"""
+        first = claim_stocks("a", 5)
+        second = claim_stocks("b", 100)
+        self.assertEqual(len(first), 5)
+        self.assertEqual(len(second), Stock.objects.count() - 5)
+        self.assertFalse({s.id for s in first} & {s.id for s in second})
+        self.assertEqual(claim_stocks("c", 5), [])
+        self.assertTrue(first[0].lease_owner.startswith("a/"))
+
+    def test_expired_lease_is_reclaimed(self):
+        """Lote de um worker que morreu volta a ficar disponível quando o lease expira"""
+        crashed = {s.id for s in claim_stocks("morto", 5, lease_seconds=60)}
+        self.assertFalse(crashed & {s.id for s in claim_stocks("vivo", 100)})
+        later = timezone.now() + timedelta(seconds=61)
+        self.assertEqual({s.id for s in claim_stocks("outro", 100, now=later)}, crashed)
+
+    def test_run_worker_refreshes_and_releases(self):
+        """O worker atualiza tudo que está desatualizado e solta os leases"""
+        totals = run_worker(scrape=self.scrape, batch_size=4)
+        self.assertEqual(totals["processed"], Stock.objects.count())
+        self.assertFalse(Stock.objects.exclude(price=1.5).exists())
+        self.assertFalse(Stock.objects.filter(Q(refreshed_at=None) | ~Q(lease_owner=None)).exists())
+        # tudo recém-atualizado: nada a fazer até passar max_age
+        self.assertEqual(run_worker(scrape=self.scrape)["processed"], 0)
+
+    def test_lost_lease_is_not_released(self):
+        """Um worker lento não solta o lease que outro worker já pegou"""
+        slow = claim_stocks("lento", 3, lease_seconds=60)
+        later = timezone.now() + timedelta(seconds=61)
+        fast = claim_stocks("rapido", 3, now=later)
+        refresh_stocks(slow, scrape=self.scrape, lease_owner=slow[0].lease_owner)
+        self.assertEqual(
+            Stock.objects.filter(lease_owner=fast[0].lease_owner).count(), 3
+        )
+
+    def test_workers_in_separate_processes(self):
+        """Três processos refresh_worker dividem o catálogo sem raspar um link duas vezes"""
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                **os.environ, "DJANGO_SETTINGS_MODULE": "setup.settings",
+                "DJANGO_DB_PROFILE": "sqlite", "DJANGO_DB_PATH": os.path.join(tmp, "db.sqlite3"),
+            }
+            manage = [sys.executable, str(settings.BASE_DIR / "manage.py")]
+            subprocess.run(manage + ["migrate", "-v0"], env=env, check=True, capture_output=True)
+
+            keys = [str(i) for i in range(60)]
+            with StubStoreServer({key: {"name": f"SSD {key}", "price": 99.9} for key in keys}, delay=0.02) as stub:
+                code = (
+                    "import django; django.setup()\n"
+                    "from products.lookups import classification\n"
+                    "from products.models import Product, Stock, Store\n"
+                    "store = Store.objects.create(name='Kabum', logo='', url='')\n"
+                    f"for url in {[stub.url(key) for key in keys]!r}:\n"
+                    "    Stock.objects.create(product=Product.objects.create(name=url), store=store, price=1,\n"
+                    "        is_available=True, url=url, photo='', **classification('Hardware', 'SSD'))\n"
+                )
+                subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True)
+
+                workers = [
+                    subprocess.Popen(
+                        manage + ["refresh_worker", "--batch-size", "4", "--workers", "2", "--name", f"w{i}"],
+                        env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True,
+                    )
+                    for i in range(3)
+                ]
+                outputs = [worker.communicate(timeout=120) for worker in workers]
+                hits = dict(stub.hits)
+
+            for worker, (out, err) in zip(workers, outputs):
+                self.assertEqual(worker.returncode, 0, err)
+            self.assertEqual(hits, {key: 1 for key in keys})
+            processed = [int(re.search(r"(\d+) stocks processados", out).group(1)) for out, _ in outputs]
+            self.assertEqual(sum(processed), 60)
+            self.assertTrue(all(processed), processed)  # os três pegaram trabalho
+
+            code = (
+                "import django; django.setup()\n"
+                "from products.models import Stock\n"
+                "print(Stock.objects.filter(price=99.9, lease_owner=None).exclude(refreshed_at=None).count())\n"
+            )
+            result = subprocess.run([sys.executable, "-c", code], env=env, check=True, capture_output=True, text=True)
+            self.assertEqual(result.stdout.strip(), "60")
+
+
+@override_settings(REFRESH_BACKOFF_SECONDS=60, REFRESH_BACKOFF_MAX_SECONDS=300, REFRESH_FAILURE_THRESHOLD=3)
+class DeadLinkTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.store = Store.objects.create(name="Kabum", logo="", url="")
+        cls.product = Product.objects.create(name="SSD")
+        cls.stock = Stock.objects.create(
+            product=cls.product, store=cls.store, price=100, is_available=True,
+            url="https://loja.com/ssd", photo="", **classification("Hardware", "SSD")
+        )
+
+    def setUp(self):
+        self.scraped = []
+        self.addCleanup(store_registry.invalidate)
+
+    def failing(self, url):
+        self.scraped.append(url)
+        return "Access Denied or Page Not Found"
+
+    def working(self, url):
+        self.scraped.append(url)
+        return {"price": 90, "is_available": True}
+
+    def retry_now(self):
+        """Simula o fim da espera e devolve o stock como o banco tem"""
+        Stock.objects.filter(pk=self.stock.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        return Stock.objects.get(pk=self.stock.pk)
+
+    def test_failure_category_and_exponential_backoff(self):
+        """Cada falha seguida dobra a espera (até o máximo) e guarda a categoria"""
+        with StubStoreServer({}) as stub:  # produto inexistente: 404
+            Stock.objects.filter(pk=self.stock.pk).update(url=stub.url("sumiu"))
+            refresh_stocks([Stock.objects.get(pk=self.stock.pk)])
+        stock = Stock.objects.get(pk=self.stock.pk)
+        self.assertEqual((stock.failure_count, stock.last_error), (1, "http_404"))
+        waits = [(stock.next_attempt_at - timezone.now()).total_seconds()]
+
+        for _ in range(4):
+            refresh_stocks([self.retry_now()], scrape=self.failing)
+            stock = Stock.objects.get(pk=self.stock.pk)
+            waits.append((stock.next_attempt_at - timezone.now()).total_seconds())
+        for wait, expected in zip(waits, [60, 120, 240, 300, 300]):
+            self.assertAlmostEqual(wait, expected, delta=2)
+        self.assertEqual(stock.last_error, "error")  # str sem categoria
+
+    def test_backing_off_links_are_skipped(self):
+        """Links em espera não são raspados nem reservados por workers"""
+        refresh_stocks([self.stock], scrape=self.failing)
+        self.scraped.clear()
+        refresh_stocks([Stock.objects.get(pk=self.stock.pk)], scrape=self.failing)
+        self.assertEqual(self.scraped, [])
+        self.assertEqual(claim_stocks("w", 10, max_age=0), [])
+        self.assertEqual(len(claim_stocks("w", 10, max_age=0, now=timezone.now() + timedelta(seconds=61))), 1)
+
+    def test_unavailable_after_threshold_and_recovery(self):
+        """Depois de 3 falhas o stock fica indisponível; um sucesso zera tudo"""
+        refresh_stocks([self.stock], scrape=self.failing)
+        refresh_stocks([self.retry_now()], scrape=self.failing)
+        self.assertTrue(Stock.objects.get(pk=self.stock.pk).is_available)
+        changed = refresh_stocks([self.retry_now()], scrape=self.failing)
+        self.assertEqual(len(changed), 1)
+        stock = Stock.objects.get(pk=self.stock.pk)
+        self.assertFalse(stock.is_available)
+        self.assertEqual(stock.price_points.latest("timestamp").is_available, False)
+        self.product.refresh_from_db()
+        self.assertFalse(self.product.is_available)  # via prices_changed
+
+        refresh_stocks([self.retry_now()], scrape=self.working)
+        stock = Stock.objects.get(pk=self.stock.pk)
+        self.assertEqual((stock.failure_count, stock.last_error, stock.next_attempt_at), (0, None, None))
+        self.assertEqual((stock.price, stock.is_available), (90, True))
+
+    def test_failure_state_rolls_back_with_prices(self):
+        """Estado de falha e preço são gravados juntos: se prices_changed falha, nenhum dos dois fica"""
+        Stock.objects.filter(pk=self.stock.pk).update(failure_count=2)
+
+        def broken(sender, **kwargs):
+            raise RuntimeError("receptor quebrado")
+
+        prices_changed.connect(broken)
+        self.addCleanup(prices_changed.disconnect, broken)
+        with self.assertRaises(RuntimeError):
+            refresh_stocks([Stock.objects.get(pk=self.stock.pk)], scrape=self.failing)
+        stock = Stock.objects.get(pk=self.stock.pk)
+        self.assertEqual((stock.failure_count, stock.next_attempt_at, stock.is_available), (2, None, True))
+
+    @patch("products.views.get_product_info_from_url")
+    def test_update_prices_reports_skipped(self, mock_scrape):
+        """update_prices com ids informa os produtos que ficaram de fora por estarem em backoff"""
+        mock_scrape.return_value = {"price": 80, "is_available": True}
+        other = Product.objects.create(name="Mouse")
+        Stock.objects.create(
+            product=other, store=self.store, price=10, is_available=True,
+            url="https://loja.com/mouse", photo="", **classification("Periféricos", "Mouse")
+        )
+        refresh_stocks([self.stock], scrape=self.failing)
+        self.client.force_authenticate(User.objects.create_user(username="testuser", password="12345"))
+
+        response = self.client.patch(
+            "/api/products/update_prices/", {"product_ids": [self.product.id, other.id]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["updated_products"], [other.id])
+        self.assertEqual(response.data["skipped_products"], [self.product.id])
+        self.assertEqual(response.data["total_skipped"], 1)
+        mock_scrape.assert_called_once_with("https://loja.com/mouse")
+
+    def test_broken_links_api(self):
+        """Lista os links com falhas, mais falhas primeiro"""
+        other = Stock.objects.create(
+            product=Product.objects.create(name="Mouse"), store=self.store, price=10, is_available=True,
+            url="https://loja.com/mouse", photo="", **classification("Periféricos", "Mouse")
+        )
+        Stock.objects.filter(pk=self.stock.pk).update(failure_count=1, last_error="timeout")
+        Stock.objects.filter(pk=other.pk).update(failure_count=4, last_error="http_404", is_available=False)
+
+        data = self.client.get("/api/products/broken_links/").json()
+        self.assertEqual(data["count"], 2)
+        first = data["results"][0]
+        self.assertEqual((first["id"], first["product_name"], first["failure_count"]), (other.id, "Mouse", 4))
+        self.assertEqual(first["store"]["name"], "Kabum")
+        self.assertFalse(first["is_available"])
+
+        self.assertEqual(self.client.get("/api/products/broken_links/?min_failures=2").json()["count"], 1)
+        self.assertEqual(self.client.get("/api/products/broken_links/?error=timeout").json()["results"][0]["id"], self.stock.id)
+        self.assertEqual(self.client.get("/api/products/broken_links/?store=outra").json()["count"], 0)
+        response = self.client.get("/api/products/broken_links/?min_failures=x")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class LazyScraperTest(TestCase):
+    def test_web_worker_does_not_load_scraper(self):
+        """Carregar as URLs/views (o que um worker web faz) não importa o scraper, bs4/lxml nem o NumPy do otimizador"""
+        code = (
+            "import sys, django; django.setup(); import setup.urls; "
+            "print(','.join(m for m in ('products.scrapper', 'bs4', 'lxml', 'numpy') if m in sys.modules))"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], capture_output=True, text=True, check=True,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "setup.settings"},
+        )
+        self.assertEqual(result.stdout.strip(), "")
+
+    def test_first_scrape_loads_scraper(self):
+        """O wrapper das views carrega e usa o scraper de verdade"""
+        from . import views
+
+        with StubStoreServer({"1": {"name": "SSD", "price": 10}}) as stub:
+            data = views.get_product_info_from_url(stub.url("1"))
+        self.assertEqual(data["name"], "SSD")
+
+
+class ProductThumbnailAPITest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        store = Store.objects.create(name="Loja A", logo="", url="")
+        product = Product.objects.create(name="Tênis")
+        cls.stock = Stock.objects.create(
+            product=product, store=store, price=100, is_available=True,
+            url="https://loja.com/tenis", photo="", **classification("Calçados", "Tênis")
+        )
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # a loja local dos testes roda em 127.0.0.1, um endereço interno
+        self.settings_override = override_settings(
+            THUMBNAIL_CACHE_DIR=directory.name, THUMBNAIL_ALLOWED_HOSTS=["127.0.0.1"]
+        )
+        self.settings_override.enable()
+        self.addCleanup(self.settings_override.disable)
+
+        self.stub = StubStoreServer({
+            "foto": {"body": jpeg_bytes(1600, 1200), "content_type": "image/jpeg"},
+            "texto": {"body": b"nao sou imagem", "content_type": "text/plain"},
+        }).start()
+        self.addCleanup(self.stub.stop)
+        port = self.stub.base_url.rsplit(":", 1)[1]
+        self.stub.products.update({
+            "relativo": {"status": 302, "location": "/produto/foto"},
+            "interno": {"status": 302, "location": f"http://localhost:{port}/produto/foto"},
+            **{f"r{i}": {"status": 301, "location": f"/produto/r{i + 1}"} for i in range(4)},
+            "r4": {"status": 302, "location": "/produto/foto"},
+        })
+        Stock.objects.filter(pk=self.stock.pk).update(photo=self.stub.url("foto"))
+
+    def get(self, size=256, **headers):
+        return self.client.get(f"/api/products/thumbnail/{self.stock.pk}/?size={size}", headers=headers)
+
+    def test_thumbnail(self):
+        """Retorna o JPEG reduzido com cache longo e ETag"""
+        from PIL import Image
+
+        response = self.get(256)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertIn("max-age=2592000", response["Cache-Control"])
+        self.assertTrue(response["ETag"])
+        self.assertEqual(Image.open(BytesIO(response.content)).size, (256, 192))
+
+    def test_photo_fetched_once(self):
+        """A foto original é baixada uma vez; os outros tamanhos saem do cache"""
+        for size in (128, 256, 512, 128):
+            self.assertEqual(self.get(size).status_code, 200)
+        self.assertEqual(self.stub.hits["foto"], 1)
+
+    def test_not_modified(self):
+        """Com If-None-Match igual ao ETag, responde 304 sem corpo"""
+        etag = self.get()["ETag"]
+        response = self.get(**{"If-None-Match": etag})
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_errors(self):
+        """Tamanho inválido, stock inexistente e foto que não é imagem"""
+        self.assertEqual(self.get(300).status_code, 400)
+        self.assertEqual(self.client.get("/api/products/thumbnail/999999/").status_code, 404)
+        Stock.objects.filter(pk=self.stock.pk).update(photo=self.stub.url("texto"))
+        self.assertEqual(self.get().status_code, 502)
+        Stock.objects.filter(pk=self.stock.pk).update(photo=self.stub.url("nao-existe"))
+        self.assertEqual(self.get().status_code, 502)
+
+    def set_photo(self, url):
+        Stock.objects.filter(pk=self.stock.pk).update(photo=url)
+
+    def test_rejects_internal_addresses(self):
+        """Links para endereços internos ou fora de http(s) não são baixados"""
+        with override_settings(THUMBNAIL_ALLOWED_HOSTS=[]):
+            self.assertEqual(self.get().status_code, 502)
+        port = self.stub.base_url.rsplit(":", 1)[1]
+        for url in (f"http://localhost:{port}/produto/foto", "file:///etc/passwd", "ftp://127.0.0.1/foto"):
+            self.set_photo(url)
+            self.assertEqual(self.get().status_code, 502)
+        self.assertEqual(self.stub.hits["foto"], 0)
+
+        with self.assertRaisesMessage(thumbnails.ThumbnailError, "endereço interno"):
+            thumbnails.check_url("http://169.254.169.254/latest/meta-data/")
+
+    def test_connects_to_checked_address(self):
+        """O download conecta ao IP verificado: um DNS que muda de resposta (rebinding) não leva à rede interna"""
+        port = int(self.stub.base_url.rsplit(":", 1)[1])
+        real_getaddrinfo, real_connect = socket.getaddrinfo, urllib3.util.connection.create_connection
+        lookups, connections = [], []
+
+        def rebinding_dns(host, *args, **kwargs):
+            if host != "fotos.loja.test":
+                return real_getaddrinfo(host, *args, **kwargs)
+            lookups.append(host)
+            address = "93.184.216.34" if len(lookups) == 1 else "127.0.0.1"  # público só na 1ª consulta
+            return [(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP, "", (address, port))]
+
+        def connect(address, *args, **kwargs):
+            connections.append(address)
+            return real_connect(("127.0.0.1", port), *args, **kwargs)  # o "servidor público" é a loja local
+
+        self.set_photo(f"http://fotos.loja.test:{port}/produto/foto")
+        with override_settings(THUMBNAIL_ALLOWED_HOSTS=[]), \
+                patch("socket.getaddrinfo", rebinding_dns), \
+                patch("urllib3.util.connection.create_connection", connect):
+            self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(lookups, ["fotos.loja.test"])
+        self.assertEqual(connections, [("93.184.216.34", port)])
+
+    def test_redirects_are_checked(self):
+        """Cada redirecionamento é verificado, até MAX_REDIRECTS"""
+        self.set_photo(self.stub.url("relativo"))
+        self.assertEqual(self.get().status_code, 200)
+
+        self.set_photo(self.stub.url("interno"))
+        response = self.get(128)
+        self.assertEqual(response.status_code, 502)
+        self.assertIn("endereço interno", response.json()["message"])
+
+        self.set_photo(self.stub.url("r0"))  # r0 -> r1 -> r2 -> r3 -> r4 -> foto
+        response = self.get(512)
+        self.assertEqual(response.status_code, 502)
+        self.assertIn("Redirecionamentos demais", response.json()["message"])
+        self.assertEqual(self.stub.hits["foto"], 1)
+
+    def test_url_mapping_expires(self):
+        """Depois do TTL, o link é baixado de novo (a loja pode ter trocado a foto)"""
+        self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(self.stub.hits["foto"], 1)
+        with override_settings(THUMBNAIL_URL_TTL_SECONDS=-1):
+            self.assertEqual(self.get().status_code, 200)
+        self.assertEqual(self.stub.hits["foto"], 2)
+
+    def test_disk_scanned_once_below_limit(self):
+        """Abaixo do limite, só a primeira gravação do processo varre o diretório"""
+        with patch("products.thumbnails._files", wraps=thumbnails._files) as files:
+            for size in (128, 256, 512):
+                self.assertEqual(self.get(size).status_code, 200)
+        self.assertEqual(files.call_count, 1)
+
+    def test_lru_eviction(self):
+        """Acima do limite, os arquivos menos usados são apagados primeiro"""
+        directory = thumbnails.cache_dir()
+        for i, age in enumerate((300, 200, 100)):
+            path = directory / "ab" / f"arquivo{i}"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b"x" * 1000)
+            os.utime(path, (path.stat().st_atime, path.stat().st_mtime - age))
+
+        with override_settings(THUMBNAIL_CACHE_MAX_BYTES=2000):
+            self.assertEqual(thumbnails.evict(), 2)  # 3000 bytes -> até 90% de 2000
+        self.assertEqual([p.name for p in (directory / "ab").iterdir()], ["arquivo2"])
+
+    def test_cache_limit_on_write(self):
+        """Gravar além do limite dispara a limpeza"""
+        with override_settings(THUMBNAIL_CACHE_MAX_BYTES=1000):
+            self.assertEqual(self.get(512).status_code, 200)
+        self.assertLessEqual(thumbnails.disk_usage(), 1000)
+
+
+class StoreRegistryTest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.store = Store.objects.create(name="Loja Antiga", logo="logo.png", url="https://loja.com")
+        product = Product.objects.create(name="Produto 1")
+        Stock.objects.create(
+            product=product, store=cls.store, price=100, is_available=True,
+            url="https://loja.com/1", photo="", **classification("Categoria", "Subgrupo")
+        )
+
+    def setUp(self):
+        # o rollback do teste não passa pelos sinais: o próximo teste recarrega do banco
+        self.addCleanup(store_registry.invalidate)
+
+    def store_names(self, query=""):
+        response = self.client.get(f"/api/products/{query}")
+        return [stock["store"]["name"] for product in response.json()["results"] for stock in product["stocks"]]
+
+    def test_rendered_store(self):
+        """O dict da loja no stock é o mesmo do StoreSerializer"""
+        response = self.client.get("/api/products/")
+        self.assertEqual(
+            response.json()["results"][0]["stocks"][0]["store"],
+            {"id": self.store.id, "name": "Loja Antiga", "logo": "logo.png", "url": "https://loja.com"},
+        )
+
+    def test_invalidated_on_save_and_delete(self):
+        """Salvar ou apagar uma loja recarrega o registro"""
+        self.assertEqual(self.store_names(), ["Loja Antiga"])
+        self.store.name = "Loja Nova"
+        self.store.save()
+        self.assertEqual(self.store_names(), ["Loja Nova"])
+        self.assertEqual(self.store_names("?store=nova"), ["Loja Nova"])
+        self.assertEqual(self.store_names("?store=antiga"), [])
+
+        other = Store.objects.create(name="Outra", logo="", url="")
+        self.assertIn("Outra", store_registry.by_name())
+        other.delete()
+        self.assertNotIn("Outra", store_registry.by_name())
+
+    @override_settings(STORE_REGISTRY_CHECK_SECONDS=0)
+    def test_version_from_other_process(self):
+        """Uma versão nova no cache (escrita por outro processo) faz o registro recarregar"""
+        self.assertEqual(self.store_names(), ["Loja Antiga"])
+        Store.objects.filter(pk=self.store.pk).update(name="Renomeada")  # sem sinais
+        self.assertEqual(self.store_names(), ["Loja Antiga"])
+
+        cache.set("products:stores-version", 1000)  # o que o commit do outro processo faz
+        self.assertEqual(self.store_names(), ["Renomeada"])
+
+    def test_unknown_store_reloads_once(self):
+        """Um nome desconhecido confere o banco antes de responder "Loja não encontrada" """
+        store_registry.by_name()
+        Store.objects.bulk_create([Store(name="Criada em outro processo", logo="", url="")])
+        self.assertIn("Criada em outro processo", store_registry.resolve(["Criada em outro processo"]))
+        self.assertEqual(store_registry.resolve(["Inexistente"]), {})
+
+    def test_unknown_store_miss_is_cached(self):
+        """Buscas repetidas por uma loja inexistente não recarregam a tabela a cada vez"""
+        store_registry.by_name()
+        self.assertEqual(store_registry.resolve(["Inexistente"]), {})
+        with self.assertNumQueries(0):
+            self.assertEqual(store_registry.resolve(["Inexistente"]), {})
+        self.assertIsNone(store_registry.get(999999))
+        with self.assertNumQueries(0):
+            self.assertIsNone(store_registry.get(999999))
+            self.assertIsNone(store_registry.render(999999))
+
+        # Passado o prazo, a falta é conferida de novo
+        with override_settings(STORE_REGISTRY_MISS_SECONDS=0), self.assertNumQueries(1):
+            self.assertEqual(store_registry.resolve(["Inexistente"]), {})
+        # Salvar uma loja descarta as faltas guardadas
+        Store.objects.create(name="Inexistente", logo="", url="")
+        self.assertIn("Inexistente", store_registry.resolve(["Inexistente"]))
+
+
+class ProductFacetsAPITest(APITestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.kabum = Store.objects.create(name="Kabum", logo="", url="")
+        cls.pichau = Store.objects.create(name="Pichau", logo="", url="")
+        rows = [
+            ("SSD Kingston", cls.kabum, "Hardware", "SSD"),
+            ("SSD Kingston", cls.pichau, "Hardware", "SSD"),
+            ("SSD Samsung", cls.kabum, "Hardware", "SSD"),
+            ("Mouse Logitech", cls.pichau, "Periféricos", "Mouse"),
+        ]
+        for i, (name, store, category, sub_group) in enumerate(rows):
+            product, _ = Product.objects.get_or_create(name=name)
+            Stock.objects.create(
+                product=product, store=store, price=100, is_available=True,
+                url=f"https://loja.com/{i}", photo="", **classification(category, sub_group)
+            )
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(store_registry.invalidate)
+
+    def facets(self, query=""):
+        response = self.client.get(f"/api/products/facets/{query}")
+        self.assertEqual(response.status_code, 200)
+        return response.json()["facets"]
+
+    def test_counts(self):
+        """Conta produtos distintos por categoria, sub-grupo e loja"""
+        facets = self.facets()
+        self.assertEqual(facets["category"], [{"value": "Hardware", "count": 2}, {"value": "Periféricos", "count": 1}])
+        self.assertEqual(facets["sub_group"], [{"value": "SSD", "count": 2}, {"value": "Mouse", "count": 1}])
+        self.assertEqual(facets["store"], [
+            {"id": self.kabum.id, "value": "Kabum", "count": 2},
+            {"id": self.pichau.id, "value": "Pichau", "count": 2},
+        ])
+
+    def test_filters(self):
+        """As contagens seguem os filtros da listagem"""
+        facets = self.facets("?product_search=ssd&store=pichau")
+        self.assertEqual(facets["category"], [{"value": "Hardware", "count": 1}])
+        self.assertEqual(facets["store"], [{"id": self.pichau.id, "value": "Pichau", "count": 1}])
+
+        facets = self.facets("?category=Periféricos")
+        self.assertEqual(facets["sub_group"], [{"value": "Mouse", "count": 1}])
+        self.assertEqual(facets["store"], [{"id": self.pichau.id, "value": "Pichau", "count": 1}])
+
+    def test_invalidated_on_stock_write(self):
+        """Criar stocks (um a um ou em lote) invalida o cache"""
+        self.assertEqual(self.facets()["category"][0]["count"], 2)
+        Stock.objects.create(
+            product=Product.objects.create(name="SSD WD"), store=self.kabum, price=1, is_available=True,
+            url="https://loja.com/wd", photo="", **classification("Hardware", "SSD")
+        )
+        self.assertEqual(self.facets()["category"][0]["count"], 3)
+
+        bulk_create_products([{
+            "name": "SSD Crucial", "price": 1, "is_available": True, "category": "Hardware",
+            "sub_group": "SSD", "link": "https://loja.com/crucial", "photo": "x", "store": "Kabum",
+        }])
+        self.assertEqual(self.facets()["category"][0]["count"], 4)
+
+    def test_price_only_save_keeps_cache(self):
+        """Salvar só preço/disponibilidade não invalida; trocar a categoria invalida"""
+        self.facets()
+        stock = Stock.objects.filter(store=self.pichau, product__name="Mouse Logitech").get()
+        stock.price = 50
+        stock.save()
+        stock.is_available = False
+        stock.save(update_fields=["is_available"])
+        with self.assertNumQueries(0):
+            self.facets()
+
+        stock.category = classification("Hardware", "Mouse")["category"]
+        stock.save()
+        self.assertEqual(self.facets()["category"], [{"value": "Hardware", "count": 3}])
+
+    def test_price_filters(self):
+        """Preço e disponibilidade filtram as contagens e entram na chave do cache"""
+        self.assertEqual(self.facets("?max_price=50")["category"], [])
+        self.assertEqual(self.facets()["category"][0]["count"], 2)
+
+        stock = Stock.objects.get(store=self.pichau, product__name="SSD Kingston")
+        stock.price = 30
+        stock.save()
+        # só as combinações com filtro de preço são recalculadas
+        with self.assertNumQueries(0):
+            self.facets()
+        facets = self.facets("?max_price=50")
+        self.assertEqual(facets["category"], [{"value": "Hardware", "count": 1}])
+        # sem loja vale o menor preço do produto; com loja, o preço do stock daquela loja
+        self.assertEqual(len(facets["store"]), 2)
+        self.assertEqual(self.facets("?store=kabum&max_price=50")["category"], [])
+        self.assertEqual(self.facets("?store=pichau&max_price=50")["category"], [{"value": "Hardware", "count": 1}])
+
+        stock.is_available = False
+        stock.save()
+        self.assertEqual(self.facets("?store=pichau&available_only=1")["sub_group"], [{"value": "Mouse", "count": 1}])
+        self.assertEqual(self.client.get("/api/products/facets/?min_price=abc").status_code, 400)
+
+    def test_single_query(self):
+        """As três facetas saem de uma única consulta"""
+        store_registry.by_name()
+        with CaptureQueriesContext(connection) as ctx:
+            self.facets("?product_search=ssd")
+        self.assertEqual(len(ctx), 1)
+        self.assertIn("UNION ALL", ctx.captured_queries[0]["sql"])
+
+
+class LookupTablesTest(TestCase):
+    """Categorias e sub-grupos em tabelas próprias, com os nomes na API"""
+
+    def test_resolve_names_creates_missing_once(self):
+        existing = Category.objects.create(name="Hardware")
+        found = resolve_names(Category, ["Hardware", "Calçados", "Calçados"])
+        self.assertEqual(found["Hardware"], existing)
+        self.assertEqual(set(found), {"Hardware", "Calçados"})
+        self.assertEqual(resolve_names(Category, ["Calçados"])["Calçados"].id, found["Calçados"].id)
+        self.assertEqual(Category.objects.count(), 2)
+        self.assertEqual(resolve_names(SubGroup, []), {})
+
+    def test_bulk_create_shares_rows(self):
+        """Stocks com a mesma categoria apontam para a mesma linha"""
+        Store.objects.create(name="Kabum", logo="", url="")
+        items = [
+            {"name": f"SSD {i}", "price": 1, "is_available": True, "category": "Hardware",
+             "sub_group": "SSD" if i % 2 else "NVMe", "link": f"https://loja.com/{i}", "photo": "x", "store": "Kabum"}
+            for i in range(6)
+        ]
+        self.assertTrue(all(result["success"] for result in bulk_create_products(items)))
+        self.assertEqual(Category.objects.count(), 1)
+        self.assertEqual(SubGroup.objects.count(), 2)
+        self.assertEqual(Stock.objects.filter(category__name="Hardware", sub_group__name="NVMe").count(), 3)
+        self.assertEqual(Stock.history.filter(category__name="Hardware").count(), 6)
+
+    def test_category_in_use_is_protected(self):
+        product = Product.objects.create(name="Tênis")
+        store = Store.objects.create(name="Nike", logo="", url="")
+        stock = Stock.objects.create(
+            product=product, store=store, price=1, is_available=True, url="", photo="",
+            **classification("Calçados", "Tênis")
+        )
+        with self.assertRaises(ProtectedError):
+            stock.category.delete()
+
+    def test_str(self):
+        self.assertEqual(str(Category(name="Calçados")), "Calçados")
+        self.assertEqual(str(SubGroup(name="Tênis")), "Tênis")
+
+    def test_migrations_reverse_past_0003(self):
+        """Desfazer a 0007 mantém o índice da 0003, que então pode ser desfeita"""
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {
+                **os.environ, "DJANGO_SETTINGS_MODULE": "setup.settings",
+                "DJANGO_DB_PROFILE": "sqlite", "DJANGO_DB_PATH": os.path.join(tmp, "db.sqlite3"),
+            }
+            manage = [sys.executable, str(settings.BASE_DIR / "manage.py")]
+            for target in ([], ["products", "0006"], ["products", "0002"], []):
+                result = subprocess.run(manage + ["migrate", *target, "-v0"], env=env, capture_output=True, text=True)
+                self.assertEqual(result.returncode, 0, result.stderr)
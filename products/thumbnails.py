@@ -0,0 +1,297 @@
+"""
+Miniaturas das fotos dos stocks, com cache em disco.
+
+A foto original é baixada uma única vez e guardada pelo sha256 do conteúdo
+(fotos iguais em links diferentes ocupam o mesmo arquivo); as miniaturas
+ficam ao lado, como <hash>-<tamanho>.jpg. Um arquivo pequeno em urls/ liga
+o link da foto ao hash e expira depois de THUMBNAIL_URL_TTL_SECONDS: a loja
+pode trocar a foto no mesmo link. O diretório tem um limite de bytes: ao
+passar dele, os arquivos menos usados (mtime, renovado a cada acerto) são
+apagados.
+
+O link da foto vem da loja raspada, então o download só aceita http(s), em
+hosts cujos endereços (depois do DNS) são públicos, e segue no máximo
+MAX_REDIRECTS redirecionamentos, verificando cada um. A conexão vai para o
+endereço verificado (PinnedAddressAdapter), sem consultar o DNS de novo.
+THUMBNAIL_ALLOWED_HOSTS libera hosts internos conhecidos (ex.: a loja local
+dos testes).
+
+    THUMBNAIL_CACHE_DIR        diretório do cache (padrão: BASE_DIR/thumbnail_cache)
+    THUMBNAIL_CACHE_MAX_BYTES  limite do cache (padrão: 500 MB)
+    THUMBNAIL_URL_TTL_SECONDS  validade do link -> hash (padrão: 7 dias)
+    THUMBNAIL_ALLOWED_HOSTS    hosts liberados mesmo com endereço privado (padrão: nenhum)
+"""
+
+import hashlib
+import ipaddress
+import os
+import socket
+import tempfile
+import threading
+import time
+from io import BytesIO
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+SIZES = (128, 256, 512)
+MAX_SOURCE_BYTES = 10 * 1024 * 1024
+TIMEOUT = (5, 20)
+EVICT_TO = 0.9  # ao estourar o limite, apaga até sobrar 90% dele
+MAX_REDIRECTS = 3
+
+_lock = threading.Lock()
+_sizes = {}  # diretório -> bytes ocupados (estimativa do processo, refeita a cada limpeza)
+_evicting = set()  # diretórios com uma limpeza em andamento neste processo
+
+
+class ThumbnailError(Exception):
+    pass
+
+
+def cache_dir():
+    return Path(getattr(settings, "THUMBNAIL_CACHE_DIR", settings.BASE_DIR / "thumbnail_cache"))
+
+
+def max_bytes():
+    return getattr(settings, "THUMBNAIL_CACHE_MAX_BYTES", 500 * 1024 * 1024)
+
+
+def url_ttl():
+    return getattr(settings, "THUMBNAIL_URL_TTL_SECONDS", 7 * 24 * 3600)
+
+
+def _sha(data):
+    return hashlib.sha256(data).hexdigest()
+
+
+def _path(digest, suffix):
+    return cache_dir() / digest[:2] / f"{digest}{suffix}"
+
+
+def _read(path):
+    try:
+        data = path.read_bytes()
+    except FileNotFoundError:
+        return None
+    os.utime(path)  # LRU: um acerto renova o arquivo
+    return data
+
+
+def _write(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # escreve num temporário e renomeia: quem lê nunca vê um arquivo pela metade
+    fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+    with os.fdopen(fd, "wb") as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+    directory = cache_dir()
+    with _lock:
+        known = directory in _sizes
+        if known:
+            _sizes[directory] += len(data)
+        # uma limpeza por vez; fora dela, só varre o diretório quando a estimativa passa do limite
+        if directory in _evicting or (known and _sizes[directory] <= max_bytes()):
+            return
+        _evicting.add(directory)
+    try:
+        # primeira gravação do processo: a mesma varredura mede o uso e limpa se precisar
+        evict(limit=None if known else max_bytes())
+    finally:
+        with _lock:
+            _evicting.discard(directory)
+
+
+def _files(directory):
+    files = []
+    for path in Path(directory).rglob("*"):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue  # apagado por outro processo
+        if path.is_file():
+            files.append((stat.st_mtime, stat.st_size, path))
+    return files
+
+
+def disk_usage(directory=None):
+    return sum(size for _, size, _ in _files(directory or cache_dir()))
+
+
+def evict(target=None, limit=None):
+    """
+    Apaga os arquivos menos usados até o cache caber em `target` bytes (com `limit`,
+    só se ele passar de `limit`). Retorna quantos apagou.
+    """
+    directory = cache_dir()
+    target = int(max_bytes() * EVICT_TO) if target is None else target
+    files = _files(directory)
+
+    total = sum(size for _, size, _ in files)
+    removed = 0
+    if limit is None or total > limit:
+        for _, size, path in sorted(files):
+            if total <= target:
+                break
+            path.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+
+    with _lock:
+        _sizes[directory] = total
+    return removed
+
+
+def allowed_hosts():
+    return set(getattr(settings, "THUMBNAIL_ALLOWED_HOSTS", ()))
+
+
+def check_url(url):
+    """
+    Levanta ThumbnailError se `url` não for http(s) ou apontar para um endereço
+    não público. Retorna o endereço verificado, ao qual o download deve se
+    conectar (None para os hosts de THUMBNAIL_ALLOWED_HOSTS).
+    """
+    parts = urlsplit(url)
+    if parts.scheme not in ("http", "https") or not parts.hostname:
+        raise ThumbnailError("Link da foto inválido")
+    if parts.hostname in allowed_hosts():
+        return None
+
+    try:
+        port = parts.port or (443 if parts.scheme == "https" else 80)
+        addresses = {info[4][0] for info in socket.getaddrinfo(parts.hostname, port, proto=socket.IPPROTO_TCP)}
+    except (OSError, ValueError) as e:
+        raise ThumbnailError(f"Não foi possível resolver o host da foto: {e}")
+    for address in addresses:
+        ip = ipaddress.ip_address(address.split("%", 1)[0])  # IPv6 com zona (fe80::1%eth0)
+        if not ip.is_global or ip.is_multicast:
+            raise ThumbnailError("O link da foto aponta para um endereço interno")
+    return sorted(addresses)[0]
+
+
+class PinnedAddressAdapter(HTTPAdapter):
+    """
+    Conecta ao endereço já verificado em vez de resolver o host de novo: um DNS
+    que responde um IP público na verificação e um interno na conexão (DNS
+    rebinding) não alcança a rede interna. Host, SNI e certificado continuam
+    sendo os do nome original.
+    """
+
+    def __init__(self, hostname, address):
+        self.hostname = hostname
+        self.address = address
+        super().__init__()
+
+    def init_poolmanager(self, *args, **kwargs):
+        # ignorados pelo urllib3 em http
+        kwargs.update(server_hostname=self.hostname, assert_hostname=self.hostname)
+        super().init_poolmanager(*args, **kwargs)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        host = f"[{self.address}]" if ":" in self.address else self.address
+        netloc = f"{host}:{parts.port}" if parts.port else host
+        request.headers["Host"] = f"{parts.hostname}:{parts.port}" if parts.port else parts.hostname
+        request.url = parts._replace(netloc=netloc).geturl()
+        return super().send(request, **kwargs)
+
+
+def _session(url):
+    """Sessão para um GET de `url`, presa ao endereço verificado por check_url."""
+    address = check_url(url)
+    session = requests.Session()
+    if address:
+        session.trust_env = False  # um proxy do ambiente resolveria o nome de novo
+        session.mount(f"{urlsplit(url).scheme}://", PinnedAddressAdapter(urlsplit(url).hostname, address))
+    return session
+
+
+def _download(url):
+    try:
+        for _ in range(MAX_REDIRECTS + 1):
+            with _session(url) as session:
+                response = session.get(url, timeout=TIMEOUT, stream=True, allow_redirects=False)
+                if not response.is_redirect:
+                    response.raise_for_status()
+                    data = response.raw.read(MAX_SOURCE_BYTES + 1, decode_content=True)
+                    break
+                # segue o redirecionamento à mão para verificar o novo destino
+                url = urljoin(url, response.headers["Location"])
+                response.close()
+        else:
+            raise ThumbnailError("Redirecionamentos demais ao baixar a foto")
+    except requests.RequestException as e:
+        raise ThumbnailError(f"Não foi possível baixar a foto: {e}")
+    if len(data) > MAX_SOURCE_BYTES:
+        raise ThumbnailError("Foto grande demais")
+    return data
+
+
+def _url_digest(url):
+    """Hash da foto de `url` no cache, se o link foi baixado há menos de THUMBNAIL_URL_TTL_SECONDS."""
+    content = _read(cache_dir() / "urls" / _sha(url.encode()))
+    if not content:
+        return None
+    digest, _, fetched_at = content.decode().partition(" ")
+    try:
+        expired = time.time() - float(fetched_at) > url_ttl()
+    except ValueError:
+        expired = True  # formato antigo, sem o horário do download
+    return None if expired else digest
+
+
+def original(url):
+    """(hash, bytes) da foto original, baixando só se ainda não estiver no cache."""
+    digest = _url_digest(url)
+    if digest:
+        data = _read(_path(digest, ".orig"))
+        if data is not None:
+            return digest, data
+
+    data = _download(url)
+    digest = _sha(data)
+    _write(_path(digest, ".orig"), data)
+    _write(cache_dir() / "urls" / _sha(url.encode()), f"{digest} {time.time():.0f}".encode())
+    return digest, data
+
+
+def resize(data, size):
+    from PIL import Image, ImageOps  # Pillow só é carregado quando há miniatura a gerar
+
+    try:
+        image = Image.open(BytesIO(data))
+        image.draft("RGB", (size, size))  # JPEG: decodifica já reduzido
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((size, size))
+        if image.mode != "RGB":
+            background = Image.new("RGB", image.size, "white")
+            background.paste(image, mask=image.convert("RGBA").getchannel("A"))
+            image = background
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise ThumbnailError(f"A foto não é uma imagem válida: {e}")
+
+    out = BytesIO()
+    image.save(out, "JPEG", quality=85, optimize=True, progressive=True)
+    return out.getvalue()
+
+
+def get_thumbnail(url, size):
+    """
+    (etag, bytes JPEG) da miniatura de `url`, com o maior lado de até `size` pixels.
+    Levanta ThumbnailError se a foto não puder ser baixada ou lida.
+    """
+    digest = _url_digest(url)
+    if digest:
+        data = _read(_path(digest, f"-{size}.jpg"))
+        if data is not None:
+            return f"{digest}-{size}", data
+
+    digest, source = original(url)
+    data = resize(source, size)
+    _write(_path(digest, f"-{size}.jpg"), data)
+    return f"{digest}-{size}", data
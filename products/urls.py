@@ -1,9 +1,25 @@
 from django.urls import path
-from .views import ProductListAPI, ProductScrapeAPI, ProductCreateAPI, ProductUpdatePricesAPI
+from .views import (
+    ProductListAPI, ProductScrapeAPI, ProductCreateAPI, ProductUpdatePricesAPI, ProductStreamAPI,
+    ProductStatsAPI, ProductBatchStatsAPI, ProductBulkCreateAPI,
+    ProductImportAPI, ProductThumbnailAPI, ProductFacetsAPI, ProductBatchAPI, ProductDetailAPI,
+    ProductBrokenLinksAPI, MetricsAPI,
+)
 
 urlpatterns = [
     path('api/products/', ProductListAPI.as_view(), name='api-product-list'),
+    path('api/products/batch/', ProductBatchAPI.as_view(), name='api-product-batch'),
+    path('api/products/facets/', ProductFacetsAPI.as_view(), name='api-product-facets'),
     path('api/products/scrape/', ProductScrapeAPI.as_view(), name='api-product-scrape'),
     path('api/products/create/', ProductCreateAPI.as_view(), name='api-product-create'),
+    path('api/products/bulk_create/', ProductBulkCreateAPI.as_view(), name='api-product-bulk-create'),
+    path('api/products/import/', ProductImportAPI.as_view(), name='api-product-import'),
+    path('api/products/broken_links/', ProductBrokenLinksAPI.as_view(), name='api-product-broken-links'),
     path('api/products/update_prices/', ProductUpdatePricesAPI.as_view(), name='api-product-update-prices'),
+    path('api/products/stream/', ProductStreamAPI.as_view(), name='api-product-stream'),
+    path('api/products/stats/', ProductBatchStatsAPI.as_view(), name='api-product-batch-stats'),
+    path('api/products/<int:pk>/', ProductDetailAPI.as_view(), name='api-product-detail'),
+    path('api/products/<int:pk>/stats/', ProductStatsAPI.as_view(), name='api-product-stats'),
+    path('api/products/thumbnail/<int:stock_id>/', ProductThumbnailAPI.as_view(), name='api-product-thumbnail'),
+    path('api/_metrics', MetricsAPI.as_view(), name='api-metrics'),
 ]
\ No newline at end of file
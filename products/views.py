@@ -1,35 +1,229 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import generics, status, permissions
-from .models import Product, Stock, Store
-from .serializers import ProductSerializer, StockSerializer, StoreSerializer
+from .models import DailyPrice, PricePoint, Product, Stock, Store
+from .serializers import BrokenLinkSerializer, ProductSerializer, StockSerializer, StoreSerializer
 from .pagination import ProductPagination
-from django.db.models import Q
+from django.db.models import F, OuterRef, Prefetch, Q, Subquery, prefetch_related_objects
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_etags, parse_http_date_safe
+from django.views import View
+import json
+import math
+import zlib
+
+from .bulk import bulk_create_products
+from .facets import get_facets
+from .importer import import_links
+from .lookups import classification
+from .matching import ProductMatcher
+from .metrics import registry
+from .pubsub import get_broker
+from .refresh import backing_off, first_stocks, refresh_stocks, start_catalog_refresh
+from .stats import get_product_stats
+from .stores import store_registry
+from .thumbnails import SIZES as THUMBNAIL_SIZES, ThumbnailError, get_thumbnail
+# requests/bs4/lxml só são importados na primeira busca: workers que só servem a
+# listagem sobem sem eles (ver products.importer.default_scrape)
+from .importer import default_scrape as get_product_info_from_url
+
+
+MAX_ID = 2 ** 63 - 1  # BigAutoField / inteiro de 64 bits do banco
+
+
+def parse_ids(raw):
+    """
+    Converte "1,2,3" (ou a lista [1, 2, 3] de um JSON) em [1, 2, 3], sem repetições e
+    mantendo a ordem. Levanta ValueError para qualquer valor que não seja um inteiro
+    de 64 bits: booleanos e floats (true, 1.7) não são aceitos como ids.
+    """
+    if isinstance(raw, str):
+        values = [value for value in raw.split(",") if value.strip()]
+    elif isinstance(raw, list):
+        values = raw
+    else:
+        raise ValueError("ids inválidos")
+
+    ids = []
+    for value in values:
+        if isinstance(value, bool) or not isinstance(value, (int, str)):
+            raise ValueError("ids inválidos")
+        value = int(value)
+        if not -MAX_ID - 1 <= value <= MAX_ID:
+            raise ValueError("ids inválidos")  # o banco não compara (OverflowError no SQLite)
+        ids.append(value)
+    return list(dict.fromkeys(ids))
+
+
+def price_filters(request):
+    """
+    (min_price, max_price, available_only) dos parâmetros da listagem/facetas.
+    Levanta ValueError se algum preço não for um número finito.
+    """
+    prices = [
+        float(request.GET[param]) if request.GET.get(param) else None
+        for param in ('min_price', 'max_price')
+    ]
+    if not all(math.isfinite(price) for price in prices if price is not None):
+        raise ValueError
+    return (*prices, request.GET.get('available_only') in ('1', 'true', 'True'))
+
+
+def matcher_for(request):
+    """
+    ProductMatcher com o catálogo quando a requisição pede ?match=1, senão None.
+    Carrega nome/EAN/modelo de todos os produtos, por isso é opcional.
+    """
+    if request.query_params.get("match") in ("1", "true", "True"):
+        return ProductMatcher.from_database()
+    return None
+
+
+def stock_prefetches():
+    """Tudo que o ProductSerializer lê: consultas fixas para qualquer número de produtos."""
+    # a loja de cada stock vem do registro em memória (products/stores.py), sem JOIN
+    return (
+        Prefetch('stock_set', queryset=Stock.objects.select_related('category', 'sub_group')),
+        'stock_set__price_points', 'stock_set__daily_prices',
+    )
+
+
+def with_stocks(queryset):
+    return queryset.prefetch_related(*stock_prefetches())
 
-from .scrapper import get_product_info_from_url
 
 class ProductListAPI(generics.ListAPIView):
     '''
-    GET /api/products/?product_search=${productSearch}&store=${store}&page=${page}&page_size=${pageSize}
+    GET /api/products/?product_search=${productSearch}&store=${store}&category=${category}&sub_group=${subGroup}&min_price=${minPrice}&max_price=${maxPrice}&available_only=${availableOnly}&ordering=${ordering}&page=${page}&page_size=${pageSize}
+    Com store, min_price/max_price/available_only valem para o stock daquela loja; sem store,
+    para o menor preço do produto entre todas as lojas (Product.lowest_price/is_available)
     '''
     serializer_class = ProductSerializer
     pagination_class = ProductPagination
+    # preço = Product.lowest_price (products/pricing.py); id desempata para a paginação ser estável
+    orderings = {
+        'name': ('name',),
+        'price': (F('lowest_price').asc(nulls_last=True), 'id'),
+        '-price': (F('lowest_price').desc(nulls_last=True), '-id'),
+    }
+    ordering = 'name'
+    price_filters = (None, None, False)
+
+    def list(self, request, *args, **kwargs):
+        ordering = request.GET.get('ordering') or 'name'
+        if ordering not in self.orderings:
+            return Response(
+                {"success": False, "message": f"Ordenação inválida, use: {', '.join(self.orderings)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        try:
+            self.price_filters = price_filters(request)
+        except ValueError:
+            return Response({"success": False, "message": "Preço inválido"}, status=status.HTTP_400_BAD_REQUEST)
+        self.ordering = ordering
+        return super().list(request, *args, **kwargs)
 
     def get_queryset(self):
-        queryset = Product.objects.all().order_by('name')
+        queryset = with_stocks(Product.objects.all().order_by(*self.orderings[self.ordering]))
+        store_name = self.request.GET.get('store')
+
+        # Filtros por preço e disponibilidade: sem loja, pelas colunas indexadas de Product
+        min_price, max_price, available_only = self.price_filters
+        if not store_name:
+            if min_price is not None:
+                queryset = queryset.filter(lowest_price__gte=min_price)
+            if max_price is not None:
+                queryset = queryset.filter(lowest_price__lte=max_price)
+            if available_only:
+                queryset = queryset.filter(is_available=True)
 
         # Filtro por nome
         product_name = self.request.GET.get('product_search')
         if product_name:
             queryset = queryset.filter(name__icontains=product_name)
 
-        # Filtro por loja
-        store_name = self.request.GET.get('store')
+        # Filtros por stock (loja, categoria, sub-grupo): num único filter(), valem para o mesmo stock
+        stock_filters = {}
         if store_name:
-            queryset = queryset.filter(stock__store__name__icontains=store_name).distinct()
+            stock_filters['stock__store_id__in'] = store_registry.ids_matching(store_name)
+            # com loja, preço e disponibilidade são os do stock daquela loja
+            if min_price is not None:
+                stock_filters['stock__price__gte'] = min_price
+            if max_price is not None:
+                stock_filters['stock__price__lte'] = max_price
+            if available_only:
+                stock_filters['stock__is_available'] = True
+        category = self.request.GET.get('category')
+        if category:
+            stock_filters['stock__category__name'] = category
+        sub_group = self.request.GET.get('sub_group')
+        if sub_group:
+            stock_filters['stock__sub_group__name'] = sub_group
+        if stock_filters:
+            queryset = queryset.filter(**stock_filters).distinct()
 
         return queryset
     
+class ProductBatchAPI(APIView):
+    '''
+    GET /api/products/batch/?ids=1,2,3
+    POST /api/products/batch/ {"ids": [1, 2, 3]} (listas longas)
+    Os produtos pedidos, na ordem pedida; ids inexistentes vêm em "missing"
+    '''
+    max_ids = 200
+
+    def get(self, request):
+        return self.batch(request.GET.get("ids", ""))
+
+    def post(self, request):
+        return self.batch(request.data.get("ids") if isinstance(request.data, dict) else None)
+
+    def batch(self, raw_ids):
+        try:
+            product_ids = parse_ids(raw_ids if raw_ids is not None else "")
+        except ValueError:
+            return Response({"success": False, "message": "ids inválidos"}, status=status.HTTP_400_BAD_REQUEST)
+
+        if not product_ids:
+            return Response({"success": False, "message": "ids não fornecidos"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(product_ids) > self.max_ids:
+            return Response(
+                {"success": False, "message": f"Máximo de {self.max_ids} ids por requisição"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        products = with_stocks(Product.objects.all()).in_bulk(product_ids)
+        return Response({
+            "success": True,
+            "results": ProductSerializer([products[pk] for pk in product_ids if pk in products], many=True).data,
+            "missing": [pk for pk in product_ids if pk not in products],
+        })
+
+
+class ProductFacetsAPI(APIView):
+    '''
+    GET /api/products/facets/?product_search=${productSearch}&store=${store}&category=${category}&sub_group=${subGroup}&min_price=${minPrice}&max_price=${maxPrice}&available_only=${availableOnly}
+    Quantos produtos há em cada categoria, sub-grupo e loja com os filtros da listagem
+    '''
+
+    def get(self, request):
+        try:
+            min_price, max_price, available_only = price_filters(request)
+        except ValueError:
+            return Response({"success": False, "message": "Preço inválido"}, status=status.HTTP_400_BAD_REQUEST)
+        facets = get_facets(
+            request.GET.get('product_search'),
+            request.GET.get('store'),
+            request.GET.get('category'),
+            request.GET.get('sub_group'),
+            min_price=min_price,
+            max_price=max_price,
+            available_only=available_only,
+        )
+        return Response({"success": True, "facets": facets})
+
+
 class ProductScrapeAPI(APIView):
     '''
     GET /api/products/scrape/?link=${encodeURIComponent(produtoUrl)}
@@ -85,8 +279,10 @@ class ProductCreateAPI(APIView):
             return Response({"success": False, "message": "Campos incompletos"}, status=status.HTTP_400_BAD_REQUEST)
 
         try:
-            # Obtem o store
-            store_instance = Store.objects.get(name=store_name)
+            # Obtem o store (registro em memória, sem consulta)
+            store_instance = store_registry.resolve([str(store_name)]).get(str(store_name))
+            if store_instance is None:
+                raise Store.DoesNotExist
 
             # Cria o produto
             new_product = Product.objects.create(name=name)
@@ -97,12 +293,14 @@ class ProductCreateAPI(APIView):
                 is_available=is_available,
                 url=link,
                 photo=photo,
-                category=category,
-                sub_group=sub_group,
+                **classification(str(category), str(sub_group)),
                 store=store_instance,
                 product=new_product,
             )
 
+            # lowest_price/is_available foram gravados por um UPDATE (products/pricing.py), não no objeto em memória
+            new_product.refresh_from_db(fields=["lowest_price", "is_available"])
+
             # Retorna o produto criado
             serializer = ProductSerializer(new_product)
             return Response({"success": True, "product": serializer.data}, status=status.HTTP_201_CREATED)
@@ -112,12 +310,83 @@ class ProductCreateAPI(APIView):
         except Exception as e:
             return Response({"success": False, "message": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
         
+class ProductBulkCreateAPI(APIView):
+    '''
+    POST /api/products/bulk_create/?match=${match}
+    Recebe uma lista de itens no formato do /api/products/create/ e cria
+    tudo numa única transação, retornando o resultado de cada item.
+    Com match=1, itens equivalentes a um produto já cadastrado viram stocks dele
+    '''
+    permission_classes = [permissions.IsAuthenticated]
+    max_items = 5000
+
+    def post(self, request):
+        items = request.data
+        if isinstance(items, dict):
+            items = items.get("items")
+
+        if not isinstance(items, list) or not items:
+            return Response({"success": False, "message": "Lista de itens não fornecida"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > self.max_items:
+            return Response(
+                {"success": False, "message": f"Máximo de {self.max_items} itens por requisição"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            results = bulk_create_products(items, matcher=matcher_for(request))
+        except Exception as e:
+            return Response({"success": False, "message": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        created = sum(1 for result in results if result["success"])
+        return Response({
+            "success": True,
+            "total_created": created,
+            "total_failed": len(results) - created,
+            "results": results,
+        }, status=status.HTTP_201_CREATED if created else status.HTTP_200_OK)
+
+
+class ProductImportAPI(APIView):
+    '''
+    POST /api/products/import/?match=${match}
+    {
+        "links": ["https://www.kabum.com.br/produto/...", ...]
+    }
+    Raspa os links em paralelo e cria os produtos/stocks em lotes.
+    Com match=1, itens equivalentes a um produto já cadastrado viram stocks dele
+    '''
+    permission_classes = [permissions.IsAuthenticated]
+    max_links = 500
+
+    def post(self, request):
+        links = request.data.get("links")
+        if not isinstance(links, list) or not links:
+            return Response({"success": False, "message": "Links não fornecidos"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(links) > self.max_links:
+            return Response(
+                {"success": False, "message": f"Máximo de {self.max_links} links por requisição"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        results = import_links(
+            [str(link) for link in links], scrape=get_product_info_from_url, matcher=matcher_for(request)
+        )
+        return Response({
+            "success": True,
+            "total_created": sum(1 for r in results if r["status"] == "created"),
+            "total_duplicates": sum(1 for r in results if r["status"] == "duplicate"),
+            "total_failed": sum(1 for r in results if r["status"] == "error"),
+            "results": results,
+        })
+
+
 class ProductUpdatePricesAPI(APIView):
     """
     PATCH /api/products/update_prices/
     Recebe JSON opcional:
     {
-        "product_ids": [1, 2, 3]  # se não fornecido, atualiza todos
+        "product_ids": [1, 2, 3]  # se não fornecido, dispara a atualização do catálogo inteiro em segundo plano
     }
     """
     permission_classes = [permissions.IsAuthenticated]
@@ -125,42 +394,253 @@ class ProductUpdatePricesAPI(APIView):
     def patch(self, request):
         product_ids = request.data.get("product_ids", None)
 
-        if product_ids:
-            products = Product.objects.filter(id__in=product_ids)
+        if not product_ids:
+            # catálogo inteiro: manage.py refresh_prices em outro processo, retomável pelo checkpoint
+            checkpoint, started = start_catalog_refresh()
+            return Response({
+                "success": True,
+                "message": "Atualização do catálogo iniciada" if started else "Atualização do catálogo já em andamento",
+                "checkpoint": {
+                    "last_product_id": checkpoint.last_product_id,
+                    "processed": checkpoint.processed,
+                    "updated": checkpoint.updated,
+                    "started_at": checkpoint.started_at,
+                    "finished_at": checkpoint.finished_at,
+                },
+            }, status=status.HTTP_202_ACCEPTED)
+
+        stocks = first_stocks(product_ids).values()
+        # links em backoff não são raspados: quem pediu precisa saber quais ficaram de fora
+        skipped_products = [stock.product_id for stock in stocks if backing_off(stock)]
+        changed = refresh_stocks(stocks, scrape=get_product_info_from_url)
+        updated_products = [stock.product_id for stock in changed]
+        return Response({
+            "success": True,
+            "updated_products": updated_products,
+            "total_updated": len(updated_products),
+            "skipped_products": skipped_products,
+            "total_skipped": len(skipped_products),
+        }, status=status.HTTP_200_OK)
+
+
+class ProductBrokenLinksAPI(generics.ListAPIView):
+    '''
+    GET /api/products/broken_links/?min_failures=${minFailures}&store=${store}&error=${error}&page=${page}&page_size=${pageSize}
+    Stocks cujo link falhou nas últimas atualizações (products/refresh.py), com mais falhas seguidas primeiro
+    '''
+    serializer_class = BrokenLinkSerializer
+    pagination_class = ProductPagination
+    min_failures = 1
+
+    def list(self, request, *args, **kwargs):
+        try:
+            self.min_failures = max(int(request.GET.get('min_failures') or 1), 1)
+        except ValueError:
+            return Response({"success": False, "message": "min_failures inválido"}, status=status.HTTP_400_BAD_REQUEST)
+        return super().list(request, *args, **kwargs)
+
+    def get_queryset(self):
+        queryset = Stock.objects.filter(failure_count__gte=self.min_failures).select_related('product').order_by(
+            '-failure_count', 'id'
+        )
+        store_name = self.request.GET.get('store')
+        if store_name:
+            queryset = queryset.filter(store_id__in=store_registry.ids_matching(store_name))
+        error = self.request.GET.get('error')
+        if error:
+            queryset = queryset.filter(last_error=error)
+        return queryset
+
+
+class ProductDetailAPI(APIView):
+    '''
+    GET /api/products/${id}/
+    Um produto no formato da listagem. ETag/Last-Modified vêm da última mudança
+    dos stocks do produto: a última linha de HistoricalStock (índice
+    (product_id, history_date)) ou o último preço do histórico compacto
+    (PricePoint, ou o fechamento de um DailyPrice depois da compactação). Com
+    If-None-Match/If-Modified-Since ainda válidos a resposta é 304, depois de
+    uma única consulta e sem serializar nada. Mudanças que não geram histórico
+    (dados da loja, compactação do histórico de preços) não mudam o ETag.
+    '''
+
+    def get(self, request, pk):
+        product_id = OuterRef('pk')
+        product = Product.objects.filter(pk=pk).annotate(
+            last_record=Subquery(
+                Stock.history.filter(product_id=product_id).order_by('-history_date').values('history_date')[:1]
+            ),
+            last_point=Subquery(
+                PricePoint.objects.filter(stock__product_id=product_id).order_by('-timestamp').values('timestamp')[:1]
+            ),
+            last_close=Subquery(
+                DailyPrice.objects.filter(stock__product_id=product_id, close_at__isnull=False)
+                .order_by('-close_at').values('close_at')[:1]
+            ),
+        ).first()
+        if product is None:
+            return Response(
+                {"success": False, "message": "Produto não encontrado"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        last_change = max(
+            (date for date in (product.last_record, product.last_point, product.last_close) if date), default=None
+        )
+        version = int(last_change.timestamp() * 1_000_000) if last_change else 0
+        # o nome entra no ETag: renomear um produto não gera histórico
+        etag = f'"{pk}-{version}-{zlib.crc32(product.name.encode()):08x}"'
+        headers = {"ETag": etag, "Cache-Control": "no-cache"}
+        if last_change:
+            headers["Last-Modified"] = http_date(last_change.timestamp())
+
+        if_none_match = request.headers.get("If-None-Match")
+        if if_none_match:
+            not_modified = etag in parse_etags(if_none_match) or if_none_match.strip() == "*"
         else:
-            products = Product.objects.all()
+            since = parse_http_date_safe(request.headers.get("If-Modified-Since", ""))
+            not_modified = bool(last_change and since and int(last_change.timestamp()) <= since)
+        if not_modified:
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
 
-        updated_products = []
+        prefetch_related_objects([product], *stock_prefetches())
+        return Response({"success": True, "product": ProductSerializer(product).data}, headers=headers)
 
-        for product in products:
-            stock = Stock.objects.filter(product=product).first()
-            if not stock:
-                continue
 
-            try:
-                product_info = get_product_info_from_url(stock.url)
-                if not product_info or isinstance(product_info, str):
-                    continue
+class ProductStatsAPI(APIView):
+    '''
+    GET /api/products/${id}/stats/
+    Mínima histórica, médias de 30/90 dias e % abaixo da média de cada stock
+    '''
+
+    def get(self, request, pk):
+        if not Product.objects.filter(pk=pk).exists():
+            return Response(
+                {"success": False, "message": "Produto não encontrado"},
+                status=status.HTTP_404_NOT_FOUND
+            )
 
-                changed = False
+        stocks = get_product_stats([pk])[pk]
+        return Response({"success": True, "product_id": pk, "stocks": stocks})
 
-                if stock.price != product_info["price"]:
-                    stock.price = product_info["price"]
-                    changed = True
 
-                if stock.is_available != product_info["is_available"]:
-                    stock.is_available = product_info["is_available"]
-                    changed = True
+class ProductBatchStatsAPI(APIView):
+    '''
+    GET /api/products/stats/?ids=1,2,3
+    Mesmo que /api/products/${id}/stats/ para uma página de produtos
+    '''
+    max_ids = 100
 
-                if changed:
-                    stock.save()
-                    updated_products.append(product.id)
+    def get(self, request):
+        try:
+            product_ids = parse_ids(request.GET.get("ids", ""))
+        except ValueError:
+            return Response({"success": False, "message": "ids inválidos"}, status=status.HTTP_400_BAD_REQUEST)
 
-            except Exception:
-                continue
+        if not product_ids:
+            return Response({"success": False, "message": "ids não fornecidos"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(product_ids) > self.max_ids:
+            return Response(
+                {"success": False, "message": f"Máximo de {self.max_ids} ids por requisição"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
+        stats = get_product_stats(product_ids)
         return Response({
             "success": True,
-            "updated_products": updated_products,
-            "total_updated": len(updated_products)
-        }, status=status.HTTP_200_OK)
\ No newline at end of file
+            "results": [{"product_id": pk, "stocks": stats[pk]} for pk in product_ids],
+        })
+
+
+class ProductStreamAPI(View):
+    '''
+    GET /api/products/stream/?ids=1,2,3
+    Server-Sent Events com as mudanças de preço/disponibilidade dos produtos
+    assinados. Precisa rodar sob ASGI (setup/asgi.py) para não prender um worker.
+    '''
+    max_ids = 100
+    heartbeat_interval = 15  # segundos
+
+    async def get(self, request):
+        try:
+            product_ids = parse_ids(request.GET.get("ids", ""))
+        except ValueError:
+            return JsonResponse({"success": False, "message": "ids inválidos"}, status=400)
+
+        if not product_ids:
+            return JsonResponse({"success": False, "message": "ids não fornecidos"}, status=400)
+        if len(product_ids) > self.max_ids:
+            return JsonResponse(
+                {"success": False, "message": f"Máximo de {self.max_ids} ids por conexão"},
+                status=400,
+            )
+
+        subscription = get_broker().subscribe(product_ids)
+        response = StreamingHttpResponse(
+            self.events(subscription), content_type="text/event-stream"
+        )
+        response["Cache-Control"] = "no-cache"
+        response["X-Accel-Buffering"] = "no"  # nginx não deve bufferizar o stream
+        return response
+
+    async def events(self, subscription):
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                event = await subscription.get(timeout=self.heartbeat_interval)
+                if event is None:
+                    yield ": ping\n\n"  # mantém proxies/conexão vivos
+                    continue
+                yield f"event: price\ndata: {json.dumps(event)}\n\n"
+        finally:
+            subscription.close()
+
+
+class ProductThumbnailAPI(View):
+    '''
+    GET /api/products/thumbnail/${stockId}/?size=${size}
+    Miniatura JPEG da foto do stock (size: 128, 256 ou 512; padrão 256).
+    A foto é baixada uma vez e as miniaturas ficam no cache em disco (products/thumbnails.py)
+    '''
+    max_age = 30 * 24 * 3600  # 30 dias; o ETag é o hash do conteúdo
+
+    def get(self, request, stock_id):
+        size = request.GET.get("size", "256")
+        if not size.isdigit() or int(size) not in THUMBNAIL_SIZES:
+            return JsonResponse(
+                {"success": False, "message": f"Tamanho inválido (use {', '.join(map(str, THUMBNAIL_SIZES))})"},
+                status=400,
+            )
+
+        photo = Stock.objects.filter(pk=stock_id).values_list("photo", flat=True).first()
+        if not photo:
+            return JsonResponse({"success": False, "message": "Foto não encontrada"}, status=404)
+
+        try:
+            etag, data = get_thumbnail(photo, int(size))
+        except ThumbnailError as e:
+            return JsonResponse({"success": False, "message": str(e)}, status=502)
+
+        etag = f'"{etag}"'
+        if request.headers.get("If-None-Match") == etag:
+            response = HttpResponse(status=304)
+        else:
+            response = HttpResponse(data, content_type="image/jpeg")
+        response["ETag"] = etag
+        response["Cache-Control"] = f"public, max-age={self.max_age}"
+        return response
+
+
+class MetricsAPI(View):
+    '''
+    GET /api/_metrics
+    Métricas do processo no formato do Prometheus. Se METRICS_TOKEN estiver
+    definido, exige "Authorization: Bearer <token>".
+    '''
+
+    def get(self, request):
+        token = getattr(settings, "METRICS_TOKEN", None)
+        if token and request.headers.get("Authorization") != f"Bearer {token}":
+            return HttpResponse(status=403)
+
+        return HttpResponse(registry.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
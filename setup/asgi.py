@@ -5,6 +5,9 @@ It exposes the ASGI callable as a module-level variable named ``application``.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
+
+The price stream (/api/products/stream/) keeps connections open, so serve it
+from this application (e.g. `uvicorn setup.asgi:application`) instead of WSGI.
 """
 
 import os
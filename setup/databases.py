@@ -0,0 +1,81 @@
+"""
+Database profiles, selected with the DJANGO_DB_PROFILE environment variable.
+
+- (unset): a single SQLite file, as in development.
+- sqlite: SQLite tuned for concurrent readers/writers (WAL, busy_timeout, mmap)
+  with persistent connections. DJANGO_DB_REPLICA_PATH adds a read replica.
+- postgres: PostgreSQL with a psycopg connection pool. POSTGRES_REPLICA_HOST
+  adds a read replica.
+
+Reads are sent to the "replica" alias by setup.routers.PrimaryReplicaRouter.
+"""
+
+import os
+
+SQLITE_PRAGMAS = [
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA temp_store=MEMORY",
+]
+
+
+def sqlite_database(path, conn_max_age=600):
+    return {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": path,
+        "CONN_MAX_AGE": conn_max_age,
+        "CONN_HEALTH_CHECKS": True,
+        "OPTIONS": {
+            "init_command": ";".join(SQLITE_PRAGMAS),
+            # Writers take the lock up front instead of failing on upgrade
+            "transaction_mode": "IMMEDIATE",
+        },
+    }
+
+
+def postgres_database(env, host):
+    return {
+        "ENGINE": "django.db.backends.postgresql",
+        "NAME": env.get("POSTGRES_DB", "mylists"),
+        "USER": env.get("POSTGRES_USER", "mylists"),
+        "PASSWORD": env.get("POSTGRES_PASSWORD", ""),
+        "HOST": host,
+        "PORT": env.get("POSTGRES_PORT", "5432"),
+        # The pool replaces persistent connections (CONN_MAX_AGE must stay 0)
+        "OPTIONS": {
+            "pool": {
+                "min_size": int(env.get("POSTGRES_POOL_MIN", 2)),
+                "max_size": int(env.get("POSTGRES_POOL_MAX", 10)),
+            },
+        },
+    }
+
+
+def database_settings(base_dir, env=None):
+    env = os.environ if env is None else env
+    profile = env.get("DJANGO_DB_PROFILE", "")
+
+    if profile == "sqlite":
+        databases = {"default": sqlite_database(env.get("DJANGO_DB_PATH", str(base_dir / "db.sqlite3")))}
+        if env.get("DJANGO_DB_REPLICA_PATH"):
+            databases["replica"] = sqlite_database(env["DJANGO_DB_REPLICA_PATH"])
+    elif profile == "postgres":
+        databases = {"default": postgres_database(env, env.get("POSTGRES_HOST", "localhost"))}
+        if env.get("POSTGRES_REPLICA_HOST"):
+            databases["replica"] = postgres_database(env, env["POSTGRES_REPLICA_HOST"])
+    elif profile == "":
+        databases = {
+            "default": {
+                "ENGINE": "django.db.backends.sqlite3",
+                "NAME": env.get("DJANGO_DB_PATH", base_dir / "db.sqlite3"),
+            }
+        }
+    else:
+        raise ValueError(f"Unknown DJANGO_DB_PROFILE: {profile!r}")
+
+    if "replica" in databases:
+        # In tests the replica is the test database itself
+        databases["replica"]["TEST"] = {"MIRROR": "default"}
+    return databases
@@ -0,0 +1,69 @@
+"""
+Primary/replica routing.
+
+Reads go to the "replica" alias only while serving a safe (GET/HEAD/OPTIONS)
+request that has not written anything yet; writes, transactions, management
+commands and requests after a write use the primary. ReplicaRoutingMiddleware
+also sets a short-lived cookie after a write so the same client keeps reading
+from the primary while the replica catches up.
+"""
+
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections
+
+REPLICA = "replica"
+PRIMARY = "default"
+PIN_COOKIE = "db_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+# Whether reads may go to the replica (False outside requests)
+_use_replica = ContextVar("use_replica", default=False)
+# Writes seen during the current request (None outside requests)
+_wrote = ContextVar("wrote", default=None)
+
+
+def has_replica():
+    return REPLICA in settings.DATABASES
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _use_replica.get() or not has_replica():
+            return PRIMARY
+        if connections[PRIMARY].in_atomic_block:
+            return PRIMARY
+        return REPLICA
+
+    def db_for_write(self, model, **hints):
+        wrote = _wrote.get()
+        if wrote is not None:
+            wrote.append(True)
+        _use_replica.set(False)  # read-your-writes for the rest of the request
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == PRIMARY
+
+
+class ReplicaRoutingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.pin_seconds = getattr(settings, "DATABASE_REPLICA_PIN_SECONDS", 5)
+
+    def __call__(self, request):
+        use_replica = request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES
+        replica_token = _use_replica.set(use_replica)
+        wrote_token = _wrote.set([])
+        try:
+            response = self.get_response(request)
+            if _wrote.get() and has_replica():
+                response.set_cookie(PIN_COOKIE, "1", max_age=self.pin_seconds, httponly=True, samesite="Lax")
+            return response
+        finally:
+            _use_replica.reset(replica_token)
+            _wrote.reset(wrote_token)
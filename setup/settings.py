@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 
+from .databases import database_settings
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -39,7 +41,8 @@ DJANGO_APPS = [
 ]
 
 MY_APPS = [
-    "products.apps.ProductsConfig"
+    "products.apps.ProductsConfig",
+    "lists.apps.ListsConfig",
 ]
 
 THIRD_PARTY_APPS = [
@@ -49,7 +52,9 @@ THIRD_PARTY_APPS = [
 INSTALLED_APPS = DJANGO_APPS + MY_APPS + THIRD_PARTY_APPS
 
 MIDDLEWARE = [
+    'products.middleware.PerformanceMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    'setup.routers.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -73,6 +78,29 @@ REST_FRAMEWORK = {
     )
 }
 
+# Disk cache of product photo thumbnails (products/thumbnails.py), LRU-evicted above the limit
+THUMBNAIL_CACHE_DIR = BASE_DIR / 'thumbnail_cache'
+THUMBNAIL_CACHE_MAX_BYTES = 500 * 1024 * 1024
+# How long a photo link keeps pointing at the downloaded file before it is fetched again
+THUMBNAIL_URL_TTL_SECONDS = 7 * 24 * 3600
+# Photo links must resolve to public addresses; hosts listed here are exempt (internal image servers)
+THUMBNAIL_ALLOWED_HOSTS = []
+
+# Dead product links (products/refresh.py): after a failed scrape a stock waits
+# REFRESH_BACKOFF_SECONDS * 2^(failures - 1), capped at REFRESH_BACKOFF_MAX_SECONDS,
+# and is marked unavailable after REFRESH_FAILURE_THRESHOLD failures in a row
+REFRESH_BACKOFF_SECONDS = 3600
+REFRESH_BACKOFF_MAX_SECONDS = 7 * 24 * 3600
+REFRESH_FAILURE_THRESHOLD = 5
+
+# PATCH /api/products/update_prices/ without ids spawns `manage.py refresh_prices` when the default
+# cache and PRODUCTS_PUBSUB_BROKER are shared across processes, and otherwise refreshes in a thread of
+# the web process; a run whose checkpoint was saved less than this many seconds ago counts as still running
+REFRESH_RUNNING_TIMEOUT_SECONDS = 600
+
+# Token required by /api/_metrics (Authorization: Bearer <token>); None leaves it open
+METRICS_TOKEN = None
+
 ROOT_URLCONF = 'setup.urls'
 
 TEMPLATES = [
@@ -95,13 +123,14 @@ WSGI_APPLICATION = 'setup.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
+# Profiles (DJANGO_DB_PROFILE=sqlite|postgres) are described in setup/databases.py
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
-}
+DATABASES = database_settings(BASE_DIR)
+
+DATABASE_ROUTERS = ['setup.routers.PrimaryReplicaRouter']
+
+# Seconds a client keeps reading from the primary after a write
+DATABASE_REPLICA_PIN_SECONDS = 5
 
 
 # Password validation
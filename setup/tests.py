@@ -0,0 +1,113 @@
+import tempfile
+from pathlib import Path
+
+from django.db.utils import ConnectionHandler
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+
+from .databases import database_settings
+from .routers import PIN_COOKIE, PrimaryReplicaRouter, ReplicaRoutingMiddleware
+
+TWO_DATABASES = {
+    "default": {"ENGINE": "django.db.backends.sqlite3", "NAME": "primary.sqlite3"},
+    "replica": {"ENGINE": "django.db.backends.sqlite3", "NAME": "replica.sqlite3"},
+}
+
+
+@override_settings(DATABASES=TWO_DATABASES)
+class PrimaryReplicaRouterTest(SimpleTestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.factory = RequestFactory()
+
+    def run_request(self, request, view):
+        seen = []
+
+        def get_response(request):
+            view(seen)
+            return HttpResponse()
+
+        response = ReplicaRoutingMiddleware(get_response)(request)
+        return seen, response
+
+    def test_reads_use_primary_outside_requests(self):
+        self.assertEqual(self.router.db_for_read(None), "default")
+
+    def test_get_reads_from_replica(self):
+        seen, response = self.run_request(
+            self.factory.get("/api/products/"),
+            lambda seen: seen.append(self.router.db_for_read(None)),
+        )
+        self.assertEqual(seen, ["replica"])
+        self.assertNotIn(PIN_COOKIE, response.cookies)
+
+    def test_write_requests_read_from_primary(self):
+        seen, _ = self.run_request(
+            self.factory.post("/api/products/create/"),
+            lambda seen: seen.append(self.router.db_for_read(None)),
+        )
+        self.assertEqual(seen, ["default"])
+
+    def test_reads_stick_to_primary_after_write(self):
+        def view(seen):
+            seen.append(self.router.db_for_read(None))
+            seen.append(self.router.db_for_write(None))
+            seen.append(self.router.db_for_read(None))
+
+        seen, response = self.run_request(self.factory.get("/api/products/"), view)
+        self.assertEqual(seen, ["replica", "default", "default"])
+        self.assertIn(PIN_COOKIE, response.cookies)
+
+    def test_pinned_client_reads_from_primary(self):
+        request = self.factory.get("/api/products/")
+        request.COOKIES[PIN_COOKIE] = "1"
+        seen, _ = self.run_request(request, lambda seen: seen.append(self.router.db_for_read(None)))
+        self.assertEqual(seen, ["default"])
+
+    def test_migrations_only_on_primary(self):
+        self.assertTrue(self.router.allow_migrate("default", "products"))
+        self.assertFalse(self.router.allow_migrate("replica", "products"))
+
+
+class DatabaseProfileTest(SimpleTestCase):
+    # The test opens its own connections to temporary files
+    databases = {"default"}
+
+    def test_default_profile_is_single_sqlite(self):
+        databases = database_settings(Path("/app"), env={})
+        self.assertEqual(list(databases), ["default"])
+        self.assertEqual(databases["default"]["NAME"], Path("/app") / "db.sqlite3")
+
+    def test_unknown_profile(self):
+        with self.assertRaises(ValueError):
+            database_settings(Path("/app"), env={"DJANGO_DB_PROFILE": "oracle"})
+
+    def test_postgres_profile_uses_pool(self):
+        databases = database_settings(Path("/app"), env={
+            "DJANGO_DB_PROFILE": "postgres", "POSTGRES_REPLICA_HOST": "replica.local",
+        })
+        self.assertIn("pool", databases["default"]["OPTIONS"])
+        self.assertEqual(databases["replica"]["HOST"], "replica.local")
+        self.assertEqual(databases["replica"]["TEST"], {"MIRROR": "default"})
+
+    def test_sqlite_profile_with_two_files(self):
+        """Both files open with WAL, busy_timeout and mmap applied"""
+        with tempfile.TemporaryDirectory() as tmp:
+            databases = database_settings(Path(tmp), env={
+                "DJANGO_DB_PROFILE": "sqlite",
+                "DJANGO_DB_PATH": f"{tmp}/primary.sqlite3",
+                "DJANGO_DB_REPLICA_PATH": f"{tmp}/replica.sqlite3",
+            })
+            handler = ConnectionHandler(databases)
+            try:
+                for alias in ("default", "replica"):
+                    with handler[alias].cursor() as cursor:
+                        cursor.execute("PRAGMA journal_mode")
+                        self.assertEqual(cursor.fetchone()[0], "wal")
+                        cursor.execute("PRAGMA busy_timeout")
+                        self.assertEqual(cursor.fetchone()[0], 5000)
+                        cursor.execute("PRAGMA mmap_size")
+                        self.assertEqual(cursor.fetchone()[0], 268435456)
+                    self.assertEqual(handler[alias].settings_dict["CONN_MAX_AGE"], 600)
+            finally:
+                handler.close_all()